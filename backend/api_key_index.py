@@ -0,0 +1,154 @@
+"""
+Bellek içi API key indeksi
+- Key'ler SHA-256 özetiyle tutulur (düz key bellekte saklanmaz)
+- create_api_key yazdığında indeks kendini günceller
+- last_used / usage_count arka planda toplu olarak yazılır
+"""
+
+import atexit
+import os
+import threading
+import time
+from datetime import datetime
+
+from user_store import hash_api_key
+
+# Bulunamayan key'ler bu süre boyunca tekrar veritabanına sorulmaz
+NEGATIVE_CACHE_SECONDS = 30
+NEGATIVE_CACHE_SIZE = 10000
+
+
+class ApiKeyIndex:
+    """
+    API key -> user_id çözümlemesini bellekte yapan indeks.
+
+    İlk kullanımda tüm key özetleri veritabanından bir kez okunur. Başka bir
+    worker'da oluşturulan key'ler cache miss'te indeksli sorguyla bulunur.
+    Kullanım sayaçları flush_interval saniyede bir UserStore.record_api_key_usage
+    ile yazılır.
+    """
+
+    def __init__(self, store, flush_interval=5.0):
+        self.store = store
+        self.flush_interval = flush_interval
+        self._index = None
+        # key özeti -> bulunamadığı zaman (monotonic)
+        self._missing = {}
+        # key özeti -> [kullanım sayısı, son kullanım zamanı]
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        atexit.register(self.close)
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._index = None
+        self._missing = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _ensure_flusher(self):
+        if self._thread is None and self.flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name='api-key-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ API key usage flush error: {e}")
+
+    def _loaded_index(self):
+        if self._index is None:
+            index = self.store.api_key_index()
+            with self._lock:
+                if self._index is None:
+                    self._index = index
+        return self._index
+
+    def resolve(self, api_key, record_usage=True):
+        """
+        API key'in sahibini bul.
+
+        Returns:
+            str: user_id (key geçersizse None)
+        """
+        key_hash = hash_api_key(api_key)
+        index = self._loaded_index()
+        user_id = index.get(key_hash)
+
+        if user_id is None:
+            now = time.monotonic()
+            with self._lock:
+                missing_since = self._missing.get(key_hash)
+            if missing_since is not None and now - missing_since < NEGATIVE_CACHE_SECONDS:
+                return None
+
+            user_id = self.store.get_api_key_user_by_hash(key_hash)
+            with self._lock:
+                if user_id is None:
+                    if len(self._missing) >= NEGATIVE_CACHE_SIZE:
+                        self._missing.clear()
+                    self._missing[key_hash] = now
+                    return None
+                self._missing.pop(key_hash, None)
+                index[key_hash] = user_id
+
+        if record_usage:
+            self._ensure_flusher()
+            last_used = datetime.now().isoformat()
+            with self._lock:
+                pending = self._pending.setdefault(key_hash, [0, None])
+                pending[0] += 1
+                pending[1] = last_used
+
+        return user_id
+
+    def add(self, api_key, user_id):
+        """Yeni oluşturulan key'i indekse ekle"""
+        key_hash = hash_api_key(api_key)
+        with self._lock:
+            self._missing.pop(key_hash, None)
+            if self._index is not None:
+                self._index[key_hash] = user_id
+
+    def invalidate(self):
+        """İndeksi at (bir sonraki çözümlemede veritabanından yeniden okunur)"""
+        with self._lock:
+            self._index = None
+            self._missing = {}
+
+    def flush(self):
+        """Bekleyen kullanım sayaçlarını veritabanına yaz"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            usage = [(key_hash, count, last_used) for key_hash, (count, last_used) in pending.items()]
+            try:
+                self.store.record_api_key_usage(usage)
+            except Exception:
+                # Yazılamayanları bir sonraki flush için geri koy
+                with self._lock:
+                    for key_hash, (count, last_used) in pending.items():
+                        entry = self._pending.setdefault(key_hash, [0, None])
+                        entry[0] += count
+                        entry[1] = max(entry[1] or '', last_used)
+                raise
+            return len(usage)
+
+    def close(self):
+        """Arka plan thread'ini durdur ve son sayaçları yaz"""
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"⚠️ API key usage flush error: {e}")
@@ -3,13 +3,23 @@ Master Application Agent - Backend API
 Ana eşleştirme algoritması ve API endpoint'leri
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import json
 import os
 import re
-import io
+import sys
+import gc
+import heapq
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from bisect import bisect_left
+from collections import namedtuple
 from datetime import datetime, date
+from functools import lru_cache
+import numpy as np
 
 # =============================================================================
 # SYNONYM MAPPING SYSTEM - Teknoloji ve Beceri Eşleştirme
@@ -113,6 +123,101 @@ SKILL_SYNONYMS = {
     "agile": ["agile", "scrum", "kanban", "çevik metodoloji"],
 }
 
+def _trie_to_regex(trie):
+    """Synonym trie'sini regex'e çevir (uzun eşleşme önce denenir)"""
+    branches = [re.escape(char) + _trie_to_regex(trie[char]) for char in sorted(k for k in trie if k)]
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in trie:
+        return '(?:' + body + ')?'
+    return body
+
+class SkillMatcher:
+    """
+    SKILL_SYNONYMS tablosundan bir kez derlenen tek geçişlik eşleştirici.
+    
+    Tüm synonym'ler tek bir trie-regex'te birleştirilir; metin bir kez taranır
+    ve her pozisyonda kelime sınırlarıyla (\\b...\\b) eşleşen tüm synonym'ler
+    bulunur. Sonuçlar synonym başına ayrı regex çalıştırmakla aynıdır.
+    """
+    
+    def __init__(self, synonym_table):
+        self.groups = [standard_name for standard_name in synonym_table]
+        self.group_synonyms = [[s.lower() for s in synonyms] for synonyms in synonym_table.values()]
+        
+        # synonym -> grup indeksleri (tablo sırasında)
+        self.synonym_groups = {}
+        for group_index, synonyms in enumerate(self.group_synonyms):
+            for synonym in synonyms:
+                self.synonym_groups.setdefault(synonym, []).append(group_index)
+        
+        trie = {}
+        for synonym in self.synonym_groups:
+            node = trie
+            for char in synonym:
+                node = node.setdefault(char, {})
+            node[''] = True
+        self.pattern = re.compile(r'(?=\b(' + _trie_to_regex(trie) + r')\b)')
+        
+        # Aynı pozisyonda başlayan daha kısa eşleşmeler en uzun eşleşmenin önekleridir
+        self.prefixes = {
+            synonym: [other for other in self.synonym_groups if other != synonym and synonym.startswith(other)]
+            for synonym in self.synonym_groups
+        }
+        self.boundary_patterns = {
+            prefix: re.compile(r'\b' + re.escape(prefix) + r'\b')
+            for prefixes in self.prefixes.values() for prefix in prefixes
+        }
+        
+        # Ters indeks: synonym -> normalize_skill sonucu (exact-match yolu, O(1)).
+        # Tablo sırası korunur: "react native" önce "react" grubuna düşer.
+        self.reverse_index = {
+            synonym: self.first_group(self.find_synonyms(synonym) | {synonym})
+            for synonym in self.synonym_groups
+        }
+    
+    def find_synonyms(self, text_lower):
+        """Metinde kelime sınırlarıyla geçen tüm synonym'leri tek taramada bul"""
+        found = set()
+        for match in self.pattern.finditer(text_lower):
+            longest = match.group(1)
+            found.add(longest)
+            for prefix in self.prefixes[longest]:
+                if prefix not in found and self.boundary_patterns[prefix].match(text_lower, match.start()):
+                    found.add(prefix)
+        return found
+    
+    def first_group(self, synonyms):
+        """Verilen synonym'lerden herhangi birini içeren ilk grubun standart adı"""
+        group_indices = [index for synonym in synonyms for index in self.synonym_groups.get(synonym, [])]
+        if not group_indices:
+            return None
+        return self.groups[min(group_indices)]
+
+_skill_matcher = None
+_skill_matcher_source = None
+
+def get_skill_matcher():
+    """
+    Derlenmiş SkillMatcher'ı döndür.
+    SKILL_SYNONYMS yeniden atanır veya grup eklenip çıkarılırsa otomatik yeniden derlenir;
+    mevcut bir grubun listesi yerinde değiştirilirse rebuild_skill_matcher() çağrılmalı.
+    """
+    global _skill_matcher, _skill_matcher_source
+    source = (id(SKILL_SYNONYMS), len(SKILL_SYNONYMS))
+    if _skill_matcher is None or _skill_matcher_source != source:
+        _skill_matcher = SkillMatcher(SKILL_SYNONYMS)
+        _skill_matcher_source = source
+        _normalize_skill_lower.cache_clear()
+    return _skill_matcher
+
+def rebuild_skill_matcher():
+    """SKILL_SYNONYMS değiştikten sonra eşleştiriciyi yeniden derle"""
+    global _skill_matcher
+    _skill_matcher = None
+    return get_skill_matcher()
+
 def normalize_skill(skill_text):
     """
     Bir beceri metnini standart forma getirir.
@@ -126,16 +231,26 @@ def normalize_skill(skill_text):
         return None
     
     skill_lower = skill_text.lower().strip()
+    get_skill_matcher()  # Tablo değiştiyse önbelleği temizler
+    return _normalize_skill_lower(skill_lower)
+
+# normalize_skill için önbellek boyutu (küçük harfe çevrilmiş girdi başına)
+NORMALIZE_SKILL_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=NORMALIZE_SKILL_CACHE_SIZE)
+def _normalize_skill_lower(skill_lower):
+    """normalize_skill'in önbellekli çekirdeği"""
+    matcher = get_skill_matcher()
     
-    # Tüm synonym gruplarını kontrol et
-    for standard_name, synonyms in SKILL_SYNONYMS.items():
-        for synonym in synonyms:
-            if skill_lower == synonym.lower():
-                return standard_name
-            # Partial match için (kelime sınırlarıyla)
-            pattern = r'\b' + re.escape(synonym.lower()) + r'\b'
-            if re.search(pattern, skill_lower):
-                return standard_name
+    # Exact match: ters indeksten O(1)
+    standard_name = matcher.reverse_index.get(skill_lower)
+    if standard_name:
+        return standard_name
+    
+    # Partial match (kelime sınırlarıyla) - derlenmiş eşleştirici ile
+    standard_name = matcher.first_group(matcher.find_synonyms(skill_lower))
+    if standard_name:
+        return standard_name
     
     # Eşleşme bulunamazsa orijinali döndür
     return skill_lower
@@ -158,14 +273,16 @@ def extract_skills_from_cv(text):
     found_skills = set()
     raw_skills = set()
     
-    # Tüm synonym gruplarını tara
-    for standard_name, synonyms in SKILL_SYNONYMS.items():
+    # Metni tek geçişte tara, ardından her grubun ilk eşleşen synonym'ini al
+    matcher = get_skill_matcher()
+    matched = matcher.find_synonyms(text_lower)
+    group_indices = sorted({index for synonym in matched for index in matcher.synonym_groups[synonym]})
+    for group_index in group_indices:
+        synonyms = SKILL_SYNONYMS[matcher.groups[group_index]]
         for synonym in synonyms:
-            # Kelime sınırlarıyla exact match
-            pattern = r'\b' + re.escape(synonym.lower()) + r'\b'
-            if re.search(pattern, text_lower):
+            if synonym.lower() in matched:
                 raw_skills.add(synonym)
-                found_skills.add(standard_name)
+                found_skills.add(matcher.groups[group_index])
                 break  # Bu grup için bir eşleşme yeterli
     
     # Kategorilere ayır
@@ -236,18 +353,18 @@ def get_skill_match_score(user_skills, required_skills):
     return len(matches) / len(normalized_required)
 from premium import rate_limit, get_user_id, get_user_stats, upgrade_user, create_api_key, require_tier
 from stripe_integration import create_checkout_session, handle_stripe_webhook
-try:
-    import PyPDF2
-    PDF_AVAILABLE = True
-except ImportError:
-    PDF_AVAILABLE = False
-try:
-    from docx import Document
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
+from cv_cache import CVParseCache, content_hash
+from cv_extraction import (
+    PDF_AVAILABLE, DOCX_AVAILABLE, PDF_MIME_TYPE, DOCX_MIME_TYPES,
+    ExtractionPool, ExtractionPoolBusy, ExtractionTimeout
+)
+from cv_jobs import CVJobQueue, InMemoryJobStore, QueueFull
+from cv_upload import UploadRequest
+from werkzeug.exceptions import RequestEntityTooLarge
 
 app = Flask(__name__)
+# CV upload'ları diske akıtılır ve boyut sınırı okurken uygulanır (bkz. cv_upload.py)
+app.request_class = UploadRequest
 
 # CORS settings - Allow all origins (for Expo Go and web apps)
 CORS(app, resources={
@@ -342,6 +459,9 @@ DOCUMENT_TEMPLATES = {
     }
 }
 
+# GRE zorunlu olan programlar için türetilmiş şablon
+DOCUMENT_TEMPLATES["gre_required"] = dict(DOCUMENT_TEMPLATES["gre"], required=True)
+
 def get_standard_docs(country, recommendation_count=2, gre_required=False):
     """Ülkeye göre standart belge listesi oluştur"""
     docs = [
@@ -355,12 +475,88 @@ def get_standard_docs(country, recommendation_count=2, gre_required=False):
     
     # USA için GRE genellikle gerekli
     if country == "USA" or gre_required:
-        gre = DOCUMENT_TEMPLATES["gre"].copy()
-        gre["required"] = True
-        docs.append(gre)
+        docs.append(DOCUMENT_TEMPLATES["gre_required"].copy())
     
     return docs
 
+# =============================================================================
+# RESPONSE PROJECTION (fields= ve compact mod)
+# =============================================================================
+# Compact modda belge listeleri DOCUMENT_TEMPLATES anahtarlarıyla gönderilir,
+# şablonların kendisi response'ta bir kez yer alır.
+
+DOCUMENT_FIELDS = ('required_documents', 'optional_documents')
+
+_document_template_lookup = None
+_compact_document_cache = {}
+
+def document_template_key(document):
+    """Belge bir DOCUMENT_TEMPLATES şablonuyla birebir aynıysa anahtarını döndür"""
+    global _document_template_lookup
+    if _document_template_lookup is None:
+        _document_template_lookup = {
+            json.dumps(template, sort_keys=True): key
+            for key, template in DOCUMENT_TEMPLATES.items()
+        }
+    return _document_template_lookup.get(json.dumps(document, sort_keys=True))
+
+def compact_documents(university):
+    """
+    Üniversitenin belge listelerini şablon anahtarlarına çevir.
+    Şablona uymayan belgeler olduğu gibi (inline) bırakılır.
+    Katalog statik olduğu için sonuç üniversite id'sine göre önbelleklenir.
+    """
+    cache_key = university.get('id')
+    if cache_key in _compact_document_cache:
+        return _compact_document_cache[cache_key]
+    
+    compacted = {}
+    for field in DOCUMENT_FIELDS:
+        compacted[field] = [
+            document_template_key(document) or document
+            for document in university.get(field, [])
+        ]
+    
+    if cache_key is not None:
+        _compact_document_cache[cache_key] = compacted
+    return compacted
+
+def parse_fields_param(value):
+    """fields parametresini (liste veya virgülle ayrılmış string) listeye çevir"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        raise ValueError("fields liste veya virgülle ayrılmış string olmalı")
+    return [str(field).strip() for field in value if str(field).strip()]
+
+def project_university(row, fields=None, compact=False, templates_used=None):
+    """
+    Response satırını istenen alanlara indir.
+    
+    Args:
+        row: Üniversite (veya eşleştirme) satırı
+        fields: Dahil edilecek alanlar (None = hepsi)
+        compact: True ise belge listeleri şablon anahtarlarına çevrilir
+        templates_used: Compact modda kullanılan şablon anahtarlarının toplandığı set
+    """
+    projected = {field: row[field] for field in fields if field in row} if fields else dict(row)
+    
+    if compact:
+        compacted = compact_documents(row)
+        for field in DOCUMENT_FIELDS:
+            if field in projected:
+                projected[field] = compacted[field]
+                if templates_used is not None:
+                    templates_used.update(ref for ref in compacted[field] if isinstance(ref, str))
+    
+    return projected
+
+def document_templates_for(keys):
+    """Compact response'a eklenecek şablon sözlüğü"""
+    return {key: DOCUMENT_TEMPLATES[key] for key in sorted(keys)}
+
 # University database with document requirements
 UNIVERSITIES = [
     {
@@ -665,6 +861,13 @@ UNIVERSITIES = [
     }
 ]
 
+# Projection'da izin verilen alanlar (katalog alanları + hesaplanan alanlar)
+UNIVERSITY_RESPONSE_FIELDS = set().union(*(u.keys() for u in UNIVERSITIES)) | {'match_score', 'deadline_status'}
+
+# Compact modda fields verilmediğinde dönen alanlar
+COMPACT_MATCH_FIELDS = ('id', 'match_score')
+COMPACT_UNIVERSITY_FIELDS = ('id', 'name')
+
 def normalize_language_score(test_type, score):
     """
     Farklı dil sınavlarını 0-100 arası normalize eder
@@ -835,29 +1038,23 @@ def calculate_minimum_gpa_requirement(user_data):
     # Diğer ülkeler için standart minimum
     return 2.50 - bonus_points
 
-def calculate_match_score(user_data, university):
+def calculate_applicant_terms(user_data):
     """
-    Advanced matching score calculation
+    calculate_match_score'un üniversiteden bağımsız kısımlarını hesaplar.
     
-    Base Scores (100 points total):
-    - GPA: 30 points
-    - Language score: 20 points
-    - Background: 15 points
-    - Research experience: 10 points
-    - Work experience: 8 points
-    - Publications: 5 points
-    - Recommendation letters: 5 points
-    - University ranking: 4 points
-    - GRE/GMAT: 3 points
+    Skalar skorlayıcı ve MatchingEngine aynı terimleri aynı sırayla topladığı
+    için iki yol birebir aynı float sonucu üretir.
     
-    Bonus Points:
-    - Project experience
-    - Competition achievements
-    - Master's degree
+    Returns:
+        dict veya None: Minimum GPA'nın altındaysa None (skor sabit 20.0),
+        aksi halde {
+            'gpa_4_0': float,
+            'gpa_full_score': float,  # GPA >= min_gpa olduğunda eklenen puan
+            'head': [...],            # GPA ile background arasında eklenen terimler
+            'background': set,        # Kullanıcının background alanları
+            'tail': [...]             # Background'dan sonra eklenen terimler
+        }
     """
-    score = 0.0
-    max_score = 100.0
-    
     # GPA'yi 4.0 sistemine dönüştür
     gpa = user_data.get('gpa', 0)
     grading_system = user_data.get('grading_system', '4.0')
@@ -870,23 +1067,19 @@ def calculate_match_score(user_data, university):
     work_exp = user_data.get('work_experience', 0)
     if work_exp < 10 and gpa_4_0 < min_gpa_req:
         # Below minimum GPA = very low score
-        return 20.0  # Very low match
+        return None
     
-    # 1. GPA evaluation (30 points) - on 4.0 scale
-    if gpa_4_0 >= university['min_gpa']:
-        gpa_score = min(30, (gpa_4_0 / 4.0) * 30)
-        score += gpa_score
-    else:
-        score += (gpa_4_0 / university['min_gpa']) * 15
+    head = []
+    tail = []
     
     # Üniversite sıralaması bonusu (GPA'ya eklenir)
     undergrad_ranking = user_data.get('undergraduate_university_ranking', '')
     if undergrad_ranking == 'top100':
-        score += 2.0
+        head.append(2.0)
     elif undergrad_ranking == 'top500':
-        score += 1.5
+        head.append(1.5)
     elif undergrad_ranking == 'top1000':
-        score += 1.0
+        head.append(1.0)
     
     # 2. Dil skoru değerlendirmesi (20 puan)
     language_test_type = user_data.get('language_test_type', '')
@@ -897,114 +1090,610 @@ def calculate_match_score(user_data, university):
         normalized_score = normalize_language_score(language_test_type, language_test_score)
         
         if normalized_score >= 90:  # Very high level
-            score += 20
+            head.append(20)
         elif normalized_score >= 80:  # High level
-            score += 18
+            head.append(18)
         elif normalized_score >= 70:  # Good level
-            score += 15
+            head.append(15)
         elif normalized_score >= 60:  # Orta seviye
-            score += 10
+            head.append(10)
         else:
-            score += 5
-    else:
-        score += 0  # Dil sınavı yoksa puan yok
-    
-    # 3. Background eşleşmesi (15 puan)
-    user_background = user_data.get('background', [])
-    required_background = university.get('required_background', [])
-    
-    if required_background:
-        common_fields = set(user_background) & set(required_background)
-        if common_fields:
-            background_score = (len(common_fields) / len(required_background)) * 15
-            score += min(15, background_score)
-    else:
-        # Background gereksinimi yoksa tam puan
-        score += 15
+            head.append(5)
+    # Dil sınavı yoksa puan yok
     
     # 4. Research experience (10 points)
     research_exp = user_data.get('research_experience', 0)
     if research_exp >= 2:
-        score += 10
+        tail.append(10)
     elif research_exp >= 1:
-        score += 7
+        tail.append(7)
     elif research_exp >= 0.5:
-        score += 4
+        tail.append(4)
     
     # 5. Work experience (8 points)
     if work_exp >= 10:
-        score += 8  # 10+ yıl = tam puan
+        tail.append(8)  # 10+ yıl = tam puan
     elif work_exp >= 5:
-        score += 6
+        tail.append(6)
     elif work_exp >= 2:
-        score += 4
+        tail.append(4)
     elif work_exp >= 1:
-        score += 2
+        tail.append(2)
     
     # 6. Yayınlar (5 puan)
     publications = user_data.get('publications', 0)
     if publications >= 5:
-        score += 5
+        tail.append(5)
     elif publications >= 3:
-        score += 3
+        tail.append(3)
     elif publications >= 1:
-        score += 2
+        tail.append(2)
     
     # 7. Referans mektupları (5 puan)
     rec_letters = user_data.get('recommendation_letters', 0)
     if rec_letters >= 3:
-        score += 5
+        tail.append(5)
     elif rec_letters >= 2:
-        score += 3
+        tail.append(3)
     elif rec_letters >= 1:
-        score += 2
+        tail.append(2)
     
     # 8. GRE/GMAT (3 puan)
     gre_score = user_data.get('gre_score')
     gmat_score = user_data.get('gmat_score')
     if gre_score and gre_score >= 320:
-        score += 3
+        tail.append(3)
     elif gre_score and gre_score >= 310:
-        score += 2
+        tail.append(2)
     elif gre_score and gre_score >= 300:
-        score += 1
+        tail.append(1)
     if gmat_score and gmat_score >= 700:
-        score += 3
+        tail.append(3)
     elif gmat_score and gmat_score >= 650:
-        score += 2
+        tail.append(2)
     elif gmat_score and gmat_score >= 600:
-        score += 1
+        tail.append(1)
     
     # Ek puanlar (bonus - maksimum 10 puan ekstra)
     bonus_points = calculate_bonus_points(user_data)
-    score += bonus_points * 10  # 0.1 ek puan = 1 puan bonus
+    tail.append(bonus_points * 10)  # 0.1 ek puan = 1 puan bonus
+    
+    return {
+        'gpa_4_0': gpa_4_0,
+        'gpa_full_score': min(30, (gpa_4_0 / 4.0) * 30),
+        'head': head,
+        'background': set(user_data.get('background', [])),
+        'tail': tail
+    }
+
+def calculate_match_score(user_data, university):
+    """
+    Advanced matching score calculation
+    
+    Base Scores (100 points total):
+    - GPA: 30 points
+    - Language score: 20 points
+    - Background: 15 points
+    - Research experience: 10 points
+    - Work experience: 8 points
+    - Publications: 5 points
+    - Recommendation letters: 5 points
+    - University ranking: 4 points
+    - GRE/GMAT: 3 points
+    
+    Bonus Points:
+    - Project experience
+    - Competition achievements
+    - Master's degree
+    
+    Tek bir üniversite için referans implementasyon. Tüm katalog için
+    MatchingEngine kullanılır (aynı skorları üretir).
+    """
+    terms = calculate_applicant_terms(user_data)
+    if terms is None:
+        return 20.0  # Very low match
+    
+    score = 0.0
+    gpa_4_0 = terms['gpa_4_0']
+    
+    # 1. GPA evaluation (30 points) - on 4.0 scale
+    if gpa_4_0 >= university['min_gpa']:
+        score += terms['gpa_full_score']
+    else:
+        score += (gpa_4_0 / university['min_gpa']) * 15
+    
+    # Üniversite sıralaması + dil skoru
+    for term in terms['head']:
+        score += term
+    
+    # 3. Background eşleşmesi (15 puan)
+    required_background = university.get('required_background', [])
+    
+    if required_background:
+        common_fields = terms['background'] & set(required_background)
+        if common_fields:
+            background_score = (len(common_fields) / len(required_background)) * 15
+            score += min(15, background_score)
+    else:
+        # Background gereksinimi yoksa tam puan
+        score += 15
+    
+    # Araştırma, iş deneyimi, yayın, referans, GRE/GMAT ve bonus puanlar
+    for term in terms['tail']:
+        score += term
     
     # Maksimum 110 puan olabilir (100 + 10 bonus)
     return round(min(score, 110.0), 2)
 
-def extract_text_from_pdf(file_content):
-    """PDF'den text çıkar"""
-    try:
-        pdf_file = io.BytesIO(file_content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
-    except Exception as e:
-        print(f"PDF parsing error: {e}")
-        return None
+# =============================================================================
+# VECTORIZED MATCHING ENGINE (NumPy)
+# =============================================================================
+# Üniversite gereksinimleri kolonlar halinde NumPy dizilerine paketlenir;
+# bir başvuru tüm katalogla birkaç dizi işlemiyle skorlanır.
 
-def extract_text_from_docx(file_content):
-    """DOCX'den text çıkar"""
-    try:
-        doc_file = io.BytesIO(file_content)
-        doc = Document(doc_file)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        return text
-    except Exception as e:
-        print(f"DOCX parsing error: {e}")
+class MatchingEngine:
+    """
+    Kolonsal eşleştirme motoru.
+    
+    calculate_match_score ile birebir aynı skorları üretir, ancak üniversite
+    başına Python döngüsü yerine tüm kataloğu tek seferde skorlar.
+    """
+    
+    def __init__(self, universities):
+        self.universities = universities
+        self.min_gpa = np.array([u['min_gpa'] for u in universities], dtype=np.float64)
+        
+        # Background gereksinimleri: (M x F) boolean matris
+        self.background_index = {}
+        for university in universities:
+            for field in university.get('required_background', []):
+                self.background_index.setdefault(field, len(self.background_index))
+        
+        self.background_matrix = np.zeros((len(universities), len(self.background_index)), dtype=np.float64)
+        for row, university in enumerate(universities):
+            for field in university.get('required_background', []):
+                self.background_matrix[row, self.background_index[field]] = 1.0
+        
+        # Skorlamada liste uzunluğu kullanılır (tekrarlar dahil)
+        self.background_required = np.array(
+            [len(u.get('required_background', [])) for u in universities], dtype=np.float64
+        )
+        
+        # Deadline kolonları: en geç geçerli deadline (ordinal, yoksa -1)
+        self.has_deadlines = np.array([bool(u.get('deadlines')) for u in universities], dtype=bool)
+        self.latest_deadline = np.array(
+            [self._latest_deadline_ordinal(u) for u in universities], dtype=np.int64
+        )
+    
+    @staticmethod
+    def _latest_deadline_ordinal(university):
+        """Geçerli deadline'ların en geçini ordinal olarak döndür (has_active_deadline ile aynı parse)"""
+        latest = -1
+        for deadline_str in university.get('deadlines', {}).values():
+            try:
+                deadline_date = datetime.strptime(deadline_str, "%Y-%m-%d").date()
+            except (ValueError, TypeError):
+                continue
+            latest = max(latest, deadline_date.toordinal())
+        return latest
+    
+    def active_mask(self, today=None):
+        """
+        has_active_deadline'ın vektörel karşılığı.
+        Deadline bilgisi olmayan üniversiteler aktif sayılır.
+        """
+        today = today or date.today()
+        return ~self.has_deadlines | (self.latest_deadline >= today.toordinal())
+    
+    def _background_vector(self, user_background):
+        """Kullanıcının background alanlarını indeks vektörüne çevir"""
+        vector = np.zeros(len(self.background_index), dtype=np.float64)
+        for field in user_background:
+            index = self.background_index.get(field)
+            if index is not None:
+                vector[index] = 1.0
+        return vector
+    
+    def _background_scores(self, common_counts):
+        """Ortak alan sayılarından background puanını hesapla (15 puan)"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            partial = np.minimum(15, (common_counts / self.background_required) * 15)
+        partial = np.where(common_counts > 0, partial, 0.0)
+        return np.where(self.background_required > 0, partial, 15.0)
+    
+    def score_terms(self, terms_list):
+        """
+        calculate_applicant_terms çıktılarını tüm katalogla skorla (N x M).
+        
+        Terim listeleri 0.0 ile doldurulur; x + 0.0 == x olduğundan skorlar
+        tekil skorlamayla birebir aynıdır.
+        
+        Returns:
+            np.ndarray: (başvuru sayısı x üniversite sayısı) yuvarlanmamış skorlar
+        """
+        count = len(terms_list)
+        below_minimum = np.array([terms is None for terms in terms_list], dtype=bool)
+        active = [terms for terms in terms_list if terms is not None]
+        
+        gpa_4_0 = np.zeros((count, 1), dtype=np.float64)
+        gpa_full_score = np.zeros((count, 1), dtype=np.float64)
+        head_width = max((len(terms['head']) for terms in active), default=0)
+        tail_width = max((len(terms['tail']) for terms in active), default=0)
+        head = np.zeros((count, head_width), dtype=np.float64)
+        tail = np.zeros((count, tail_width), dtype=np.float64)
+        user_backgrounds = np.zeros((count, len(self.background_index)), dtype=np.float64)
+        
+        for row, terms in enumerate(terms_list):
+            if terms is None:
+                continue
+            gpa_4_0[row, 0] = terms['gpa_4_0']
+            gpa_full_score[row, 0] = terms['gpa_full_score']
+            head[row, :len(terms['head'])] = terms['head']
+            tail[row, :len(terms['tail'])] = terms['tail']
+            user_backgrounds[row] = self._background_vector(terms['background'])
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(
+                gpa_4_0 >= self.min_gpa,
+                gpa_full_score,
+                (gpa_4_0 / self.min_gpa) * 15
+            )
+        
+        for column in range(head_width):
+            scores += head[:, column:column + 1]
+        
+        common_counts = user_backgrounds @ self.background_matrix.T
+        scores += self._background_scores(common_counts)
+        
+        for column in range(tail_width):
+            scores += tail[:, column:column + 1]
+        
+        scores = np.minimum(scores, 110.0)
+        scores[below_minimum] = 20.0
+        return scores
+    
+    def score(self, user_data):
+        """
+        Bir başvuruyu tüm katalogla skorla.
+        
+        Returns:
+            np.ndarray: Üniversite sırasıyla yuvarlanmamış skorlar
+        """
+        return self.score_terms([calculate_applicant_terms(user_data)])[0]
+    
+    @staticmethod
+    def round_scores(scores):
+        """
+        Skorları calculate_match_score gibi Python round ile 2 basamağa yuvarla.
+        Sıralama, min_score filtresi ve dönen match_score hep bu değeri kullanır
+        (np.round bazı değerlerde farklı yuvarlar).
+        
+        Returns:
+            list: 1 boyutlu dizi için skor listesi, 2 boyutlu için satır listeleri
+        """
+        if scores.ndim == 1:
+            return [round(value, 2) for value in scores.tolist()]
+        return [[round(value, 2) for value in row] for row in scores.tolist()]
+    
+    def match_scores(self, user_data):
+        """calculate_match_score ile aynı formatta (2 basamak) skor listesi"""
+        return self.round_scores(self.score(user_data))
+
+matching_engine = MatchingEngine(UNIVERSITIES)
+
+# CV parse cache - aynı dosya tekrar yüklendiğinde extraction/parse atlanır
+# CV_CACHE_DIR verilirse sonuçlar diske de yazılır (worker'lar arasında paylaşılır)
+CV_CACHE_MAX_ENTRIES = int(os.environ.get('CV_CACHE_MAX_ENTRIES', '256'))
+CV_CACHE_DIR = os.environ.get('CV_CACHE_DIR') or None
+
+cv_parse_cache = CVParseCache(max_entries=CV_CACHE_MAX_ENTRIES, disk_dir=CV_CACHE_DIR)
+
+# PDF/DOCX extraction process pool'da çalışır (request thread'i bloklanmaz)
+# CV_EXTRACT_WORKERS=0 ise extraction request thread'inde yapılır
+CV_EXTRACT_WORKERS = int(os.environ.get('CV_EXTRACT_WORKERS', '2'))
+CV_EXTRACT_QUEUE_SIZE = int(os.environ.get('CV_EXTRACT_QUEUE_SIZE', '16'))
+CV_EXTRACT_TIMEOUT = float(os.environ.get('CV_EXTRACT_TIMEOUT', '20'))
+CV_MAX_PAGES = int(os.environ.get('CV_MAX_PAGES', '20'))
+CV_MAX_CHARS = int(os.environ.get('CV_MAX_CHARS', '100000'))
+CV_PDF_ENGINE = os.environ.get('CV_PDF_ENGINE', 'auto')
+
+cv_extraction_pool = ExtractionPool(
+    max_workers=CV_EXTRACT_WORKERS,
+    max_queue=CV_EXTRACT_QUEUE_SIZE,
+    timeout=CV_EXTRACT_TIMEOUT,
+    max_pages=CV_MAX_PAGES,
+    max_chars=CV_MAX_CHARS,
+    pdf_engine=CV_PDF_ENGINE
+)
+
+
+# =============================================================================
+# CV FIELD EXTRACTION (tek geçişlik)
+# =============================================================================
+# Her alan için pattern'ler öncelik sırasıyla denenir: ilk eşleşen (ve değeri
+# geçerli olan) pattern kazanır. Pattern'ler metinde aranmak yerine sadece
+# "anchor" pozisyonlarında çalıştırılır; anchor'lar (anahtar kelimeler ve
+# rakamlar) metin bir kez taranarak bulunur.
+#
+# CVPattern alanları:
+#   head:   anchor pozisyonunda match edilen regex (group 1 = değer)
+#   anchor: anahtar kelime veya rakam pozisyonu (DIGIT_RUN, TWO_DIGITS, DECIMAL)
+#   tail:   head'den sonra aynı satırda aranan devam (".*research" / ".*?(\d{2,3})")
+#   lazy:   True ise değer tail'den alınır (".*?(...)"), değilse tail sadece
+#           aynı satırda var olmalıdır (".*...")
+#
+# Sayılar için (?=(\d+\.?\d*))\1 kullanılır (atomik grup): sayıdan sonra rakam
+# veya nokta gelemeyeceği için geri izleme sonucu değiştirmez, ama uzun rakam
+# dizilerinde karesel/kübik backtracking'i önler.
+
+CVPattern = namedtuple('CVPattern', ['head', 'anchor', 'tail', 'lazy'], defaults=[None, False])
+
+DIGIT_RUN = '<digit-run>'      # rakam dizisinin ilk rakamı
+TWO_DIGITS = '<two-digits>'    # \d\d başlangıcı
+DECIMAL = '<decimal>'          # \d\.\d başlangıcı
+
+# Rakam pozisyonları (\d ve str.isdecimal aynı sınıftır: Unicode Nd)
+DIGIT_POSITION_PATTERNS = {
+    DIGIT_RUN: re.compile(r'(?<!\d)\d'),
+    TWO_DIGITS: re.compile(r'\d(?=\d)'),
+    DECIMAL: re.compile(r'\d(?=\.\d)'),
+}
+
+# Patolojik girdi koruması: bu uzunluktan sonrası parse edilmez
+CV_PARSE_MAX_CHARS = 200_000
+
+_NUMBER = r'(?=(\d+\.?\d*))\1'
+_YEARS = r'\s*(?:year|yıl|yr)'
+
+CV_FIELD_PATTERNS = {
+    # GPA extraction - daha kapsamlı pattern'ler
+    'gpa': [
+        CVPattern(r'gpa[:\s]*([0-9]+\.[0-9]+)', 'gpa'),
+        CVPattern(r'grade point average[:\s]*([0-9]+\.[0-9]+)', 'grade point average'),
+        CVPattern(r'not ortalaması[:\s]*([0-9]+\.[0-9]+)', 'not ortalaması'),
+        CVPattern(r'not[:\s]*([0-9]+\.[0-9]+)', 'not'),
+        CVPattern(r'([0-9]\.[0-9]+)\s*/\s*4\.0', DECIMAL),
+        CVPattern(r'([0-9]\.[0-9]+)\s*out of\s*4\.0', DECIMAL),
+        CVPattern(r'([0-9]\.[0-9]+)\s*\(4\.0', DECIMAL),
+        CVPattern(r'cgpa[:\s]*([0-9]+\.[0-9]+)', 'cgpa'),
+        CVPattern(r'cumulative gpa[:\s]*([0-9]+\.[0-9]+)', 'cumulative gpa'),
+    ],
+    # Language scores - daha kapsamlı pattern'ler
+    'toefl': [
+        CVPattern(r'toefl[:\s]*(\d{2,3})', 'toefl'),
+        CVPattern(r'toefl ibt[:\s]*(\d{2,3})', 'toefl ibt'),
+        CVPattern(r'toefl', 'toefl', TWO_DIGITS, lazy=True),
+        CVPattern(r'(\d{2,3})\s*toefl', TWO_DIGITS),
+    ],
+    'ielts': [
+        CVPattern(r'ielts[:\s]*(\d\.\d)', 'ielts'),
+        CVPattern(r'ielts academic[:\s]*(\d\.\d)', 'ielts academic'),
+        CVPattern(r'ielts', 'ielts', DECIMAL, lazy=True),
+        CVPattern(r'(\d\.\d)\s*ielts', DECIMAL),
+    ],
+    'yds': [
+        CVPattern(r'yds[:\s]*(\d{2,3})', 'yds'),
+        CVPattern(r'eyds[:\s]*(\d{2,3})', 'eyds'),
+        CVPattern(r'yökdil[:\s]*(\d{2,3})', 'yökdil'),
+        CVPattern(r'e-yökdil[:\s]*(\d{2,3})', 'e-yökdil'),
+    ],
+    # Research experience - daha esnek pattern'ler
+    'research_experience': [
+        CVPattern(r'research[:\s]*' + _NUMBER + _YEARS, 'research'),
+        CVPattern(r'araştırma[:\s]*' + _NUMBER + _YEARS, 'araştırma'),
+        CVPattern(_NUMBER + _YEARS, DIGIT_RUN, 'research'),
+        CVPattern(r'research assistant[:\s]*' + _NUMBER, 'research assistant'),
+        CVPattern(r'ra[:\s]*' + _NUMBER, 'ra'),
+    ],
+    # Work experience - daha esnek pattern'ler
+    'work_experience': [
+        CVPattern(r'work experience[:\s]*' + _NUMBER + _YEARS, 'work experience'),
+        CVPattern(r'experience[:\s]*' + _NUMBER + _YEARS, 'experience'),
+        CVPattern(_NUMBER + _YEARS, DIGIT_RUN, 'experience'),
+        CVPattern(r'(\d+)' + _YEARS, DIGIT_RUN, 'work'),
+        CVPattern(r'professional experience[:\s]*' + _NUMBER, 'professional experience'),
+        CVPattern(r'employment[:\s]*' + _NUMBER, 'employment'),
+    ],
+    # Publications
+    'publications': [
+        CVPattern(r'(\d+)\s*(?:publication|yayın|paper|makale)', DIGIT_RUN),
+        CVPattern(r'publication[:\s]+(\d+)', 'publication'),
+        CVPattern(r'(\d+)\s*published', DIGIT_RUN),
+    ],
+}
+
+# Background fields extraction - daha kapsamlı
+CV_BACKGROUND_KEYWORDS = {
+    'computer science': ['computer science', 'cs', 'bilgisayar', 'bilgisayar bilimi', 'computer engineering'],
+    'engineering': ['engineering', 'mühendislik', 'engineer'],
+    'robotics': ['robotics', 'robotik', 'robot'],
+    'data science': ['data science', 'veri bilimi', 'data scientist', 'machine learning', 'ml'],
+    'mechanical engineering': ['mechanical engineering', 'makine mühendisliği', 'mechanical'],
+    'electrical engineering': ['electrical engineering', 'elektrik mühendisliği', 'electrical', 'ee'],
+    'mathematics': ['mathematics', 'matematik', 'math', 'applied math'],
+    'physics': ['physics', 'fizik'],
+    'software engineering': ['software engineering', 'yazılım mühendisliği', 'software'],
+    'artificial intelligence': ['artificial intelligence', 'ai', 'yapay zeka'],
+    'control systems': ['control systems', 'kontrol sistemleri', 'control engineering'],
+    'statistics': ['statistics', 'istatistik']
+}
+
+class KeywordScanner:
+    """
+    Anahtar kelimeleri tek bir trie-regex ile tek taramada bulur.
+    
+    Her pozisyonda en uzun eşleşme raporlanır; aynı pozisyonda başlayan daha
+    kısa anahtar kelimeler onun önekleridir ve ayrıca doğrulanır. Eşleştirme
+    re.IGNORECASE ile yapılır (ayrı ayrı re.search(..., re.IGNORECASE) ile aynı).
+    """
+    
+    def __init__(self, keywords, word_boundary=False):
+        self.keywords = sorted(set(keywords), key=len, reverse=True)
+        boundary = r'\b' if word_boundary else ''
+        trie = {}
+        for keyword in self.keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = True
+        self.pattern = re.compile(
+            r'(?=' + boundary + '(' + _trie_to_regex(trie) + ')' + boundary + ')', re.IGNORECASE
+        )
+        self.keyword_patterns = {
+            keyword: re.compile(boundary + re.escape(keyword) + boundary, re.IGNORECASE)
+            for keyword in self.keywords
+        }
+        self.prefixes = {
+            keyword: [other for other in self.keywords if other != keyword and keyword.startswith(other)]
+            for keyword in self.keywords
+        }
+    
+    def keywords_at(self, match, text):
+        """finditer eşleşmesinin pozisyonunda başlayan tüm anahtar kelimeler"""
+        position = match.start()
+        longest = match.group(1)
+        if longest not in self.prefixes:
+            # Büyük/küçük harf eşdeğeri farklı karakter (ör. 'ı' / 'i')
+            longest = next(keyword for keyword in self.keywords
+                           if self.keyword_patterns[keyword].match(text, position))
+        found = [longest]
+        for prefix in self.prefixes[longest]:
+            if self.keyword_patterns[prefix].match(text, position):
+                found.append(prefix)
+        return found
+
+class CVFieldExtractor:
+    """
+    parse_cv_content için alan çıkarıcı.
+    
+    Metin background anahtar kelimeleri ve pattern anchor'ları için birer kez,
+    rakam pozisyonları için C seviyesindeki regex'lerle taranır. Pattern'ler sonra sadece anchor pozisyonlarında
+    çalıştırılır ve ".*" devamları önceden bulunan pozisyonlardan ikili arama
+    ile çözülür; toplam iş metin uzunluğuyla doğrusal kalır. Sonuçlar her
+    pattern'i sırayla re.search ile denemekle aynıdır.
+    """
+    
+    def __init__(self, field_patterns, background_keywords):
+        self.field_patterns = {
+            field: [pattern._replace(head=re.compile(pattern.head, re.IGNORECASE)) for pattern in patterns]
+            for field, patterns in field_patterns.items()
+        }
+        self.background_keywords = background_keywords
+        self.background_fields = {}
+        for field, keywords in background_keywords.items():
+            for keyword in keywords:
+                self.background_fields.setdefault(keyword, []).append(field)
+        self.background_scanner = KeywordScanner(self.background_fields, word_boundary=True)
+        
+        anchors = {
+            keyword
+            for patterns in field_patterns.values() for pattern in patterns
+            for keyword in (pattern.anchor, pattern.tail)
+            if keyword and keyword not in DIGIT_POSITION_PATTERNS
+        }
+        self.anchor_scanner = KeywordScanner(anchors)
+    
+    def find_backgrounds(self, text_lower):
+        found = set()
+        for match in self.background_scanner.pattern.finditer(text_lower):
+            for keyword in self.background_scanner.keywords_at(match, text_lower):
+                found.update(self.background_fields[keyword])
+        # CV_BACKGROUND_KEYWORDS sırasıyla
+        return [field for field in self.background_keywords if field in found]
+    
+    def scan_positions(self, text_lower):
+        """Anchor/tail pozisyonları (her biri artan sırada)"""
+        positions = {
+            name: [match.start() for match in pattern.finditer(text_lower)]
+            for name, pattern in DIGIT_POSITION_PATTERNS.items()
+        }
+        scanner = self.anchor_scanner
+        for match in scanner.pattern.finditer(text_lower):
+            for keyword in scanner.keywords_at(match, text_lower):
+                positions.setdefault(keyword, []).append(match.start())
+        return positions
+    
+    def first_match(self, pattern, text_lower, positions, newlines):
+        """pattern'in metindeki ilk eşleşmesinin değeri (re.search(...).group(1) ile aynı)"""
+        for position in positions.get(pattern.anchor, ()):
+            match = pattern.head.match(text_lower, position)
+            if match is None:
+                continue
+            if pattern.tail is None:
+                return match.group(1)
+            
+            # Devam aynı satırda olmalı ('.' yeni satırla eşleşmez)
+            tail_positions = positions.get(pattern.tail, ())
+            index = bisect_left(tail_positions, match.end())
+            if index == len(tail_positions):
+                continue
+            tail_start = tail_positions[index]
+            line_end_index = bisect_left(newlines, match.end())
+            if line_end_index < len(newlines) and newlines[line_end_index] < tail_start:
+                continue
+            if not pattern.lazy:
+                return match.group(1)
+            if pattern.tail == DECIMAL:
+                return text_lower[tail_start:tail_start + 3]
+            # \d{2,3} (açgözlü)
+            if tail_start + 2 < len(text_lower) and text_lower[tail_start + 2].isdecimal():
+                return text_lower[tail_start:tail_start + 3]
+            return text_lower[tail_start:tail_start + 2]
+        return None
+    
+    def first_valid(self, field, text_lower, positions, newlines, convert, valid=lambda value: True):
+        """Alanın pattern'lerini sırayla dene; ilk geçerli değeri döndür"""
+        for pattern in self.field_patterns[field]:
+            value = self.first_match(pattern, text_lower, positions, newlines)
+            if value is None:
+                continue
+            try:
+                value = convert(value)
+            except ValueError:
+                continue
+            if valid(value):
+                return value
         return None
+    
+    def extract(self, text_lower):
+        """Metinden bulunan alanları döndür (bulunamayanlar dahil edilmez)"""
+        extracted_data = {}
+        positions = self.scan_positions(text_lower)
+        newlines = [match.start() for match in re.finditer('\n', text_lower)]
+        
+        def first_valid(field, convert, valid=lambda value: True):
+            return self.first_valid(field, text_lower, positions, newlines, convert, valid)
+        
+        gpa = first_valid('gpa', float, lambda value: 0 <= value <= 4.0)
+        if gpa is not None:
+            extracted_data['gpa'] = gpa
+        
+        # Sonraki test öncekinin üzerine yazar (TOEFL < IELTS < YDS)
+        for field, convert, maximum in (('toefl', int, 120), ('ielts', float, 9), ('yds', int, 100)):
+            score = first_valid(field, convert, lambda value, maximum=maximum: 0 <= value <= maximum)
+            if score is not None:
+                extracted_data['language_test_type'] = field
+                extracted_data['language_test_score'] = score
+        
+        found_backgrounds = self.find_backgrounds(text_lower)
+        if found_backgrounds:
+            extracted_data['background'] = found_backgrounds
+        
+        research = first_valid('research_experience', float)
+        if research is not None:
+            extracted_data['research_experience'] = research
+        
+        work = first_valid('work_experience', float)
+        if work is not None:
+            extracted_data['work_experience'] = work
+        
+        publications = first_valid('publications', int)
+        if publications is not None:
+            extracted_data['publications'] = publications
+        
+        return extracted_data
+
+cv_field_extractor = CVFieldExtractor(CV_FIELD_PATTERNS, CV_BACKGROUND_KEYWORDS)
 
 def parse_cv_content(text):
     """
@@ -1018,6 +1707,7 @@ def parse_cv_content(text):
     if not text:
         return {}
     
+    text = text[:CV_PARSE_MAX_CHARS]
     text_lower = text.lower()
     extracted_data = {}
     
@@ -1027,158 +1717,8 @@ def parse_cv_content(text):
     extracted_data['raw_skills'] = skills_data['raw_skills']
     extracted_data['skill_categories'] = skills_data['skill_categories']
     
-    # GPA extraction - daha kapsamlı pattern'ler
-    gpa_patterns = [
-        r'gpa[:\s]*([0-9]+\.[0-9]+)',
-        r'grade point average[:\s]*([0-9]+\.[0-9]+)',
-        r'not ortalaması[:\s]*([0-9]+\.[0-9]+)',
-        r'not[:\s]*([0-9]+\.[0-9]+)',
-        r'([0-9]\.[0-9]+)\s*/\s*4\.0',
-        r'([0-9]\.[0-9]+)\s*out of\s*4\.0',
-        r'([0-9]\.[0-9]+)\s*\(4\.0',
-        r'cgpa[:\s]*([0-9]+\.[0-9]+)',
-        r'cumulative gpa[:\s]*([0-9]+\.[0-9]+)'
-    ]
-    for pattern in gpa_patterns:
-        match = re.search(pattern, text_lower, re.IGNORECASE)
-        if match:
-            try:
-                gpa = float(match.group(1))
-                if 0 <= gpa <= 4.0:
-                    extracted_data['gpa'] = gpa
-                    break
-            except:
-                continue
-    
-    # Language scores - daha kapsamlı pattern'ler
-    toefl_patterns = [
-        r'toefl[:\s]*(\d{2,3})',
-        r'toefl ibt[:\s]*(\d{2,3})',
-        r'toefl.*?(\d{2,3})',
-        r'(\d{2,3})\s*toefl'
-    ]
-    for pattern in toefl_patterns:
-        match = re.search(pattern, text_lower, re.IGNORECASE)
-        if match:
-            try:
-                score = int(match.group(1))
-                if 0 <= score <= 120:
-                    extracted_data['language_test_type'] = 'toefl'
-                    extracted_data['language_test_score'] = score
-                    break
-            except:
-                continue
-    
-    ielts_patterns = [
-        r'ielts[:\s]*(\d\.\d)',
-        r'ielts academic[:\s]*(\d\.\d)',
-        r'ielts.*?(\d\.\d)',
-        r'(\d\.\d)\s*ielts'
-    ]
-    for pattern in ielts_patterns:
-        match = re.search(pattern, text_lower, re.IGNORECASE)
-        if match:
-            try:
-                score = float(match.group(1))
-                if 0 <= score <= 9:
-                    extracted_data['language_test_type'] = 'ielts'
-                    extracted_data['language_test_score'] = score
-                    break
-            except:
-                continue
-    
-    yds_patterns = [
-        r'yds[:\s]*(\d{2,3})',
-        r'eyds[:\s]*(\d{2,3})',
-        r'yökdil[:\s]*(\d{2,3})',
-        r'e-yökdil[:\s]*(\d{2,3})'
-    ]
-    for pattern in yds_patterns:
-        match = re.search(pattern, text_lower, re.IGNORECASE)
-        if match:
-            try:
-                score = int(match.group(1))
-                if 0 <= score <= 100:
-                    extracted_data['language_test_type'] = 'yds'
-                    extracted_data['language_test_score'] = score
-                    break
-            except:
-                continue
-    
-    # Background fields extraction - daha kapsamlı
-    background_keywords = {
-        'computer science': ['computer science', 'cs', 'bilgisayar', 'bilgisayar bilimi', 'computer engineering'],
-        'engineering': ['engineering', 'mühendislik', 'engineer'],
-        'robotics': ['robotics', 'robotik', 'robot'],
-        'data science': ['data science', 'veri bilimi', 'data scientist', 'machine learning', 'ml'],
-        'mechanical engineering': ['mechanical engineering', 'makine mühendisliği', 'mechanical'],
-        'electrical engineering': ['electrical engineering', 'elektrik mühendisliği', 'electrical', 'ee'],
-        'mathematics': ['mathematics', 'matematik', 'math', 'applied math'],
-        'physics': ['physics', 'fizik'],
-        'software engineering': ['software engineering', 'yazılım mühendisliği', 'software'],
-        'artificial intelligence': ['artificial intelligence', 'ai', 'yapay zeka'],
-        'control systems': ['control systems', 'kontrol sistemleri', 'control engineering'],
-        'statistics': ['statistics', 'istatistik']
-    }
-    
-    found_backgrounds = []
-    for field, keywords in background_keywords.items():
-        for keyword in keywords:
-            # Kelime sınırları ile arama (tam kelime eşleşmesi)
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                found_backgrounds.append(field)
-                break
-    
-    if found_backgrounds:
-        extracted_data['background'] = list(set(found_backgrounds))
-    
-    # Research experience - daha esnek pattern'ler
-    research_patterns = [
-        r'research[:\s]*(\d+\.?\d*)\s*(?:year|yıl|yr)',
-        r'araştırma[:\s]*(\d+\.?\d*)\s*(?:year|yıl|yr)',
-        r'(\d+\.?\d*)\s*(?:year|yıl|yr).*research',
-        r'research assistant[:\s]*(\d+\.?\d*)',
-        r'ra[:\s]*(\d+\.?\d*)'
-    ]
-    for pattern in research_patterns:
-        match = re.search(pattern, text_lower, re.IGNORECASE)
-        if match:
-            try:
-                extracted_data['research_experience'] = float(match.group(1))
-                break
-            except:
-                continue
-    
-    # Work experience - daha esnek pattern'ler
-    work_patterns = [
-        r'work experience[:\s]*(\d+\.?\d*)\s*(?:year|yıl|yr)',
-        r'experience[:\s]*(\d+\.?\d*)\s*(?:year|yıl|yr)',
-        r'(\d+\.?\d*)\s*(?:year|yıl|yr).*experience',
-        r'(\d+)\s*(?:year|yıl|yr).*work',
-        r'professional experience[:\s]*(\d+\.?\d*)',
-        r'employment[:\s]*(\d+\.?\d*)'
-    ]
-    for pattern in work_patterns:
-        match = re.search(pattern, text_lower, re.IGNORECASE)
-        if match:
-            try:
-                extracted_data['work_experience'] = float(match.group(1))
-                break
-            except:
-                continue
-    
-    # Publications
-    pub_patterns = [
-        r'(\d+)\s*(?:publication|yayın|paper|makale)',
-        r'publication[:\s]+(\d+)',
-        r'(\d+)\s*published'
-    ]
-    for pattern in pub_patterns:
-        match = re.search(pattern, text_lower, re.IGNORECASE)
-        if match:
-            extracted_data['publications'] = int(match.group(1))
-            break
+    # GPA, dil skorları, background, deneyim ve yayınlar (tek geçiş)
+    extracted_data.update(cv_field_extractor.extract(text_lower))
     
     # Country detection
     if 'türkiye' in text_lower or 'turkey' in text_lower:
@@ -1215,10 +1755,131 @@ def parse_cv_content(text):
     
     return extracted_data
 
+def analyze_cv_file(file_type, source, progress=None, cache_key=None):
+    """
+    Yüklenen CV dosyasından text çıkar, doğrula ve bilgileri parse et.
+    
+    Args:
+        source: Dosya içeriği (bytes) veya diskteki upload'ın yolu
+        progress: İsteğe bağlı, aşama adıyla çağrılır ('extracting', 'parsing')
+        cache_key: İçeriğin SHA-256 özeti (verilmezse source'tan hesaplanır)
+    
+    Returns:
+        tuple: (response body dict, HTTP status code)
+    """
+    # Aynı dosya daha önce parse edildiyse cache'ten dön
+    if cache_key is None:
+        cache_key = content_hash(source)
+    cached = cv_parse_cache.get(cache_key)
+    
+    # Text extraction
+    text = None
+    extraction = None
+    if cached is not None:
+        print("⚡ CV cache'te bulundu, parse atlanıyor")
+        text = cached['text']
+        extraction = cached.get('extraction')
+    elif file_type == PDF_MIME_TYPE and not PDF_AVAILABLE:
+        return {
+            "success": False,
+            "error": "PDF parsing kütüphanesi yüklü değil"
+        }, 500
+    elif file_type in DOCX_MIME_TYPES and not DOCX_AVAILABLE:
+        return {
+            "success": False,
+            "error": "DOCX parsing kütüphanesi yüklü değil"
+        }, 500
+    elif file_type != PDF_MIME_TYPE and file_type not in DOCX_MIME_TYPES:
+        return {
+            "success": False,
+            "error": "Desteklenmeyen dosya formatı. PDF veya DOCX yükleyin."
+        }, 400
+    else:
+        if progress:
+            progress('extracting')
+        try:
+            extraction = cv_extraction_pool.extract(file_type, source)
+        except ExtractionPoolBusy:
+            return {
+                "success": False,
+                "error": "CV analiz servisi şu anda yoğun. Lütfen birkaç saniye sonra tekrar deneyin.",
+                "retry": True
+            }, 503
+        except ExtractionTimeout:
+            return {
+                "success": False,
+                "error": "CV analizi zaman aşımına uğradı. Daha kısa bir dosya deneyin.",
+                "timeout": True
+            }, 503
+        if extraction is not None:
+            text = extraction.pop('text')
+            print(f"📑 Text çıkarıldı ({extraction['engine']}, sayfalar: {extraction['pages_parsed']})")
+    
+    if not text or len(text.strip()) < 50:
+        return {
+            "success": False,
+            "error": "CV content could not be extracted or is too short. Please upload a valid CV."
+        }, 400
+    
+    # CV içeriği validasyonu
+    text_lower = text.lower()
+    cv_keywords = ['education', 'experience', 'skill', 'university', 'gpa', 'grade', 'work', 'employment']
+    found_keywords = [kw for kw in cv_keywords if kw in text_lower]
+    
+    if len(found_keywords) < 3:
+        return {
+            "success": False,
+            "error": "Bu dosya bir CV gibi görünmüyor. Lütfen geçerli bir CV yükleyin."
+        }, 400
+    
+    # Bilgileri çıkar
+    if cached is not None:
+        extracted_data = cached['extracted_data']
+    else:
+        if progress:
+            progress('parsing')
+        print("🔍 CV içeriği parse ediliyor...")
+        extracted_data = parse_cv_content(text)
+        print(f"✅ Parse edilen veriler: {extracted_data}")
+        cv_parse_cache.put(cache_key, text, extracted_data, extraction)
+    
+    return {
+        "success": True,
+        "extracted_text": text[:500],  # İlk 500 karakter (debug için)
+        "extracted_data": extracted_data,
+        "confidence": len(found_keywords) / len(cv_keywords),
+        "cached": cached is not None,
+        # engine, page_count, pages_parsed, truncated, stop_reason
+        "extraction": extraction
+    }, 200
+
+# Asenkron CV parse kuyruğu (?async=true ile kullanılır)
+CV_JOB_WORKERS = int(os.environ.get('CV_JOB_WORKERS', '2'))
+CV_JOB_MAX_PENDING = int(os.environ.get('CV_JOB_MAX_PENDING', '100'))
+CV_JOB_TTL = int(os.environ.get('CV_JOB_TTL', '600'))
+MAX_JOB_WAIT_SECONDS = 30
+
+# Dosya başına maksimum CV boyutu (okurken uygulanır, aşılırsa 413)
+MAX_CV_UPLOAD_BYTES = int(os.environ.get('MAX_CV_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+UploadRequest.upload_limits['parse_cv'] = MAX_CV_UPLOAD_BYTES
+
+cv_job_queue = CVJobQueue(
+    analyze_cv_file,
+    store=InMemoryJobStore(ttl_seconds=CV_JOB_TTL),
+    workers=CV_JOB_WORKERS,
+    max_pending=CV_JOB_MAX_PENDING
+)
+
 @app.route('/api/parse-cv', methods=['POST', 'OPTIONS'])
 @rate_limit
 def parse_cv():
-    """CV dosyasını parse et ve bilgileri çıkar"""
+    """
+    CV dosyasını parse et ve bilgileri çıkar.
+    
+    ?async=true (veya form alanı async=true) ile dosyalar kuyruğa alınır ve
+    hemen job ID döner; birden fazla 'cv' dosyası yüklenebilir. Sonuç
+    /api/parse-cv/jobs/<job_id> (veya .../wait long-poll) ile alınır.
+    """
     if request.method == 'OPTIONS':
         return '', 200
     
@@ -1234,75 +1895,62 @@ def parse_cv():
                 "error": "CV dosyası bulunamadı"
             }), 400
         
-        file = request.files['cv']
-        print(f"📄 Dosya alındı: {file.filename}, type: {file.content_type}, size: {len(file.read())}")
-        
-        # Dosyayı tekrar oku (read() dosyayı tüketir)
-        file.seek(0)
-        file_content = file.read()
-        
-        if file.filename == '' or len(file_content) == 0:
-            print("❌ Dosya boş")
-            return jsonify({
-                "success": False,
-                "error": "Dosya seçilmedi veya boş"
-            }), 400
-        
-        # Dosya tipi kontrolü
-        file_type = file.content_type
-        print(f"📋 Dosya tipi: {file_type}")
+        async_mode = (request.args.get('async') or request.form.get('async') or 'false').lower() == 'true'
+        files = request.files.getlist('cv') if async_mode else [request.files['cv']]
         
-        # Text extraction
-        text = None
-        if file_type == 'application/pdf':
-            if not PDF_AVAILABLE:
-                return jsonify({
-                    "success": False,
-                    "error": "PDF parsing kütüphanesi yüklü değil"
-                }), 500
-            text = extract_text_from_pdf(file_content)
-        elif file_type in ['application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'application/msword']:
-            if not DOCX_AVAILABLE:
+        # Dosyalar diske yazıldı (file.stream: SpooledUpload); içerik belleğe okunmaz
+        for file in files:
+            upload = file.stream
+            print(f"📄 Dosya alındı: {file.filename}, type: {file.content_type}, size: {upload.size}")
+            
+            if file.filename == '' or upload.size == 0:
+                print("❌ Dosya boş")
                 return jsonify({
                     "success": False,
-                    "error": "DOCX parsing kütüphanesi yüklü değil"
-                }), 500
-            text = extract_text_from_docx(file_content)
-        else:
-            return jsonify({
-                "success": False,
-                "error": "Desteklenmeyen dosya formatı. PDF veya DOCX yükleyin."
-            }), 400
-        
-        if not text or len(text.strip()) < 50:
-            return jsonify({
-                "success": False,
-                "error": "CV content could not be extracted or is too short. Please upload a valid CV."
-            }), 400
+                    "error": "Dosya seçilmedi veya boş"
+                }), 400
+            
+            # Dosya tipi kontrolü
+            print(f"📋 Dosya tipi: {file.content_type}")
         
-        # CV içeriği validasyonu
-        text_lower = text.lower()
-        cv_keywords = ['education', 'experience', 'skill', 'university', 'gpa', 'grade', 'work', 'employment']
-        found_keywords = [kw for kw in cv_keywords if kw in text_lower]
+        if not async_mode:
+            file = files[0]
+            body, status_code = analyze_cv_file(file.content_type, file.stream.path, cache_key=file.stream.sha256)
+            return jsonify(body), status_code
         
-        if len(found_keywords) < 3:
-            return jsonify({
-                "success": False,
-                "error": "Bu dosya bir CV gibi görünmüyor. Lütfen geçerli bir CV yükleyin."
-            }), 400
-        
-        # Bilgileri çıkar
-        print("🔍 CV içeriği parse ediliyor...")
-        extracted_data = parse_cv_content(text)
-        print(f"✅ Parse edilen veriler: {extracted_data}")
+        jobs = []
+        for file in files:
+            upload = file.stream
+            try:
+                # Dosya request bitince silinmez, iş bitince silinir
+                job = cv_job_queue.submit(
+                    file.content_type, upload.keep().path,
+                    filename=file.filename, cache_key=upload.sha256, on_finish=upload.discard
+                )
+            except QueueFull:
+                upload.discard()
+                return jsonify({
+                    "success": False,
+                    "error": "CV analiz kuyruğu dolu. Lütfen birkaç saniye sonra tekrar deneyin.",
+                    "retry": True,
+                    "jobs": jobs
+                }), 503
+            job['status_url'] = f"/api/parse-cv/jobs/{job['job_id']}"
+            job['wait_url'] = f"/api/parse-cv/jobs/{job['job_id']}/wait"
+            jobs.append(job)
         
         return jsonify({
             "success": True,
-            "extracted_text": text[:500],  # İlk 500 karakter (debug için)
-            "extracted_data": extracted_data,
-            "confidence": len(found_keywords) / len(cv_keywords)
-        })
+            "async": True,
+            "job_id": jobs[0]['job_id'],
+            "jobs": jobs
+        }), 202
         
+    except RequestEntityTooLarge:
+        return jsonify({
+            "success": False,
+            "error": f"Dosya çok büyük. Maksimum boyut: {MAX_CV_UPLOAD_BYTES // (1024 * 1024)}MB"
+        }), 413
     except Exception as e:
         import traceback
         print(f"❌ CV parsing error: {e}")
@@ -1312,6 +1960,210 @@ def parse_cv():
             "error": f"CV analiz edilirken hata oluştu: {str(e)}"
         }), 500
 
+@app.route('/api/parse-cv/jobs/<job_id>', methods=['GET'])
+def parse_cv_job(job_id):
+    """Asenkron CV parse işinin durumu ve (bittiyse) sonucu"""
+    job = cv_job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Job bulunamadı veya süresi doldu"
+        }), 404
+    return jsonify({"success": True, "job": job})
+
+@app.route('/api/parse-cv/jobs/<job_id>/wait', methods=['GET'])
+def parse_cv_job_wait(job_id):
+    """Long-poll: iş bitene kadar (en fazla ?timeout= saniye) bekle"""
+    try:
+        timeout = min(float(request.args.get('timeout', 25)), MAX_JOB_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "timeout sayı olmalıdır"
+        }), 400
+    
+    job = cv_job_queue.wait(job_id, max(timeout, 0))
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Job bulunamadı veya süresi doldu"
+        }), 404
+    return jsonify({"success": True, "job": job})
+
+# =============================================================================
+# BULK CV INGESTION (ajans hesapları)
+# =============================================================================
+# Zip arşivi ('archive') veya çoklu 'cv' dosyası kabul edilir; her belge
+# paralel olarak parse edilir ve sonuçlar bittikçe NDJSON satırı olarak akar.
+
+MAX_BULK_UPLOAD_BYTES = int(os.environ.get('MAX_BULK_UPLOAD_BYTES', str(200 * 1024 * 1024)))
+MAX_BULK_FILES = int(os.environ.get('MAX_BULK_FILES', '500'))
+# Aynı anda işlenen belge sayısı (extraction pool'u interaktif isteklere de açık bırakır)
+CV_BULK_CONCURRENCY = int(os.environ.get('CV_BULK_CONCURRENCY', str(max(1, CV_EXTRACT_WORKERS))))
+BULK_BUSY_RETRIES = 20
+UploadRequest.upload_limits['parse_cv_bulk'] = MAX_BULK_UPLOAD_BYTES
+
+CV_FILE_TYPES = {
+    '.pdf': PDF_MIME_TYPE,
+    '.docx': DOCX_MIME_TYPES[0],
+    '.doc': DOCX_MIME_TYPES[1]
+}
+
+def cv_file_type(filename, content_type=None):
+    """Dosya tipini content type'tan, yoksa uzantıdan belirle"""
+    if content_type == PDF_MIME_TYPE or content_type in DOCX_MIME_TYPES:
+        return content_type
+    return CV_FILE_TYPES.get(os.path.splitext(filename or '')[1].lower())
+
+def collect_bulk_documents():
+    """
+    Request'teki belgeleri listele.
+    
+    Returns:
+        tuple: ([(filename, file_type, load)], archives, error) - load() belgeyi
+        (bytes veya dosya yolu, cache key) olarak döndürür; archives yanıt
+        bitince kapatılacak zip dosyalarıdır
+    """
+    documents = []
+    archives = []
+    
+    archive = request.files.get('archive')
+    if archive is not None:
+        try:
+            zip_file = zipfile.ZipFile(archive.stream.path)
+        except zipfile.BadZipFile:
+            return None, archives, "Geçersiz zip arşivi"
+        archives.append(zip_file)
+        
+        for info in zip_file.infolist():
+            name = info.filename
+            base_name = os.path.basename(name)
+            if info.is_dir() or name.startswith('__MACOSX/') or base_name.startswith('.'):
+                continue
+            if info.file_size > MAX_CV_UPLOAD_BYTES:
+                documents.append((name, None, None))
+                continue
+            
+            def load(info=info):
+                # Zip bombasına karşı beyan edilen boyuttan fazlası okunmaz
+                with zip_file.open(info) as entry:
+                    content = entry.read(MAX_CV_UPLOAD_BYTES + 1)
+                if len(content) > MAX_CV_UPLOAD_BYTES:
+                    raise ValueError("Dosya boyutu sınırı aşıldı")
+                return content, content_hash(content)
+            
+            documents.append((name, cv_file_type(name), load))
+    
+    for file in request.files.getlist('cv'):
+        upload = file.stream
+        if upload.size > MAX_CV_UPLOAD_BYTES:
+            documents.append((file.filename, None, None))
+            continue
+        documents.append((
+            file.filename,
+            cv_file_type(file.filename, file.content_type),
+            lambda upload=upload: (upload.path, upload.sha256)
+        ))
+    
+    if not documents:
+        return None, archives, "Belge bulunamadı ('archive' zip dosyası veya 'cv' dosyaları gönderin)"
+    if len(documents) > MAX_BULK_FILES:
+        return None, archives, f"En fazla {MAX_BULK_FILES} belge gönderilebilir"
+    return documents, archives, None
+
+def analyze_bulk_document(filename, file_type, load):
+    """Tek bir bulk belgeyi parse et (extraction pool doluysa bekleyip tekrar dener)"""
+    if load is None:
+        return {
+            "success": False,
+            "error": f"Dosya çok büyük. Maksimum boyut: {MAX_CV_UPLOAD_BYTES // (1024 * 1024)}MB"
+        }, 413
+    if file_type is None:
+        return {
+            "success": False,
+            "error": "Desteklenmeyen dosya formatı. PDF veya DOCX yükleyin."
+        }, 400
+    
+    source, cache_key = load()
+    for attempt in range(BULK_BUSY_RETRIES):
+        body, status_code = analyze_cv_file(file_type, source, cache_key=cache_key)
+        if not body.get('retry'):
+            break
+        time.sleep(0.25 * (attempt + 1))
+    return body, status_code
+
+@app.route('/api/parse-cv/bulk', methods=['POST'])
+@require_tier('pro')
+@rate_limit
+def parse_cv_bulk():
+    """
+    Toplu CV parse (zip veya çoklu dosya).
+    
+    Request (multipart/form-data):
+        archive: CV'leri içeren zip dosyası, ve/veya
+        cv: Bir veya daha fazla PDF/DOCX dosyası
+    
+    Response (application/x-ndjson), her belge bittiğinde bir satır:
+        {"index": 3, "filename": "ayse.pdf", "status_code": 200, "success": true,
+         "extracted_data": {...}, ...}
+    Son satır: {"done": true, "count": 200, "succeeded": 198, "failed": 2}
+    """
+    try:
+        documents, archives, error = collect_bulk_documents()
+    except RequestEntityTooLarge:
+        return jsonify({
+            "success": False,
+            "error": f"Yükleme çok büyük. Maksimum boyut: {MAX_BULK_UPLOAD_BYTES // (1024 * 1024)}MB"
+        }), 413
+    if error:
+        for archive in archives:
+            archive.close()
+        return jsonify({"success": False, "error": error}), 400
+    
+    def generate():
+        succeeded = 0
+        executor = ThreadPoolExecutor(max_workers=CV_BULK_CONCURRENCY, thread_name_prefix='cv-bulk')
+        try:
+            futures = {
+                executor.submit(analyze_bulk_document, filename, file_type, load): (index, filename)
+                for index, (filename, file_type, load) in enumerate(documents)
+            }
+            for future in as_completed(futures):
+                index, filename = futures[future]
+                try:
+                    body, status_code = future.result()
+                except Exception as e:
+                    body, status_code = {"success": False, "error": f"CV analiz edilirken hata oluştu: {str(e)}"}, 500
+                if body.get('success'):
+                    succeeded += 1
+                line = {"index": index, "filename": filename, "status_code": status_code}
+                line.update(body)
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+            
+            yield json.dumps({
+                "done": True,
+                "count": len(documents),
+                "succeeded": succeeded,
+                "failed": len(documents) - succeeded
+            }) + "\n"
+        finally:
+            # İstemci bağlantıyı kapatırsa bekleyen belgeler iptal edilir
+            executor.shutdown(wait=False, cancel_futures=True)
+            for archive in archives:
+                archive.close()
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/parse-cv/metrics', methods=['GET'])
+def parse_cv_metrics():
+    """CV extraction pool ve parse cache metrikleri"""
+    return jsonify({
+        "success": True,
+        "extraction_pool": cv_extraction_pool.stats(),
+        "parse_cache": cv_parse_cache.stats(),
+        "job_queue": cv_job_queue.stats()
+    })
+
 @app.route('/api/feedback', methods=['POST'])
 @rate_limit
 def submit_feedback():
@@ -1394,9 +2246,16 @@ def root():
         "endpoints": {
             "core": {
                 "health": "GET /api/health",
+                # Kapalı rapor index'te de görünmez
+                **({"memory": "GET /api/health/memory (Pro)"} if MEMORY_REPORT_ENABLED else {}),
                 "universities": "GET /api/universities",
                 "match": "POST /api/match",
-                "parse_cv": "POST /api/parse-cv"
+                "match_batch": "POST /api/match/batch",
+                "parse_cv": "POST /api/parse-cv (?async=true for background jobs)",
+                "parse_cv_job": "GET /api/parse-cv/jobs/<job_id>",
+                "parse_cv_job_wait": "GET /api/parse-cv/jobs/<job_id>/wait?timeout=25",
+                "parse_cv_bulk": "POST /api/parse-cv/bulk (Pro, zip or multiple files -> NDJSON)",
+                "parse_and_match": "POST /api/parse-and-match (cv file + options JSON, ?partial=true -> NDJSON)"
             },
             "skills": {
                 "normalize": "POST /api/skills/normalize",
@@ -1425,6 +2284,73 @@ def health_check():
     """API sağlık kontrolü"""
     return jsonify({"status": "ok", "message": "API is running"})
 
+def process_memory():
+    """Sürecin bellek kullanımı (MB): current_rss (Linux), peak_rss"""
+    memory = {"current_rss_mb": None, "peak_rss_mb": None}
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        memory["current_rss_mb"] = round(resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux'ta KB, macOS'ta byte
+        memory["peak_rss_mb"] = round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    return memory
+
+# Bellek raporu süreç iç durumunu gösterir: varsayılan kapalı, açıkken pro tier
+# (API key) gerekir
+MEMORY_REPORT_ENABLED = os.environ.get('MEMORY_REPORT_ENABLED', 'false').lower() == 'true'
+# gc.get_objects() tüm heap'i gezer; sayım en fazla bu aralıkla (saniye) yenilenir
+MEMORY_REPORT_GC_INTERVAL = float(os.environ.get('MEMORY_REPORT_GC_INTERVAL', '60'))
+
+_gc_census = {"objects": None, "at": 0.0}
+_gc_census_lock = threading.Lock()
+
+def gc_object_census():
+    """
+    Takip edilen nesne sayısı ve sayımın yaşı (saniye).
+    Sayım lock altında yapılır; eşzamanlı istekler aynı sonucu paylaşır.
+    """
+    with _gc_census_lock:
+        now = time.monotonic()
+        if _gc_census["objects"] is None or now - _gc_census["at"] >= MEMORY_REPORT_GC_INTERVAL:
+            _gc_census["objects"] = len(gc.get_objects())
+            _gc_census["at"] = now
+        return _gc_census["objects"], round(now - _gc_census["at"], 1)
+
+@app.route('/api/health/memory', methods=['GET'])
+def memory_report():
+    """Süreç bazlı bellek raporu (worker başına; her gunicorn worker kendi raporunu verir)"""
+    # Flag tier kontrolünden önce: kapalıyken herkes 404 alır (403 route'u ele vermez)
+    if not MEMORY_REPORT_ENABLED:
+        return jsonify({"success": False, "error": "Not found"}), 404
+    return pro_memory_report()
+
+@require_tier('pro')
+def pro_memory_report():
+    gc_objects, gc_objects_age = gc_object_census()
+    report = {
+        "pid": os.getpid(),
+        "process": process_memory(),
+        "gc_objects": gc_objects,
+        "gc_objects_age_s": gc_objects_age,
+        "cv_parse_cache": cv_parse_cache.stats()
+    }
+    try:
+        from token_system import token_tracker
+        from token_counter import get_token_counter
+        report["token_history"] = token_tracker.memory_stats()
+        counter = get_token_counter()
+        report["token_counter_cache"] = counter.cache_info() if hasattr(counter, 'cache_info') else {}
+    except ImportError:
+        pass
+    return jsonify({"success": True, "memory": report})
+
 @app.route('/api/skills/normalize', methods=['POST'])
 def normalize_skills_endpoint():
     """
@@ -1637,9 +2563,17 @@ def get_universities():
     Query params:
         - include_expired: true/false (default: false)
         - country: Filter by country
+        - fields: Virgülle ayrılmış alanlar (örn. id,name,deadline_status)
+        - compact: true ise belgeler DOCUMENT_TEMPLATES anahtarlarıyla gönderilir
     """
     include_expired = request.args.get('include_expired', 'false').lower() == 'true'
     country_filter = request.args.get('country', '').strip()
+    fields, compact, error = parse_projection_params(
+        request.args.get('fields'), request.args.get('compact', 'false'), COMPACT_UNIVERSITY_FIELDS
+    )
+    if error:
+        return jsonify({"success": False, "error": error}), 400
+    templates_used = set()
     
     universities_with_status = []
     expired_count = 0
@@ -1657,21 +2591,21 @@ def get_universities():
             continue
         
         uni_copy = university.copy()
-        uni_copy['deadline_status'] = {
-            'has_active': has_active,
-            'next_deadline': next_deadline,
-            'days_remaining': days_remaining,
-            'urgency': 'critical' if days_remaining and days_remaining <= 7 else 
-                      'warning' if days_remaining and days_remaining <= 30 else 'normal'
-        }
+        uni_copy['deadline_status'] = build_deadline_status(has_active, next_deadline, days_remaining)
+        if fields or compact:
+            uni_copy = project_university(uni_copy, fields, compact, templates_used)
         universities_with_status.append(uni_copy)
     
-    return jsonify({
+    response = {
         "universities": universities_with_status,
         "total": len(universities_with_status),
         "expired_hidden": expired_count,
         "showing_active_only": not include_expired
-    })
+    }
+    if compact:
+        response["document_templates"] = document_templates_for(templates_used)
+    
+    return jsonify(response)
 
 def has_active_deadline(university):
     """
@@ -1708,6 +2642,103 @@ def has_active_deadline(university):
     
     return False, None, None
 
+def build_deadline_status(has_active, next_deadline, days_remaining):
+    """has_active_deadline çıktısından response'taki deadline_status'u oluştur"""
+    return {
+        'has_active': has_active,
+        'next_deadline': next_deadline,
+        'days_remaining': days_remaining,
+        'urgency': 'critical' if days_remaining and days_remaining <= 7 else 
+                  'warning' if days_remaining and days_remaining <= 30 else 'normal'
+    }
+
+def bucket_matches(matched_universities):
+    """Skora göre sıralı listeyi tek geçişte high/medium/low/extra gruplarına ayır"""
+    buckets = {"high_match": [], "medium_match": [], "low_match": [], "extra_options": []}
+    
+    # High match (70+), medium (50-70), low (30-50), very low (<30)
+    for university in matched_universities:
+        score = university['match_score']
+        if score >= 70:
+            buckets["high_match"].append(university)
+        elif score >= 50:
+            buckets["medium_match"].append(university)
+        elif score >= 30:
+            buckets["low_match"].append(university)
+        else:
+            buckets["extra_options"].append(university)
+    
+    return buckets
+
+def select_top_matches(scores, candidates, limit=None, offset=0):
+    """
+    Adayları skora göre (yüksekten düşüğe, eşitlikte katalog sırası) sırala
+    ve istenen sayfayı döndür.
+    
+    limit verilirse tam sıralama yerine heap ile sadece ilk offset + limit
+    eleman seçilir: O(M log k).
+    
+    Args:
+        scores: Üniversite indeksine göre skor listesi (yanıtta dönen yuvarlanmış değerler)
+        candidates: Filtrelenmiş üniversite indeksleri (katalog sırasında)
+    
+    Returns:
+        list: Sayfadaki üniversite indeksleri
+    """
+    if limit is None:
+        ordered = sorted(candidates, key=scores.__getitem__, reverse=True)
+        return ordered[offset:]
+    
+    # heapq.nlargest, sorted(..., reverse=True)[:n] ile aynı (stabil) sırayı verir
+    return heapq.nlargest(offset + limit, candidates, key=scores.__getitem__)[offset:]
+
+def parse_projection_params(fields_value, compact_value, default_fields):
+    """
+    fields/compact parametrelerini doğrula.
+    Compact modda fields verilmezse default_fields kullanılır.
+    
+    Returns:
+        tuple: (fields, compact, error_message)
+    """
+    if isinstance(compact_value, str):
+        compact_value = compact_value.lower() == 'true'
+    compact = bool(compact_value)
+    
+    try:
+        fields = parse_fields_param(fields_value)
+    except ValueError as e:
+        return None, compact, str(e)
+    
+    if fields is None and compact:
+        fields = list(default_fields)
+    
+    if fields:
+        unknown = [field for field in fields if field not in UNIVERSITY_RESPONSE_FIELDS]
+        if unknown:
+            return None, compact, f"Bilinmeyen alan(lar): {', '.join(unknown)}"
+    
+    return fields, compact, None
+
+def parse_pagination_params(data):
+    """
+    Request body'den limit/offset/min_score parametrelerini doğrula.
+    
+    Returns:
+        tuple: (limit, offset, min_score, error_message)
+    """
+    limit = data.get('limit')
+    offset = data.get('offset', 0)
+    min_score = data.get('min_score')
+    
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 1):
+        return None, 0, None, "limit pozitif bir tam sayı olmalı"
+    if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        return None, 0, None, "offset negatif olmayan bir tam sayı olmalı"
+    if min_score is not None and (isinstance(min_score, bool) or not isinstance(min_score, (int, float))):
+        return None, 0, None, "min_score sayı olmalı"
+    
+    return limit, offset, min_score, None
+
 
 @app.route('/api/match', methods=['POST'])
 @rate_limit
@@ -1722,62 +2753,315 @@ def match_universities():
         "language_score": 110,
         "motivation_letter": "...",
         "background": ["engineering", "robotics"],
-        "include_expired": false  // Opsiyonel: true ise geçmiş deadline'ları da göster
+        "include_expired": false,  // Opsiyonel: true ise geçmiş deadline'ları da göster
+        "limit": 20,               // Opsiyonel: sayfa başına okul (heap tabanlı top-k)
+        "offset": 0,               // Opsiyonel: sayfa başlangıcı
+        "min_score": 50,           // Opsiyonel: bu skorun altındakileri gösterme
+        "fields": ["id", "match_score"],  // Opsiyonel: satırlarda dönecek alanlar
+        "compact": true            // Opsiyonel: belgeler şablon anahtarlarıyla gönderilir
     }
     """
     try:
-        user_data = request.json
-        include_expired = user_data.get('include_expired', False)
+        body, status_code = build_match_response(request.json)
+        return jsonify(body), status_code
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+def build_match_response(user_data):
+    """
+    /api/match yanıtını üret (parse-and-match pipeline'ı da kullanır).
+    
+    Returns:
+        tuple: (response body dict, HTTP status code)
+    """
+    include_expired = user_data.get('include_expired', False)
+    limit, offset, min_score, error = parse_pagination_params(user_data)
+    if not error:
+        fields, compact, error = parse_projection_params(
+            user_data.get('fields'), user_data.get('compact', False), COMPACT_MATCH_FIELDS
+        )
+    if error:
+        return {"success": False, "error": error}, 400
+    
+    # Tüm katalog tek seferde skorlanır (MatchingEngine); sıralama, min_score
+    # filtresi ve dönen match_score aynı yuvarlanmış değeri kullanır
+    match_scores = matching_engine.match_scores(user_data)
+    
+    # Deadline ve min_score filtreleri vektörel uygulanır
+    active = matching_engine.active_mask()
+    expired_count = 0 if include_expired else int(np.count_nonzero(~active))
+    eligible = np.ones(len(UNIVERSITIES), dtype=bool) if include_expired else active
+    if min_score is not None:
+        eligible = eligible & (np.array(match_scores) >= min_score)
+    candidates = np.flatnonzero(eligible).tolist()
+    
+    # Sadece gösterilecek sayfa kopyalanır
+    page = select_top_matches(match_scores, candidates, limit, offset)
+    matched_universities = []
+    for index in page:
+        university = UNIVERSITIES[index]
+        has_active, next_deadline, days_remaining = has_active_deadline(university)
         
-        # Her okul için skor hesapla ve deadline kontrolü yap
-        matched_universities = []
-        expired_count = 0
+        university_copy = university.copy()
+        university_copy['match_score'] = match_scores[index]
         
-        for university in UNIVERSITIES:
-            # Deadline kontrolü
-            has_active, next_deadline, days_remaining = has_active_deadline(university)
-            
-            if not has_active and not include_expired:
-                expired_count += 1
-                continue  # Geçmiş deadline'ları atla
-            
-            university_copy = university.copy()
-            match_score = calculate_match_score(user_data, university)
-            university_copy['match_score'] = match_score
-            
-            # Deadline bilgisini ekle
-            university_copy['deadline_status'] = {
-                'has_active': has_active,
-                'next_deadline': next_deadline,
-                'days_remaining': days_remaining,
-                'urgency': 'critical' if days_remaining and days_remaining <= 7 else 
-                          'warning' if days_remaining and days_remaining <= 30 else 'normal'
+        # Deadline bilgisini ekle
+        university_copy['deadline_status'] = build_deadline_status(has_active, next_deadline, days_remaining)
+        
+        matched_universities.append(university_copy)
+    
+    results = bucket_matches(matched_universities)
+    templates_used = set()
+    if fields or compact:
+        results = {
+            bucket: [project_university(u, fields, compact, templates_used) for u in rows]
+            for bucket, rows in results.items()
+        }
+    
+    response = {
+        "success": True,
+        "results": results,
+        "user_data": user_data,
+        "pagination": {
+            "total": len(candidates),
+            "offset": offset,
+            "limit": limit,
+            "min_score": min_score,
+            "returned": len(page),
+            "has_more": offset + len(page) < len(candidates)
+        },
+        "filtered_info": {
+            "expired_universities_hidden": expired_count,
+            "showing_active_deadlines_only": not include_expired,
+            "tip": "Add 'include_expired': true to see all universities"
+        }
+    }
+    if compact:
+        response["document_templates"] = document_templates_for(templates_used)
+    
+    return response, 200
+
+# =============================================================================
+# PARSE-AND-MATCH PIPELINE
+# =============================================================================
+UploadRequest.upload_limits['parse_and_match'] = MAX_CV_UPLOAD_BYTES
+
+@app.route('/api/parse-and-match', methods=['POST', 'OPTIONS'])
+@rate_limit
+def parse_and_match():
+    """
+    CV'yi parse et ve çıkan profili aynı istekte eşleştir.
+    
+    Request (multipart/form-data):
+        cv: PDF/DOCX dosyası
+        options: Opsiyonel JSON; /api/match parametreleri (limit, offset,
+                 min_score, fields, compact, include_expired) ve CV'den çıkan
+                 alanların üzerine yazılacak değerler (ör. motivation_letter)
+        partial: 'true' ise yanıt NDJSON olarak akar; parse biter bitmez
+                 {"stage": "parsed", ...} satırı, ardından {"stage": "matched", ...}
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        if 'cv' not in request.files:
+            return jsonify({
+                "success": False,
+                "error": "CV dosyası bulunamadı"
+            }), 400
+        
+        file = request.files['cv']
+        upload = file.stream
+        if file.filename == '' or upload.size == 0:
+            return jsonify({
+                "success": False,
+                "error": "Dosya seçilmedi veya boş"
+            }), 400
+        
+        try:
+            options = json.loads(request.form.get('options') or '{}')
+        except ValueError:
+            options = None
+        if not isinstance(options, dict):
+            return jsonify({
+                "success": False,
+                "error": "options geçerli bir JSON nesnesi olmalı"
+            }), 400
+        
+        partial = (request.args.get('partial') or request.form.get('partial') or 'false').lower() == 'true'
+    except RequestEntityTooLarge:
+        return jsonify({
+            "success": False,
+            "error": f"Dosya çok büyük. Maksimum boyut: {MAX_CV_UPLOAD_BYTES // (1024 * 1024)}MB"
+        }), 413
+    
+    def parse_stage():
+        parse_body, status_code = analyze_cv_file(file.content_type, upload.path, cache_key=upload.sha256)
+        if not parse_body.get('success'):
+            return parse_body, status_code
+        return {
+            "success": True,
+            "extracted_data": parse_body['extracted_data'],
+            "cv": {
+                "confidence": parse_body['confidence'],
+                "cached": parse_body['cached'],
+                "extraction": parse_body['extraction']
             }
-            
-            matched_universities.append(university_copy)
+        }, 200
+    
+    def match_stage(extracted_data):
+        # CV'den çıkan veriler doğrudan eşleştirmeye girer; options üzerine yazar
+        user_data = dict(extracted_data)
+        user_data.update(options)
+        match_body, status_code = build_match_response(user_data)
+        # Profil parse aşamasında zaten döndü, tekrar serialize edilmez
+        match_body.pop('user_data', None)
+        return match_body, status_code
+    
+    if partial:
+        def generate():
+            try:
+                body, status_code = parse_stage()
+                yield json.dumps(dict(body, stage="parsed", status_code=status_code), ensure_ascii=False) + "\n"
+                if not body.get('success'):
+                    return
+                match_body, status_code = match_stage(body['extracted_data'])
+                yield json.dumps(dict(match_body, stage="matched", status_code=status_code), ensure_ascii=False) + "\n"
+            except Exception as e:
+                yield json.dumps({"stage": "error", "success": False, "error": str(e)}, ensure_ascii=False) + "\n"
         
-        # Sort by score (highest to lowest)
-        matched_universities.sort(key=lambda x: x['match_score'], reverse=True)
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    try:
+        body, status_code = parse_stage()
+        if not body.get('success'):
+            return jsonify(body), status_code
+        match_body, status_code = match_stage(body['extracted_data'])
+        if not match_body.get('success'):
+            return jsonify(match_body), status_code
+        body.update(match_body)
+        return jsonify(body), 200
+    except Exception as e:
+        print(f"❌ Parse-and-match error: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+# Tek istekte kabul edilen maksimum profil sayısı
+MAX_BATCH_PROFILES = 500
+
+@app.route('/api/match/batch', methods=['POST'])
+@rate_limit
+def match_universities_batch():
+    """
+    Birden fazla profili tek istekte eşleştir (danışmanlık ajansları için).
+    Tüm profiller katalogla tek seferde N x M matris olarak skorlanır.
+    
+    Request body:
+    {
+        "profiles": [
+            {"profile_id": "s-1", "gpa": 3.8, "background": ["engineering"], ...},
+            {"profile_id": "s-2", "gpa": 3.2, ...}
+        ],
+        "top_k": 10,              // Opsiyonel: profil başına en iyi k okul
+        "include_expired": false  // Opsiyonel
+    }
+    """
+    try:
+        data = request.json or {}
+        profiles = data.get('profiles', [])
+        include_expired = data.get('include_expired', False)
+        top_k = data.get('top_k')
         
-        # High match (70+), medium (50-70), low (30-50), very low (<30)
-        high_match = [u for u in matched_universities if u['match_score'] >= 70]
-        medium_match = [u for u in matched_universities if 50 <= u['match_score'] < 70]
-        low_match = [u for u in matched_universities if 30 <= u['match_score'] < 50]
-        extra_options = [u for u in matched_universities if u['match_score'] < 30]
+        if not isinstance(profiles, list) or not profiles:
+            return jsonify({
+                "success": False,
+                "error": "profiles listesi gerekli"
+            }), 400
+        
+        if len(profiles) > MAX_BATCH_PROFILES:
+            return jsonify({
+                "success": False,
+                "error": f"Tek istekte en fazla {MAX_BATCH_PROFILES} profil gönderilebilir"
+            }), 400
+        
+        if top_k is not None and (isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1):
+            return jsonify({
+                "success": False,
+                "error": "top_k pozitif bir tam sayı olmalı"
+            }), 400
+        
+        # Deadline filtresi profil sayısından bağımsız, bir kez hesaplanır
+        if include_expired:
+            active_indices = np.arange(len(UNIVERSITIES))
+        else:
+            active_indices = np.flatnonzero(matching_engine.active_mask())
+        deadline_statuses = {}
+        
+        # Profil bazlı terimler; hatalı profil tüm batch'i düşürmez
+        terms_list = []
+        errors = {}
+        for index, profile in enumerate(profiles):
+            try:
+                if not isinstance(profile, dict):
+                    raise ValueError("Profil bir JSON nesnesi olmalı")
+                terms_list.append(calculate_applicant_terms(profile))
+            except Exception as e:
+                errors[index] = str(e)
+                terms_list.append(None)
+        
+        scores = matching_engine.score_terms(terms_list)[:, active_indices]
+        # Sıralama ve dönen skor /api/match ile aynı 2 basamaklı değer
+        rounded = MatchingEngine.round_scores(scores)
+        
+        results = []
+        for index, profile in enumerate(profiles):
+            profile_id = profile.get('profile_id') if isinstance(profile, dict) else None
+            if index in errors:
+                results.append({
+                    "index": index,
+                    "profile_id": profile_id,
+                    "success": False,
+                    "error": errors[index]
+                })
+                continue
+            
+            row = rounded[index]
+            order = select_top_matches(row, range(len(row)), top_k)
+            
+            matched_universities = []
+            for column in order:
+                university_index = int(active_indices[column])
+                university_copy = UNIVERSITIES[university_index].copy()
+                university_copy['match_score'] = row[column]
+                if university_index not in deadline_statuses:
+                    deadline_statuses[university_index] = build_deadline_status(
+                        *has_active_deadline(UNIVERSITIES[university_index])
+                    )
+                university_copy['deadline_status'] = deadline_statuses[university_index]
+                matched_universities.append(university_copy)
+            
+            results.append({
+                "index": index,
+                "profile_id": profile_id,
+                "success": True,
+                "results": bucket_matches(matched_universities)
+            })
         
         return jsonify({
             "success": True,
-            "results": {
-                "high_match": high_match,
-                "medium_match": medium_match,
-                "low_match": low_match,
-                "extra_options": extra_options
-            },
-            "user_data": user_data,
+            "count": len(profiles),
+            "failed": len(errors),
+            "profiles": results,
             "filtered_info": {
-                "expired_universities_hidden": expired_count,
+                "expired_universities_hidden": 0 if include_expired else len(UNIVERSITIES) - len(active_indices),
                 "showing_active_deadlines_only": not include_expired,
-                "tip": "Add 'include_expired': true to see all universities"
+                "top_k": top_k
             }
         })
     
@@ -0,0 +1,37 @@
+"""
+Testlerin ortak yardımcıları
+premium modülünün global kullanıcı deposu, limiter'ı ve API key indeksi
+geçici bir SQLite dosyasına alınır; blok bitince eskileri geri konur.
+Script olarak çalışan testler de `from conftest import ...` ile kullanır.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+import premium
+from api_key_index import ApiKeyIndex
+from rate_limiter import UsageLimiter
+from user_store import UserStore
+
+
+@contextmanager
+def premium_store():
+    """Geçici kullanıcı deposu (flush'lar elle: arka plan thread'i yok)"""
+    saved = (premium._user_store, premium._usage_limiter, premium._api_key_index)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            store = premium._user_store = UserStore(os.path.join(directory, "users.db"))
+            premium._usage_limiter = UsageLimiter(store, premium.TIER_LIMITS, 0)
+            premium._api_key_index = ApiKeyIndex(store, 0)
+            yield store
+    finally:
+        premium._user_store, premium._usage_limiter, premium._api_key_index = saved
+
+
+@contextmanager
+def pro_client(flask_app, user_id):
+    """Geçici depoda limitsiz (pro) user_id ile flask_app test istemcisi"""
+    with premium_store():
+        premium.upgrade_user(user_id, 'pro')
+        yield flask_app.test_client()
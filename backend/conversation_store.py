@@ -0,0 +1,270 @@
+"""
+Sunucu tarafı agent sohbet oturumları (SQLite)
+Sohbet geçmişi her turda istemciden gelip baştan sayılmaz:
+- Her mesaj eklenirken bir kez sayılır; token sayısı mesajla saklanır
+- Oturum toplamı ve bağlam penceresi toplamı artımlı tutulur
+- Pencere sınırı aşılınca en eski turlar pencereden çıkarılır ('truncate')
+  veya kısa bir özete katlanır ('summarize'); mesajlar silinmez
+"""
+
+import os
+import re
+import secrets
+import sqlite3
+import threading
+from datetime import datetime
+
+from user_store import _Transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    -- Bağlam penceresi: özet + seq >= context_start olan mesajlar
+    context_start INTEGER NOT NULL DEFAULT 0,
+    context_tokens INTEGER NOT NULL DEFAULT 0,
+    summary TEXT NOT NULL DEFAULT '',
+    summary_tokens INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, seq)
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations (user_id, updated_at);
+"""
+
+CONVERSATION_COLUMNS = ('id', 'agent', 'created_at', 'updated_at', 'message_count', 'total_tokens',
+                        'context_start', 'context_tokens', 'summary_tokens')
+
+TRIM_POLICIES = ('truncate', 'summarize')
+
+# Pencere taşınca bu orana kadar boşaltılır (her turda yeniden kırpmamak için)
+TRIM_TARGET_RATIO = 0.75
+# Özette her mesajdan alınan en fazla karakter
+SUMMARY_LINE_CHARS = 200
+SUMMARY_HEADER = "Önceki konuşmanın özeti:\n"
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+
+
+class ConversationNotFound(Exception):
+    """Oturum yok veya bu kullanıcıya ait değil"""
+
+
+class ConversationStore:
+    """
+    SQLite tabanlı sohbet oturumları (thread başına bağlantı).
+
+    count_tokens sadece özet metni için çağrılır; mesaj token sayıları
+    çağıran tarafından (bir kez) hesaplanıp append'e verilir.
+    """
+
+    def __init__(self, db_path, count_tokens, context_tokens=8000, trim_policy='summarize', summary_tokens=500):
+        if trim_policy not in TRIM_POLICIES:
+            raise ValueError(f"trim_policy must be one of {TRIM_POLICIES}")
+        self.db_path = db_path
+        self.count_tokens = count_tokens
+        self.context_limit = context_tokens
+        self.trim_policy = trim_policy
+        self.summary_limit = summary_tokens
+        self._local = threading.local()
+        # SQLite bağlantıları fork sonrası paylaşılmamalı
+        os.register_at_fork(after_in_child=self._reset_connections)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = _Transaction(conn)
+            conn = self._local.conn
+        return conn
+
+    def _reset_connections(self):
+        self._local = threading.local()
+
+    def create(self, user_id, agent_id):
+        """Yeni boş oturum aç"""
+        now = datetime.now().isoformat()
+        conversation_id = secrets.token_urlsafe(16)
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO conversations (id, user_id, agent, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (conversation_id, user_id, agent_id, now, now)
+            )
+            return self._header(conn, conversation_id, user_id)
+
+    def get(self, conversation_id, user_id):
+        """Oturum özeti (mesajlar hariç)"""
+        return self._header(self._connection(), conversation_id, user_id)
+
+    def list_conversations(self, user_id, limit=50):
+        """Kullanıcının oturumları (en son güncellenen önce)"""
+        rows = self._connection().execute(
+            f"SELECT {', '.join(CONVERSATION_COLUMNS)} FROM conversations "
+            "WHERE user_id = ? ORDER BY updated_at DESC LIMIT ?",
+            (user_id, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def messages(self, conversation_id, user_id):
+        """Oturumun tüm mesajları ve token sayıları"""
+        conn = self._connection()
+        self._header(conn, conversation_id, user_id)
+        rows = conn.execute(
+            'SELECT seq, role, content, tokens, created_at FROM conversation_messages '
+            'WHERE conversation_id = ? ORDER BY seq',
+            (conversation_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def context(self, conversation_id, user_id):
+        """
+        Modele gönderilecek geçmiş: penceredeki mesajlar ve (varsa) özet.
+        Özet bir mesaj değildir; çağıran onu system bloklarına ekler.
+        Token sayıları yeniden hesaplanmaz; saklanan toplam (özet dahil) döner.
+
+        Returns:
+            dict: agent, history ({'role', 'content'} listesi), summary (metin veya None), tokens
+        """
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT agent, context_start, context_tokens, summary FROM conversations WHERE id = ? AND user_id = ?',
+            (conversation_id, user_id)
+        ).fetchone()
+        if row is None:
+            raise ConversationNotFound(conversation_id)
+        history = [
+            {"role": r['role'], "content": r['content']}
+            for r in conn.execute(
+                'SELECT role, content FROM conversation_messages WHERE conversation_id = ? AND seq >= ? ORDER BY seq',
+                (conversation_id, row['context_start'])
+            )
+        ]
+        summary = SUMMARY_HEADER + row['summary'] if row['summary'] else None
+        return {"agent": row['agent'], "history": history, "summary": summary, "tokens": row['context_tokens']}
+
+    def append(self, conversation_id, user_id, messages):
+        """
+        Mesajları sona ekle (tek transaction) ve gerekirse pencereyi kırp.
+
+        Args:
+            messages: (role, content, tokens) tuple'ları
+
+        Returns:
+            dict: Güncel oturum özeti (+ trimmed: bu eklemede pencereden çıkan mesaj sayısı)
+        """
+        now = datetime.now().isoformat()
+        with self._connection() as conn:
+            header = self._header(conn, conversation_id, user_id)
+            seq = header['message_count']
+            added = 0
+            for role, content, tokens in messages:
+                conn.execute(
+                    'INSERT INTO conversation_messages (conversation_id, seq, role, content, tokens, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (conversation_id, seq, role, content, tokens, now)
+                )
+                seq += 1
+                added += tokens
+            conn.execute(
+                """
+                UPDATE conversations SET message_count = ?, total_tokens = total_tokens + ?,
+                    context_tokens = context_tokens + ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (seq, added, added, now, conversation_id)
+            )
+            trimmed = 0
+            if header['context_tokens'] + added > self.context_limit:
+                trimmed = self._trim(conn, conversation_id)
+            return dict(self._header(conn, conversation_id, user_id), trimmed=trimmed)
+
+    def delete(self, conversation_id, user_id):
+        with self._connection() as conn:
+            self._header(conn, conversation_id, user_id)
+            conn.execute('DELETE FROM conversation_messages WHERE conversation_id = ?', (conversation_id,))
+            conn.execute('DELETE FROM conversations WHERE id = ?', (conversation_id,))
+
+    def _header(self, conn, conversation_id, user_id):
+        row = conn.execute(
+            f"SELECT {', '.join(CONVERSATION_COLUMNS)} FROM conversations WHERE id = ? AND user_id = ?",
+            (conversation_id, user_id)
+        ).fetchone()
+        if row is None:
+            raise ConversationNotFound(conversation_id)
+        return dict(row)
+
+    def _trim(self, conn, conversation_id):
+        """
+        En eski turları pencereden çıkar; pencere context_limit * TRIM_TARGET_RATIO
+        altına inene kadar. Pencere her zaman bir kullanıcı mesajıyla başlar ve
+        son tur hiç çıkarılmaz.
+        """
+        row = conn.execute(
+            'SELECT context_start, context_tokens, summary, summary_tokens FROM conversations WHERE id = ?',
+            (conversation_id,)
+        ).fetchone()
+        window = conn.execute(
+            'SELECT seq, role, content, tokens FROM conversation_messages '
+            'WHERE conversation_id = ? AND seq >= ? ORDER BY seq',
+            (conversation_id, row['context_start'])
+        ).fetchall()
+        last_user = max((i for i, m in enumerate(window) if m['role'] == 'user'), default=0)
+        target = int(self.context_limit * TRIM_TARGET_RATIO)
+        message_tokens = row['context_tokens'] - row['summary_tokens']
+
+        cut = 0
+        while cut < last_user and message_tokens > target:
+            message_tokens -= window[cut]['tokens']
+            cut += 1
+            # Tur sınırına kadar devam et (pencere user ile başlamalı)
+            while cut < last_user and window[cut]['role'] != 'user':
+                message_tokens -= window[cut]['tokens']
+                cut += 1
+        if not cut:
+            return 0
+
+        summary, summary_tokens = '', 0
+        if self.trim_policy == 'summarize':
+            summary, summary_tokens = self._fold_summary(row['summary'], window[:cut])
+        conn.execute(
+            'UPDATE conversations SET context_start = ?, context_tokens = ?, summary = ?, summary_tokens = ? '
+            'WHERE id = ?',
+            (window[cut]['seq'], message_tokens + summary_tokens, summary, summary_tokens, conversation_id)
+        )
+        return cut
+
+    def _fold_summary(self, summary, dropped):
+        """
+        Çıkan mesajları özete ekle: her mesajdan ilk cümle (en fazla
+        SUMMARY_LINE_CHARS karakter). Özet summary_limit token'ı aşarsa en
+        eski satırlar atılır.
+        """
+        lines = summary.split('\n') if summary else []
+        for message in dropped:
+            first = _SENTENCE_END.split(message['content'].strip(), 1)[0][:SUMMARY_LINE_CHARS]
+            lines.append(f"- {message['role']}: {first}")
+        text = '\n'.join(lines)
+        tokens = self.count_tokens(SUMMARY_HEADER + text)
+        while tokens > self.summary_limit and len(lines) > 1:
+            lines.pop(0)
+            text = '\n'.join(lines)
+            tokens = self.count_tokens(SUMMARY_HEADER + text)
+        return text, tokens
@@ -0,0 +1,139 @@
+"""
+CV parse sonuçları için içerik özeti (SHA-256) cache'i
+- Bellekte boyut sınırlı LRU
+- İsteğe bağlı disk katmanı (worker'lar ve yeniden başlatmalar arasında paylaşılır)
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def content_hash(file_content):
+    """Yüklenen dosyanın SHA-256 özeti"""
+    return hashlib.sha256(file_content).hexdigest()
+
+
+class CVParseCache:
+    """
+    Dosya içeriği özeti -> {'text', 'extracted_data', 'extraction'} cache'i.
+
+    Bellek katmanı hem kayıt sayısıyla hem toplam text boyutuyla sınırlıdır;
+    sınır aşılınca en uzun süredir kullanılmayan kayıt atılır. disk_dir
+    verilirse kayıtlar JSON olarak oraya da yazılır ve bellekte bulunamayan
+    kayıtlar diskten okunur.
+    """
+
+    def __init__(self, max_entries=256, max_chars=16 * 1024 * 1024, disk_dir=None, disk_max_entries=5000):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._disk_writes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key):
+        """Kaydı döndür (yoksa None). Dönen dict çağırana aittir."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry)
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, entry)
+        return copy.deepcopy(entry)
+
+    def put(self, key, text, extracted_data, extraction=None):
+        """Parse sonucunu (ve extraction bilgisini) cache'e ekle"""
+        entry = {
+            'text': text,
+            'extracted_data': copy.deepcopy(extracted_data),
+            'extraction': copy.deepcopy(extraction)
+        }
+        with self._lock:
+            self._store(key, entry)
+        self._write_disk(key, entry)
+
+    def _store(self, key, entry):
+        """Bellek katmanına ekle ve sınırları uygula (kilit altında çağrılır)"""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._chars -= len(previous['text'])
+        size = len(entry['text'])
+        if size > self.max_chars:
+            return
+        self._entries[key] = entry
+        self._chars += size
+        while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+            _, evicted = self._entries.popitem(last=False)
+            self._chars -= len(evicted['text'])
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ CV cache disk write error: {e}")
+            return
+        with self._lock:
+            self._disk_writes += 1
+            prune = self._disk_writes % 100 == 0
+        if prune:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Disk katmanında en eski kayıtları sil"""
+        try:
+            files = [entry for entry in os.scandir(self.disk_dir) if entry.name.endswith('.json')]
+            if len(files) <= self.disk_max_entries:
+                return
+            files.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in files[:len(files) - self.disk_max_entries]:
+                os.remove(entry.path)
+        except OSError as e:
+            print(f"⚠️ CV cache disk prune error: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'chars': self._chars,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'disk_enabled': bool(self.disk_dir)
+            }
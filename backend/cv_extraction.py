@@ -0,0 +1,356 @@
+"""
+CV text extraction (PDF / DOCX)
+- Extraction request thread'i yerine sınırlı bir process pool'da çalışır
+- İş başına zaman aşımı, sayfa ve karakter bütçesi
+- PyPDF2 veya pdfplumber (seçilebilir, 'auto' yedekli)
+- Kuyruk derinliği / zaman aşımı metrikleri
+- Zaman aşımında takılan worker öldürülür, pool yenilenir
+"""
+
+import atexit
+import io
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import PyPDF2
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+try:
+    import pdfplumber
+    PDFPLUMBER_AVAILABLE = True
+except ImportError:
+    PDFPLUMBER_AVAILABLE = False
+try:
+    from docx import Document
+    DOCX_AVAILABLE = True
+except ImportError:
+    DOCX_AVAILABLE = False
+
+PDF_MIME_TYPE = 'application/pdf'
+DOCX_MIME_TYPES = ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'application/msword')
+
+# PDF engine seçenekleri: 'auto' önce PyPDF2'yi dener, çok az text çıkarsa pdfplumber'a geçer
+PDF_ENGINES = ('auto', 'pypdf2', 'pdfplumber')
+PDF_MIN_TEXT_CHARS = 200
+
+
+class ExtractionTimeout(Exception):
+    """Extraction zaman aşımına uğradı"""
+
+
+class ExtractionPoolBusy(Exception):
+    """Extraction kuyruğu dolu"""
+
+
+def _open_source(source):
+    """bytes ise bellekte stream, değilse dosya yolu olarak kullan"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+
+def _collect_pages(pages, engine, page_count, max_pages=None, max_chars=None, deadline=None):
+    """
+    Sayfa text'lerini bütçe dahilinde topla.
+
+    Args:
+        pages: Sayfa text'lerini sırayla (tembel) üreten iterable
+        max_pages: En fazla bu kadar sayfa okunur (None = hepsi)
+        max_chars: Bu kadar karakter toplanınca durulur (None = sınırsız)
+        deadline: time.time() cinsinden son an; aşılınca kalan sayfalar atlanır
+
+    Returns:
+        dict: text, engine, page_count, pages_parsed (1'den başlayan sayfa
+        numaraları), truncated, stop_reason
+    """
+    parts = []
+    pages_parsed = []
+    chars = 0
+    stop_reason = None
+    for page_number, page_text in enumerate(pages, start=1):
+        parts.append((page_text or '') + "\n")
+        pages_parsed.append(page_number)
+        chars += len(parts[-1])
+        if max_chars is not None and chars >= max_chars:
+            stop_reason = 'max_chars'
+            break
+        if max_pages is not None and page_number >= max_pages:
+            stop_reason = 'max_pages'
+            break
+        if deadline is not None and time.time() > deadline:
+            stop_reason = 'deadline'
+            break
+
+    text = "".join(parts)
+    truncated = len(pages_parsed) < page_count
+    if max_chars is not None and len(text) > max_chars:
+        text = text[:max_chars]
+        truncated = True
+    return {
+        'text': text,
+        'engine': engine,
+        'page_count': page_count,
+        'pages_parsed': pages_parsed,
+        'truncated': truncated,
+        'stop_reason': stop_reason if truncated else None
+    }
+
+
+def _extract_pdf_pypdf2(source, max_pages, max_chars, deadline):
+    pdf_reader = PyPDF2.PdfReader(_open_source(source))
+    pages = (page.extract_text() for page in pdf_reader.pages)
+    return _collect_pages(pages, 'pypdf2', len(pdf_reader.pages), max_pages, max_chars, deadline)
+
+
+def _extract_pdf_pdfplumber(source, max_pages, max_chars, deadline):
+    with pdfplumber.open(_open_source(source)) as pdf:
+        pages = (page.extract_text() for page in pdf.pages)
+        return _collect_pages(pages, 'pdfplumber', len(pdf.pages), max_pages, max_chars, deadline)
+
+
+def extract_text_from_pdf(source, max_pages=None, max_chars=None, deadline=None, engine='auto'):
+    """
+    PDF'den text çıkar (sayfa/karakter bütçeli).
+
+    Args:
+        source: Dosya içeriği (bytes) veya dosya yolu
+        engine: 'pypdf2', 'pdfplumber' veya 'auto' (PyPDF2 PDF_MIN_TEXT_CHARS'tan
+                az text çıkarırsa pdfplumber da denenir, uzun olan seçilir)
+
+    Returns:
+        dict: _collect_pages sonucu (okunamazsa None)
+    """
+    result = None
+    if engine in ('auto', 'pypdf2') or not PDFPLUMBER_AVAILABLE:
+        try:
+            result = _extract_pdf_pypdf2(source, max_pages, max_chars, deadline)
+        except Exception as e:
+            print(f"PDF parsing error: {e}")
+
+    use_pdfplumber = engine == 'pdfplumber' or (
+        engine == 'auto' and (result is None or len(result['text'].strip()) < PDF_MIN_TEXT_CHARS)
+    )
+    if use_pdfplumber and PDFPLUMBER_AVAILABLE and (deadline is None or time.time() < deadline):
+        try:
+            fallback = _extract_pdf_pdfplumber(source, max_pages, max_chars, deadline)
+            if result is None or len(fallback['text'].strip()) > len(result['text'].strip()):
+                result = fallback
+        except Exception as e:
+            print(f"PDF parsing error (pdfplumber): {e}")
+    return result
+
+
+def extract_text_from_docx(source, max_chars=None):
+    """DOCX'den text çıkar (source: bytes veya dosya yolu)"""
+    try:
+        doc = Document(_open_source(source))
+        parts = []
+        chars = 0
+        truncated = False
+        for paragraph in doc.paragraphs:
+            parts.append(paragraph.text)
+            chars += len(paragraph.text) + 1
+            if max_chars is not None and chars >= max_chars:
+                truncated = True
+                break
+        text = "\n".join(parts)
+        if max_chars is not None:
+            text = text[:max_chars]
+        return {
+            'text': text,
+            'engine': 'python-docx',
+            'page_count': None,
+            'pages_parsed': None,
+            'truncated': truncated,
+            'stop_reason': 'max_chars' if truncated else None
+        }
+    except Exception as e:
+        print(f"DOCX parsing error: {e}")
+        return None
+
+
+def extract_text(file_type, source, max_pages=None, max_chars=None, deadline=None, engine='auto'):
+    """Dosya tipine göre text çıkar (pool worker'larında çalışan giriş noktası)"""
+    if file_type == PDF_MIME_TYPE:
+        return extract_text_from_pdf(source, max_pages, max_chars, deadline, engine)
+    return extract_text_from_docx(source, max_chars)
+
+
+class ExtractionPool:
+    """
+    PDF/DOCX extraction için sınırlı process pool.
+
+    max_workers süreç aynı anda çalışır, en fazla max_queue iş bekler; kuyruk
+    doluysa ExtractionPoolBusy, iş timeout saniyede bitmezse ExtractionTimeout
+    fırlatılır. Zaman aşımına uğrayan iş worker'da da deadline'a ulaşınca
+    sayfa okumayı bırakır; sayfa arasına gelemeden takıldıysa (ör. tek bir
+    sayfada) pool'un süreçleri öldürülür ve yeni pool açılır. O sırada aynı
+    pool'da çalışan diğer işler süreleri kaldıysa yeni pool'da tekrar denenir.
+    max_workers=0 ise extraction aynı thread'de yapılır.
+    """
+
+    def __init__(self, max_workers=2, max_queue=16, timeout=20.0, max_pages=20, max_chars=None, pdf_engine='auto'):
+        if pdf_engine not in PDF_ENGINES:
+            raise ValueError(f"pdf_engine must be one of {PDF_ENGINES}")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.max_chars = max_chars
+        self.pdf_engine = pdf_engine
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.failed = 0
+        self.recycled = 0
+        self.killed_workers = 0
+        self.retried = 0
+        self.total_seconds = 0.0
+        atexit.register(self.close)
+        # Fork edilen süreç ebeveynin pool'unu kullanamaz, kendi pool'unu açar
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def extract(self, file_type, source):
+        """
+        Text'i çıkar ve extract_text sonucunu döndür (okunamazsa None).
+
+        source dosya yolu ise worker'a sadece yol gönderilir; dosya içeriği
+        web sürecinin belleğine alınmaz.
+
+        Raises:
+            ExtractionPoolBusy: Kuyruk dolu
+            ExtractionTimeout: İş timeout içinde bitmedi
+        """
+        deadline = time.time() + self.timeout
+        started = time.monotonic()
+
+        if self.max_workers <= 0:
+            with self._lock:
+                self.submitted += 1
+            result = extract_text(file_type, source, self.max_pages, self.max_chars, deadline, self.pdf_engine)
+            self._finish(started)
+            return result
+
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ExtractionPoolBusy("CV extraction queue is full")
+            self._pending += 1
+            self.submitted += 1
+
+        while True:
+            executor, future = self._submit(file_type, source, deadline)
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.time()))
+            except FutureTimeoutError:
+                with self._lock:
+                    self.timeouts += 1
+                # Çalışan iş iptal edilemez; worker'ı ve _pending yerini geri almak için pool yenilenir
+                if not future.cancel():
+                    self._recycle(executor)
+                raise ExtractionTimeout(f"CV extraction exceeded {self.timeout:g}s")
+            except BrokenProcessPool:
+                # Başka bir işin zaman aşımı pool'u yeniledi; süre kaldıysa yeni pool'da tekrar dene
+                if executor is not self._executor and time.time() < deadline:
+                    with self._lock:
+                        self._pending += 1
+                        self.retried += 1
+                    continue
+                with self._lock:
+                    self.failed += 1
+                raise
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+            break
+
+        self._finish(started)
+        return result
+
+    def _submit(self, file_type, source, deadline):
+        """İşi güncel pool'a gönder (_pending çağıran tarafından artırılmış olmalı)"""
+        try:
+            with self._lock:
+                executor = self._get_executor()
+            future = executor.submit(
+                extract_text, file_type, source, self.max_pages, self.max_chars, deadline, self.pdf_engine
+            )
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self.failed += 1
+            raise
+        future.add_done_callback(self._on_done)
+        return executor, future
+
+    def _recycle(self, executor):
+        """Takılan pool'un süreçlerini öldür; sonraki iş yeni pool açar"""
+        with self._lock:
+            if self._executor is not executor:
+                return  # Aynı pool'u başka bir zaman aşımı zaten yeniledi
+            self._executor = None
+            processes = [p for p in (executor._processes or {}).values() if p.is_alive()]
+            self.recycled += 1
+            self.killed_workers += len(processes)
+        for process in processes:
+            process.terminate()
+        # Bekleyen işler BrokenProcessPool ile biter, _on_done _pending'i düşürür
+        executor.shutdown(wait=False)
+
+    def _on_done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _finish(self, started):
+        with self._lock:
+            self.completed += 1
+            self.total_seconds += time.monotonic() - started
+
+    def stats(self):
+        """Pool metrikleri (kuyruk derinliği = çalışan süreçleri bekleyen işler)"""
+        with self._lock:
+            running = min(self._pending, self.max_workers)
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'running': running,
+                'queue_depth': self._pending - running,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'timeouts': self.timeouts,
+                'rejected': self.rejected,
+                'failed': self.failed,
+                'recycled': self.recycled,
+                'killed_workers': self.killed_workers,
+                'retried': self.retried,
+                'avg_seconds': round(self.total_seconds / self.completed, 4) if self.completed else None,
+                'timeout_seconds': self.timeout,
+                'max_pages': self.max_pages,
+                'max_chars': self.max_chars,
+                'pdf_engine': self.pdf_engine
+            }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,181 @@
+"""
+Asenkron CV parse işleri
+- Upload hemen bir job ID ile döner, extraction + parse arka planda yapılır
+- Sonuç polling veya long-poll ile alınır
+- İş durumu değiştirilebilir bir store'da tutulur (varsayılan: süreç içi bellek)
+"""
+
+import os
+import queue
+import secrets
+import threading
+import time
+from datetime import datetime
+
+# İş durumları
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+FINISHED_STATES = (JOB_DONE, JOB_FAILED)
+
+
+class QueueFull(Exception):
+    """Bekleyen iş sayısı sınırda"""
+
+
+class InMemoryJobStore:
+    """
+    Süreç içi iş deposu.
+
+    Başka bir backend (Redis vb.) aynı arayüzü sağlamalıdır:
+    create(job), update(job_id, **fields), get(job_id), wait(job_id, timeout)
+    """
+
+    def __init__(self, ttl_seconds=600):
+        self.ttl_seconds = ttl_seconds
+        self._jobs = {}
+        self._condition = threading.Condition()
+
+    def create(self, job):
+        with self._condition:
+            self._expire()
+            self._jobs[job['job_id']] = job
+
+    def update(self, job_id, **fields):
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+                if job['status'] in FINISHED_STATES:
+                    job['_finished_at'] = time.monotonic()
+            self._condition.notify_all()
+
+    def get(self, job_id):
+        with self._condition:
+            job = self._jobs.get(job_id)
+            return _public(job) if job is not None else None
+
+    def wait(self, job_id, timeout):
+        """İş bitene kadar (veya timeout'a kadar) bekle"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None or job['status'] in FINISHED_STATES:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return _public(job) if job is not None else None
+
+    def _expire(self):
+        """Süresi dolan bitmiş işleri sil (kilit altında çağrılır)"""
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.get('_finished_at') is not None and job['_finished_at'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def _public(job):
+    return {key: value for key, value in job.items() if not key.startswith('_')}
+
+
+class CVJobQueue:
+    """
+    Arka plan worker thread'leriyle çalışan CV parse kuyruğu.
+
+    handler(file_type, source, progress=..., cache_key=...) -> (body, status_code)
+    şeklinde çağrılır; progress(stage) işin hangi aşamada olduğunu store'a yazar.
+    on_finish verilirse iş bittikten sonra çağrılır (ör. geçici dosyayı silmek için).
+    """
+
+    def __init__(self, handler, store=None, workers=2, max_pending=100):
+        self.handler = handler
+        self.store = store or InMemoryJobStore()
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_workers(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f'cv-job-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, file_type, source, filename=None, cache_key=None, on_finish=None):
+        """İşi kuyruğa ekle ve job kaydını döndür"""
+        self._ensure_workers()
+
+        job = {
+            'job_id': secrets.token_urlsafe(16),
+            'status': JOB_QUEUED,
+            'stage': JOB_QUEUED,
+            'filename': filename,
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'status_code': None,
+            'result': None
+        }
+        # Doluluk kontrolü ve ekleme birlikte: eşzamanlı submit'ler max_pending'i aşamaz
+        with self._lock:
+            if self._queue.qsize() >= self.max_pending:
+                raise QueueFull("CV job queue is full")
+            self.store.create(job)
+            self._queue.put((job['job_id'], file_type, source, cache_key, on_finish))
+        return _public(job)
+
+    def _run(self):
+        while True:
+            job_id, file_type, source, cache_key, on_finish = self._queue.get()
+            self.store.update(job_id, status=JOB_RUNNING, stage='extracting',
+                              started_at=datetime.now().isoformat())
+            try:
+                body, status_code = self.handler(
+                    file_type, source,
+                    progress=lambda stage: self.store.update(job_id, stage=stage),
+                    cache_key=cache_key
+                )
+            except Exception as e:
+                print(f"❌ CV job error: {e}")
+                body, status_code = {"success": False, "error": f"CV analiz edilirken hata oluştu: {str(e)}"}, 500
+            finally:
+                # Temizlik hatası worker thread'ini öldürüp işi 'running'de bırakmamalı
+                if on_finish:
+                    try:
+                        on_finish()
+                    except Exception as e:
+                        print(f"❌ CV job cleanup error: {e}")
+            self.store.update(
+                job_id,
+                status=JOB_DONE if body.get('success') else JOB_FAILED,
+                stage=JOB_DONE,
+                finished_at=datetime.now().isoformat(),
+                status_code=status_code,
+                result=body
+            )
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def wait(self, job_id, timeout):
+        return self.store.wait(job_id, timeout)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'queued': self._queue.qsize(),
+            'max_pending': self.max_pending
+        }
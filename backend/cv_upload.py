@@ -0,0 +1,90 @@
+"""
+Sınırlı bellekli CV upload
+- Yüklenen dosya parça parça doğrudan diske (geçici dosya) yazılır
+- Boyut sınırı yazarken uygulanır (sınır aşılınca 413)
+- SHA-256 özeti yazarken hesaplanır (cache için ikinci okuma yok)
+- Extractor'a bytes yerine dosya yolu verilir
+"""
+
+import hashlib
+import os
+import tempfile
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+
+class SpooledUpload:
+    """
+    Diske akıtılan upload dosyası.
+
+    Kapatıldığında dosya silinir; keep() çağrıldıysa silme işi discard()
+    çağıracak olana kalır (ör. asenkron parse işi).
+    """
+
+    def __init__(self, max_bytes, directory=None):
+        self.max_bytes = max_bytes
+        self._file = tempfile.NamedTemporaryFile(prefix='cv-upload-', delete=False, dir=directory)
+        self.name = self._file.name
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._kept = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge(f"Dosya boyutu {self.max_bytes / (1024 * 1024):g}MB sınırını aşıyor")
+        self._hash.update(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    @property
+    def path(self):
+        """Extractor için dosya yolu (yazılanlar diske aktarılmış olarak)"""
+        self._file.flush()
+        return self.name
+
+    def keep(self):
+        """Request kapanınca dosyayı silme"""
+        self._kept = True
+        return self
+
+    def close(self):
+        self._file.close()
+        if not self._kept:
+            self._remove()
+
+    def discard(self):
+        self._file.close()
+        self._remove()
+
+    def _remove(self):
+        try:
+            os.remove(self.name)
+        except FileNotFoundError:
+            pass
+
+    def __getattr__(self, name):
+        # read/seek/tell/readline/flush... alttaki dosyaya
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """
+    upload_limits'teki endpoint'lerde dosyaları SpooledUpload'a yazan Request.
+
+    Diğer endpoint'lerde werkzeug'un varsayılan davranışı (500KB altı bellekte)
+    geçerlidir.
+    """
+
+    # endpoint adı -> dosya başına maksimum boyut (byte)
+    upload_limits = {}
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint not in self.upload_limits:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return SpooledUpload(self.upload_limits[self.endpoint])
@@ -0,0 +1,478 @@
+"""
+Upstream LLM (Anthropic Messages API) istemcisi
+- Keep-alive bağlantı havuzu (standart kütüphane http.client, ek bağımlılık yok)
+- Model başına eşzamanlılık sınırı; bekleyen istekler deadline'a kadar kuyrukta
+- 429/5xx/bağlantı hatalarında jitter'lı üstel geri çekilmeyle tekrar deneme
+- Stream (SSE) ve tek seferlik yanıt
+"""
+
+import atexit
+import http.client
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Anthropic API ayarları
+LLM_API_KEY = os.environ.get('ANTHROPIC_API_KEY', '')
+LLM_API_BASE_URL = os.environ.get('LLM_API_BASE_URL', 'https://api.anthropic.com')
+LLM_API_VERSION = '2023-06-01'
+LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', '20'))
+# Model başına aynı anda çalışan istek ve kuyrukta bekleyebilecek istek sayısı
+LLM_MODEL_CONCURRENCY = int(os.environ.get('LLM_MODEL_CONCURRENCY', '4'))
+LLM_MAX_WAITING = int(os.environ.get('LLM_MAX_WAITING', '16'))
+# Kuyrukta bekleme + tekrar denemeler için toplam süre (saniye)
+LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', '10'))
+LLM_REQUEST_TIMEOUT = float(os.environ.get('LLM_REQUEST_TIMEOUT', '120'))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '3'))
+
+# Tekrar denenen HTTP durumları (529: Anthropic overloaded)
+RETRY_STATUSES = frozenset((408, 429, 500, 502, 503, 504, 529))
+# Bu süreden uzun boşta kalan bağlantı kapatılır (sunucu zaten kapatmış olabilir)
+IDLE_CONNECTION_SECONDS = 30
+
+# Prompt cache: modelin cache'leyebildiği en kısa önek (token) ve ephemeral
+# cache'in ömrü (her okumada yenilenir)
+MIN_CACHEABLE_PROMPT_TOKENS = {
+    'claude-3-5-haiku-20241022': 2048,
+    'claude-3-haiku-20240307': 2048
+}
+DEFAULT_MIN_CACHEABLE_PROMPT_TOKENS = 1024
+PROMPT_CACHE_TTL_SECONDS = 300
+
+# İstemci geçmişinde kabul edilen roller (system prompt sunucu tarafında)
+HISTORY_ROLES = ('user', 'assistant')
+
+
+class UpstreamError(Exception):
+    """Upstream isteği başarısız oldu"""
+
+    def __init__(self, message, status=None, retryable=False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+class UpstreamBusy(UpstreamError):
+    """Model kuyruğu dolu veya deadline içinde yer açılmadı"""
+
+    def __init__(self, message):
+        super().__init__(message, status=503, retryable=True)
+
+
+class ConnectionPool:
+    """
+    Tek bir host için thread-safe keep-alive bağlantı havuzu.
+
+    En fazla max_connections bağlantı aynı anda kullanımda olabilir; boştaki
+    bağlantılar son kullanılan önce olacak şekilde tekrar kullanılır.
+    """
+
+    def __init__(self, base_url, max_connections=20, timeout=120.0):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or 'https'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle = []
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # Ebeveynin soketleri çocukta kullanılmaz
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        """Bağlantı al (timeout saniyede alınamazsa UpstreamBusy)"""
+        if not self._slots.acquire(timeout=max(timeout, 0)):
+            raise UpstreamBusy("Upstream connection pool exhausted")
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, idle_since = self._idle.pop()
+                if now - idle_since < IDLE_CONNECTION_SECONDS:
+                    self.reused += 1
+                    return conn
+                conn.close()
+            self.created += 1
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def release(self, conn, reuse=True):
+        """Bağlantıyı havuza geri ver (yanıt tamamen okunmadıysa reuse=False)"""
+        if reuse:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        else:
+            conn.close()
+        self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_connections': self.max_connections,
+                'idle': len(self._idle),
+                'created': self.created,
+                'reused': self.reused
+            }
+
+
+class UpstreamStream:
+    """
+    Upstream'den gelen text parçalarının iterator'ı.
+
+    Tamamlanınca usage upstream'in bildirdiği input/output token'larını içerir.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.usage = {}
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        self._chunks.close()
+
+
+class LLMClient:
+    """
+    Paylaşılan upstream istemcisi.
+
+    Her model için en fazla model_concurrency istek aynı anda upstream'e gider;
+    fazlası deadline'a kadar bekler, bekleyen sayısı max_waiting'i aşarsa
+    hemen UpstreamBusy fırlatılır (web worker'ları kuyrukta birikmez).
+    Tekrar denemeler sadece yanıtın ilk byte'ı gelmeden önce yapılır.
+    """
+
+    def __init__(self, base_url, api_key, max_connections=20, model_concurrency=4, max_waiting=16,
+                 queue_timeout=10.0, request_timeout=120.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0):
+        self.api_key = api_key
+        self.pool = ConnectionPool(base_url, max_connections, request_timeout)
+        # int (tüm modeller) veya {model_id: limit, 'default': limit}
+        self.model_concurrency = model_concurrency
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._models = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.rejected = 0
+        self.failed = 0
+        atexit.register(self.pool.close)
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model_state(self, model):
+        with self._lock:
+            state = self._models.get(model)
+            if state is None:
+                limit = self.model_concurrency
+                if isinstance(limit, dict):
+                    limit = limit.get(model, limit.get('default', 4))
+                state = self._models[model] = {
+                    'semaphore': threading.BoundedSemaphore(limit),
+                    'limit': limit,
+                    'waiting': 0,
+                    'active': 0
+                }
+            return state
+
+    def _enter_model(self, model, deadline):
+        """Model için yer bekle (kuyruk dolu veya deadline geçtiyse UpstreamBusy)"""
+        state = self._model_state(model)
+        with self._lock:
+            if state['waiting'] >= self.max_waiting:
+                self.rejected += 1
+                raise UpstreamBusy(f"Too many queued requests for {model}")
+            state['waiting'] += 1
+        try:
+            acquired = state['semaphore'].acquire(timeout=max(deadline - time.monotonic(), 0))
+        finally:
+            with self._lock:
+                state['waiting'] -= 1
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            raise UpstreamBusy(f"No capacity for {model} before deadline")
+        with self._lock:
+            state['active'] += 1
+        return state
+
+    def _exit_model(self, state):
+        with self._lock:
+            state['active'] -= 1
+        state['semaphore'].release()
+
+    def _backoff(self, attempt, deadline, retry_after=None):
+        """Full jitter üstel bekleme; deadline aşılacaksa False döndür"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if time.monotonic() + delay > deadline:
+            return False
+        time.sleep(delay)
+        return True
+
+    def _send(self, body, deadline):
+        """
+        İsteği gönder ve başarılı yanıtı (conn, response) olarak döndür.
+        Tekrar denenebilir hatalarda deadline'a kadar tekrar dener.
+        """
+        payload = json.dumps(body).encode('utf-8')
+        headers = {
+            'content-type': 'application/json',
+            'x-api-key': self.api_key,
+            'anthropic-version': LLM_API_VERSION
+        }
+        attempt = 0
+        while True:
+            conn = self.pool.acquire(deadline - time.monotonic())
+            retry_after = None
+            try:
+                conn.request('POST', f"{self.pool.base_path}/v1/messages", body=payload, headers=headers)
+                response = conn.getresponse()
+            except (OSError, http.client.HTTPException) as e:
+                # Sunucunun kapattığı keep-alive bağlantısı veya ağ hatası
+                self.pool.release(conn, reuse=False)
+                error = UpstreamError(f"Upstream connection error: {e}", retryable=True)
+            else:
+                if response.status == 200:
+                    return conn, response
+                try:
+                    detail = response.read().decode('utf-8', 'replace')[:500]
+                except (OSError, http.client.HTTPException) as e:
+                    # Hata gövdesi okunurken bağlantı koptu; yer yine geri verilmeli
+                    self.pool.release(conn, reuse=False)
+                    detail = f"(error body unreadable: {e})"
+                else:
+                    self.pool.release(conn, reuse=not response.will_close)
+                error = UpstreamError(
+                    f"Upstream returned {response.status}: {detail}",
+                    status=response.status,
+                    retryable=response.status in RETRY_STATUSES
+                )
+                try:
+                    retry_after = float(response.getheader('retry-after'))
+                except (TypeError, ValueError):
+                    pass
+
+            if not error.retryable or attempt >= self.max_retries or not self._backoff(attempt, deadline, retry_after):
+                with self._lock:
+                    self.failed += 1
+                raise error
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+
+    def complete(self, model, system, messages, max_tokens=1024, deadline=None):
+        """
+        Tek seferlik yanıt.
+
+        Returns:
+            dict: text, input_tokens, output_tokens, cache_read_input_tokens,
+            cache_creation_input_tokens, stop_reason
+        """
+        deadline = deadline or time.monotonic() + self.queue_timeout
+        state = self._enter_model(model, deadline)
+        try:
+            with self._lock:
+                self.requests += 1
+            conn, response = self._send({
+                'model': model,
+                'system': system,
+                'messages': messages,
+                'max_tokens': max_tokens
+            }, deadline)
+            try:
+                data = json.loads(response.read())
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                self.pool.release(conn, reuse=False)
+                raise UpstreamError(f"Invalid upstream response: {e}")
+            self.pool.release(conn, reuse=not response.will_close)
+        finally:
+            self._exit_model(state)
+
+        usage = data.get('usage', {})
+        return {
+            'text': ''.join(block.get('text', '') for block in data.get('content', []) if block.get('type') == 'text'),
+            'input_tokens': usage.get('input_tokens', 0),
+            'output_tokens': usage.get('output_tokens', 0),
+            'cache_read_input_tokens': usage.get('cache_read_input_tokens', 0),
+            'cache_creation_input_tokens': usage.get('cache_creation_input_tokens', 0),
+            'stop_reason': data.get('stop_reason')
+        }
+
+    def stream(self, model, system, messages, max_tokens=1024, deadline=None):
+        """
+        SSE stream olarak yanıt. Model yeri stream bitene (veya kapatılana)
+        kadar tutulur.
+
+        Returns:
+            UpstreamStream: text parçalarını üreten iterator
+        """
+        deadline = deadline or time.monotonic() + self.queue_timeout
+        body = {
+            'model': model,
+            'system': system,
+            'messages': messages,
+            'max_tokens': max_tokens,
+            'stream': True
+        }
+        stream = UpstreamStream(None)
+
+        def chunks():
+            state = self._enter_model(model, deadline)
+            conn = None
+            finished = False
+            try:
+                with self._lock:
+                    self.requests += 1
+                conn, response = self._send(body, deadline)
+                for event in _sse_events(response):
+                    event_type = event.get('type')
+                    if event_type == 'content_block_delta':
+                        text = event.get('delta', {}).get('text')
+                        if text:
+                            yield text
+                    elif event_type == 'message_start':
+                        stream.usage.update(event.get('message', {}).get('usage', {}))
+                    elif event_type == 'message_delta':
+                        stream.usage.update(event.get('usage', {}))
+                    elif event_type == 'error':
+                        raise UpstreamError(f"Upstream stream error: {event.get('error')}")
+                    elif event_type == 'message_stop':
+                        finished = True
+                # Bağlantı ancak yanıt sonuna kadar okunduysa tekrar kullanılabilir
+                finished = finished and _drain(response)
+            except (OSError, http.client.HTTPException) as e:
+                raise UpstreamError(f"Upstream stream interrupted: {e}", retryable=True)
+            finally:
+                if conn is not None:
+                    self.pool.release(conn, reuse=finished and not response.will_close)
+                self._exit_model(state)
+
+        stream._chunks = chunks()
+        return stream
+
+    def stats(self):
+        with self._lock:
+            models = {
+                model: {'limit': state['limit'], 'active': state['active'], 'waiting': state['waiting']}
+                for model, state in self._models.items()
+            }
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'rejected': self.rejected,
+                'failed': self.failed,
+                'models': models,
+                'pool': self.pool.stats()
+            }
+
+
+def _sse_events(response):
+    """HTTP yanıtından SSE 'data:' satırlarını JSON olarak oku"""
+    data_lines = []
+    for raw_line in response:
+        line = raw_line.decode('utf-8').rstrip('\r\n')
+        if line.startswith('data:'):
+            data_lines.append(line[5:].lstrip())
+        elif not line and data_lines:
+            yield json.loads('\n'.join(data_lines))
+            data_lines = []
+    if data_lines:
+        yield json.loads('\n'.join(data_lines))
+
+
+def _drain(response):
+    """Yanıtın kalanını oku (bağlantı tekrar kullanılabilsin)"""
+    try:
+        response.read()
+        return True
+    except (OSError, http.client.HTTPException):
+        return False
+
+
+def system_blocks(*texts, cache=False):
+    """
+    System prompt'u metin blokları olarak döndür. cache=True ise cache noktası
+    son bloğa konur (tüm önek birlikte cache'lenir); sadece önek modelin
+    en kısa cache'lenebilir boyutuna ulaşıyorsa anlamlıdır
+    (bkz. min_cacheable_tokens).
+    """
+    blocks = [{'type': 'text', 'text': text} for text in texts if text]
+    if cache:
+        blocks[-1]['cache_control'] = {'type': 'ephemeral'}
+    return blocks
+
+
+def history_messages(history):
+    """
+    İstemcinin gönderdiği sohbet geçmişini upstream mesajlarına çevir.
+
+    Raises:
+        ValueError: history liste değil veya bir girdi
+                    {"role": "user" | "assistant", "content": str} değil
+    """
+    if not isinstance(history, list):
+        raise ValueError("history must be a list")
+    messages = []
+    for index, entry in enumerate(history):
+        if not isinstance(entry, dict) or entry.get('role') not in HISTORY_ROLES \
+                or not isinstance(entry.get('content'), str):
+            raise ValueError(f"history[{index}] must have role 'user' or 'assistant' and string content")
+        messages.append({'role': entry['role'], 'content': entry['content']})
+    return messages
+
+
+def min_cacheable_tokens(model):
+    """Modelin cache'leyebildiği en kısa önek (daha kısa öneklerde cache_control etkisizdir)"""
+    return MIN_CACHEABLE_PROMPT_TOKENS.get(model, DEFAULT_MIN_CACHEABLE_PROMPT_TOKENS)
+
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Paylaşılan upstream istemcisini döndür (API key yoksa None)"""
+    global _llm_client
+    if not LLM_API_KEY:
+        return None
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = LLMClient(
+                LLM_API_BASE_URL,
+                LLM_API_KEY,
+                max_connections=LLM_MAX_CONNECTIONS,
+                model_concurrency=LLM_MODEL_CONCURRENCY,
+                max_waiting=LLM_MAX_WAITING,
+                queue_timeout=LLM_QUEUE_TIMEOUT,
+                request_timeout=LLM_REQUEST_TIMEOUT,
+                max_retries=LLM_MAX_RETRIES
+            )
+    return _llm_client
@@ -3,13 +3,21 @@ Premium özellikler ve kullanıcı yönetimi
 Rate limiting, tier kontrolü, API key yönetimi
 """
 
-import json
 import os
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import request, jsonify
+from flask import g, request, jsonify
+from user_store import UserStore
+from rate_limiter import UsageLimiter
+from api_key_index import ApiKeyIndex
 
-# Basit JSON dosyası ile kullanıcı veritabanı (production'da gerçek DB kullan)
+# Kullanıcı veritabanı (SQLite, WAL modu)
+USERS_DB_FILE = os.environ.get('USERS_DB_FILE', 'users.db')
+
+# Rate limit sayaçlarının veritabanına yazılma aralığı (saniye)
+RATE_LIMIT_FLUSH_INTERVAL = float(os.environ.get('RATE_LIMIT_FLUSH_INTERVAL', '5'))
+
+# Eski JSON dosyaları - ilk açılışta veritabanına aktarılır
 USERS_FILE = 'users.json'
 API_KEYS_FILE = 'api_keys.json'
 
@@ -35,38 +43,67 @@ TIER_LIMITS = {
     }
 }
 
+_user_store = None
+
+def get_user_store():
+    """Kullanıcı deposunu döndür (ilk çağrıda oluşturulur)"""
+    global _user_store
+    if _user_store is None:
+        _user_store = UserStore(USERS_DB_FILE, USERS_FILE, API_KEYS_FILE)
+    return _user_store
+
+_usage_limiter = None
+
+def get_usage_limiter():
+    """Bellek içi rate limiter'ı döndür (ilk çağrıda oluşturulur)"""
+    global _usage_limiter
+    if _usage_limiter is None:
+        _usage_limiter = UsageLimiter(get_user_store(), TIER_LIMITS, RATE_LIMIT_FLUSH_INTERVAL)
+    return _usage_limiter
+
+_api_key_index = None
+
+def get_api_key_index():
+    """Bellek içi API key indeksini döndür (ilk çağrıda oluşturulur)"""
+    global _api_key_index
+    if _api_key_index is None:
+        _api_key_index = ApiKeyIndex(get_user_store(), RATE_LIMIT_FLUSH_INTERVAL)
+    return _api_key_index
+
 def load_users():
-    """Kullanıcı veritabanını yükle"""
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    """Tüm kullanıcıları yükle (toplu işlemler için - request path'inde kullanma)"""
+    return get_user_store().all_users()
 
 def save_users(users):
-    """Kullanıcı veritabanını kaydet"""
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users, f, indent=2, ensure_ascii=False)
+    """Kullanıcı tablosunu verilen dict ile değiştir"""
+    get_user_store().replace_users(users)
 
 def load_api_keys():
-    """API key'leri yükle"""
-    if os.path.exists(API_KEYS_FILE):
-        with open(API_KEYS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    """Tüm API key'leri yükle"""
+    return get_user_store().all_api_keys()
 
 def save_api_keys(api_keys):
-    """API key'leri kaydet"""
-    with open(API_KEYS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(api_keys, f, indent=2, ensure_ascii=False)
+    """API key tablosunu verilen dict ile değiştir"""
+    get_user_store().replace_api_keys(api_keys)
+    get_api_key_index().invalidate()
 
 def get_user_id():
-    """Request'ten kullanıcı ID'sini al (API key veya session'dan)"""
+    """
+    Request'ten kullanıcı ID'sini al (API key veya session'dan).
+    İstek başına bir kez çözülür ve flask.g'de tutulur; decorator'lar ve
+    route aynı istekte tekrar çağırdığında API key kullanımı tekrar sayılmaz.
+    """
+    if 'user_id' not in g:
+        g.user_id = _resolve_user_id()
+    return g.user_id
+
+def _resolve_user_id():
     # Önce API key kontrolü
     api_key = request.headers.get('X-API-Key') or request.headers.get('Authorization', '').replace('Bearer ', '')
     if api_key:
-        api_keys = load_api_keys()
-        if api_key in api_keys:
-            return api_keys[api_key]['user_id']
+        user_id = get_api_key_index().resolve(api_key)
+        if user_id:
+            return user_id
     
     # Session veya user_id header'dan
     user_id = request.headers.get('X-User-ID') or request.json.get('user_id') if request.is_json else None
@@ -79,81 +116,15 @@ def get_user_id():
 
 def get_user_tier(user_id):
     """Kullanıcının tier'ını al"""
-    users = load_users()
-    if user_id in users:
-        return users[user_id].get('tier', 'free')
-    return 'free'
+    return get_user_store().get_tier(user_id) or 'free'
 
 def update_user_usage(user_id, endpoint='match'):
-    """Kullanıcı kullanımını güncelle"""
-    users = load_users()
-    
-    if user_id not in users:
-        users[user_id] = {
-            'tier': 'free',
-            'created_at': datetime.now().isoformat(),
-            'usage': {
-                'requests_today': 0,
-                'last_request_date': None,
-                'cv_analyses_this_month': 0,
-                'last_cv_analysis_month': None
-            }
-        }
-    
-    user = users[user_id]
-    usage = user['usage']
-    today = datetime.now().date().isoformat()
-    current_month = datetime.now().strftime('%Y-%m')
-    
-    # Günlük request sayısını güncelle
-    if usage['last_request_date'] != today:
-        usage['requests_today'] = 0
-        usage['last_request_date'] = today
-    
-    usage['requests_today'] += 1
-    
-    # CV analizi sayısını güncelle
-    if endpoint == 'parse-cv':
-        if usage['last_cv_analysis_month'] != current_month:
-            usage['cv_analyses_this_month'] = 0
-            usage['last_cv_analysis_month'] = current_month
-        usage['cv_analyses_this_month'] += 1
-    
-    save_users(users)
+    """Kullanıcı kullanımını güncelle (bellekte sayılır, arka planda yazılır)"""
+    get_usage_limiter().consume(user_id, endpoint)
 
 def check_rate_limit(user_id, endpoint='match'):
-    """Rate limit kontrolü"""
-    tier = get_user_tier(user_id)
-    limits = TIER_LIMITS[tier]
-    users = load_users()
-    
-    if user_id not in users:
-        return True, None  # İlk kullanım, limit yok
-    
-    user = users[user_id]
-    usage = user['usage']
-    today = datetime.now().date().isoformat()
-    current_month = datetime.now().strftime('%Y-%m')
-    
-    # Günlük request limiti
-    if limits['requests_per_day'] != -1:
-        if usage['last_request_date'] == today:
-            if usage['requests_today'] >= limits['requests_per_day']:
-                return False, f"Günlük limit aşıldı ({limits['requests_per_day']} request/gün). Premium'a geçerek sınırsız erişim kazanın!"
-        else:
-            usage['requests_today'] = 0
-            usage['last_request_date'] = today
-    
-    # Aylık CV analizi limiti
-    if endpoint == 'parse-cv' and limits['cv_analyses_per_month'] != -1:
-        if usage['last_cv_analysis_month'] == current_month:
-            if usage['cv_analyses_this_month'] >= limits['cv_analyses_per_month']:
-                return False, f"Aylık CV analizi limiti aşıldı ({limits['cv_analyses_per_month']} analiz/ay). Premium'a geçerek sınırsız analiz yapın!"
-        else:
-            usage['cv_analyses_this_month'] = 0
-            usage['last_cv_analysis_month'] = current_month
-    
-    return True, None
+    """Rate limit kontrolü (kullanımı saymaz)"""
+    return get_usage_limiter().check_and_consume(user_id, endpoint, consume=False)
 
 def require_tier(min_tier='free'):
     """Tier gereksinimi decorator"""
@@ -185,8 +156,8 @@ def rate_limit(f):
         user_id = get_user_id()
         endpoint = request.endpoint or 'match'
         
-        # Rate limit kontrolü
-        allowed, error_msg = check_rate_limit(user_id, endpoint)
+        # Rate limit kontrolü ve kullanım sayımı tek adımda (bellekte)
+        allowed, error_msg = get_usage_limiter().check_and_consume(user_id, endpoint)
         if not allowed:
             return jsonify({
                 "success": False,
@@ -195,67 +166,42 @@ def rate_limit(f):
                 "upgrade_url": "/pricing"
             }), 429
         
-        # Kullanımı güncelle
-        update_user_usage(user_id, endpoint)
-        
         return f(*args, **kwargs)
     return decorated_function
 
 def upgrade_user(user_id, tier, stripe_customer_id=None, subscription_id=None):
     """Kullanıcı tier'ını yükselt"""
-    users = load_users()
-    
-    if user_id not in users:
-        users[user_id] = {
-            'tier': tier,
-            'created_at': datetime.now().isoformat(),
-            'stripe_customer_id': stripe_customer_id,
-            'subscription_id': subscription_id,
-            'upgraded_at': datetime.now().isoformat(),
-            'usage': {
-                'requests_today': 0,
-                'last_request_date': None,
-                'cv_analyses_this_month': 0,
-                'last_cv_analysis_month': None
-            }
-        }
-    else:
-        users[user_id]['tier'] = tier
-        users[user_id]['upgraded_at'] = datetime.now().isoformat()
-        if stripe_customer_id:
-            users[user_id]['stripe_customer_id'] = stripe_customer_id
-        if subscription_id:
-            users[user_id]['subscription_id'] = subscription_id
-    
-    save_users(users)
+    get_user_store().set_tier(user_id, tier, stripe_customer_id, subscription_id)
+    get_usage_limiter().set_tier(user_id, tier)
 
 def create_api_key(user_id, key_name='default'):
     """API key oluştur (Pro tier için)"""
     import secrets
     api_key = f"maa_{secrets.token_urlsafe(32)}"
     
-    api_keys = load_api_keys()
-    api_keys[api_key] = {
+    get_user_store().add_api_key(api_key, {
         'user_id': user_id,
         'key_name': key_name,
         'created_at': datetime.now().isoformat(),
         'last_used': None,
         'usage_count': 0
-    }
+    })
+    get_api_key_index().add(api_key, user_id)
     
-    save_api_keys(api_keys)
     return api_key
 
 def get_user_stats(user_id):
     """Kullanıcı istatistiklerini al"""
-    users = load_users()
-    if user_id not in users:
+    user = get_user_store().get_user(user_id)
+    # Henüz yazılmamış sayaçlar bellekte
+    usage = get_usage_limiter().usage_snapshot(user_id)
+    if user is None and usage is None:
         return None
     
-    user = users[user_id]
+    user = user or {'tier': 'free'}
     tier = user.get('tier', 'free')
     limits = TIER_LIMITS[tier]
-    usage = user.get('usage', {})
+    usage = usage or user.get('usage', {})
     
     return {
         'tier': tier,
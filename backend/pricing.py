@@ -7,6 +7,8 @@ from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
 import os
+from llm_client import UpstreamError, get_llm_client, history_messages, min_cacheable_tokens, system_blocks
+from token_counter import count_tokens
 
 # =============================================================================
 # PRICING TIERS
@@ -247,6 +249,9 @@ BASIC_FEATURES = [
 # AI AGENT PROMPTS (Claude Opus 4.5)
 # =============================================================================
 
+AI_AGENT_MODEL = "claude-opus-4-20250514"
+AI_AGENT_MAX_TOKENS = 2048
+
 AI_AGENT_SYSTEM_PROMPT = """Sen University Match AI'ın Premium AI Asistanısın. 
 Claude Opus 4.5 modeliyle çalışıyorsun - en gelişmiş AI danışman.
 
@@ -320,6 +325,21 @@ AI_AGENT_CAPABILITIES = [
     }
 ]
 
+def _capability_system(capability):
+    """
+    Capability'nin sabit system öneki. Cache noktası sadece önek modelin en
+    kısa cache'lenebilir boyutuna ulaşıyorsa konur; daha kısa önekler
+    provider tarafından cache'lenmez ve normal girdi olarak faturalanır.
+    """
+    texts = [AI_AGENT_SYSTEM_PROMPT]
+    if capability["prompt_prefix"]:
+        texts.append(f"Bu sohbetteki görev: {capability['prompt_prefix'].rstrip(': ')}")
+    cacheable = count_tokens("\n".join(texts)) >= min_cacheable_tokens(AI_AGENT_MODEL)
+    return system_blocks(*texts, cache=cacheable)
+
+# Capability başına system önekleri başlangıçta bir kez kurulur
+AI_AGENT_SYSTEM_BLOCKS = {c["id"]: _capability_system(c) for c in AI_AGENT_CAPABILITIES}
+
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
@@ -578,20 +598,40 @@ def register_pricing_routes(app):
         
         if not message:
             return jsonify({"success": False, "error": "Message required"}), 400
+        try:
+            messages = history_messages(conversation_history)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
         
-        # Capability'ye göre prompt prefix ekle
-        cap_config = next((c for c in AI_AGENT_CAPABILITIES if c['id'] == capability), None)
-        if cap_config:
-            message = cap_config.get('prompt_prefix', '') + message
+        # Capability'nin prompt prefix'i cache'lenen system önekinde
+        system = AI_AGENT_SYSTEM_BLOCKS.get(capability, AI_AGENT_SYSTEM_BLOCKS['general'])
+        
+        client = get_llm_client()
+        if client is None:
+            # API key yoksa demo yanıt
+            cap_config = next((c for c in AI_AGENT_CAPABILITIES if c['id'] == capability), None)
+            if cap_config:
+                message = cap_config.get('prompt_prefix', '') + message
+            reply = f"[AI Agent Demo] Mesajınız alındı: '{message[:50]}...' - Gerçek implementasyon için Claude API entegrasyonu gerekli."
+        else:
+            messages.append({"role": "user", "content": message})
+            try:
+                reply = client.complete(AI_AGENT_MODEL, system, messages, AI_AGENT_MAX_TOKENS)['text']
+            except UpstreamError as e:
+                print(f"❌ AI agent upstream error: {e}")
+                return jsonify({
+                    "success": False,
+                    "error": "upstream_unavailable",
+                    "message": "AI servisi şu anda yanıt veremiyor. Lütfen tekrar deneyin.",
+                    "retry": e.retryable
+                }), 503
         
-        # TODO: Gerçek Claude API çağrısı
-        # Şimdilik mock response
         return jsonify({
             "success": True,
             "response": {
-                "message": f"[AI Agent Demo] Mesajınız alındı: '{message[:50]}...' - Gerçek implementasyon için Claude API entegrasyonu gerekli.",
+                "message": reply,
                 "capability": capability,
-                "model": "claude-opus-4-20250514"
+                "model": AI_AGENT_MODEL
             },
             "usage": {
                 "messages_today": 5,
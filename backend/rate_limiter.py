@@ -0,0 +1,239 @@
+"""
+Bellek içi rate limiter
+- TIER_LIMITS'e göre günlük request ve aylık CV analizi pencereleri
+- Kontrol + sayaç artırımı tek kilit altında (request path'inde disk I/O yok)
+- Sayaç farkları arka planda birkaç saniyede bir UserStore'a yazılır
+"""
+
+import atexit
+import os
+import threading
+import time
+from datetime import datetime
+
+# Boşta kalan (yazılmamış farkı olmayan) kullanıcılar bu süreden sonra bellekten atılır
+IDLE_EVICT_SECONDS = 300
+
+
+class _UsageCounter:
+    """Bir kullanıcının bellekteki sayaçları"""
+
+    __slots__ = ('tier', 'requests_today', 'last_request_date',
+                 'cv_analyses_this_month', 'last_cv_analysis_month', 'last_seen')
+
+    def __init__(self, user=None):
+        usage = (user or {}).get('usage', {})
+        self.tier = (user or {}).get('tier', 'free')
+        self.requests_today = usage.get('requests_today', 0) or 0
+        self.last_request_date = usage.get('last_request_date')
+        self.cv_analyses_this_month = usage.get('cv_analyses_this_month', 0) or 0
+        self.last_cv_analysis_month = usage.get('last_cv_analysis_month')
+        self.last_seen = time.monotonic()
+
+    def as_usage(self):
+        return {
+            'requests_today': self.requests_today,
+            'last_request_date': self.last_request_date,
+            'cv_analyses_this_month': self.cv_analyses_this_month,
+            'last_cv_analysis_month': self.last_cv_analysis_month
+        }
+
+
+class UsageLimiter:
+    """
+    Tier limitlerini bellekte uygulayan rate limiter.
+
+    Kullanıcı ilk görüldüğünde sayaçları veritabanından bir kez okunur; sonraki
+    istekler sadece bellekte sayılır. Farklar flush_interval saniyede bir
+    UserStore.apply_usage_deltas ile atomik olarak yazılır ve sayaçlar diğer
+    worker'ların kullanımıyla birlikte veritabanından tazelenir.
+    """
+
+    def __init__(self, store, tier_limits, flush_interval=5.0):
+        self.store = store
+        self.tier_limits = tier_limits
+        self.flush_interval = flush_interval
+        self._counters = {}
+        # (user_id, gün, ay) -> [request farkı, cv farkı]
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        atexit.register(self.close)
+        # Fork sonrası (gunicorn preload) çocuk süreç kendi durumuyla başlar;
+        # ebeveynin bekleyen farklarını ebeveyn yazar
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._counters = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _ensure_flusher(self):
+        if self._thread is None and self.flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name='usage-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Rate limit flush error: {e}")
+
+    def _counter(self, user_id):
+        """Kullanıcının sayaçlarını döndür (cache miss'te veritabanından okunur)"""
+        with self._lock:
+            counter = self._counters.get(user_id)
+        if counter is None:
+            loaded = _UsageCounter(self.store.get_user(user_id))
+            with self._lock:
+                counter = self._counters.setdefault(user_id, loaded)
+        return counter
+
+    def check_and_consume(self, user_id, endpoint='match', consume=True, now=None):
+        """
+        Limit kontrolü yap ve izin verilirse kullanımı say.
+
+        Returns:
+            tuple: (allowed, error_message)
+        """
+        self._ensure_flusher()
+        counter = self._counter(user_id)
+        now = now or datetime.now()
+        today = now.date().isoformat()
+        current_month = now.strftime('%Y-%m')
+        is_cv_analysis = endpoint == 'parse-cv'
+
+        with self._lock:
+            self._roll_windows(counter, today, current_month, is_cv_analysis)
+            limits = self.tier_limits.get(counter.tier, self.tier_limits['free'])
+
+            # Günlük request limiti
+            if limits['requests_per_day'] != -1 and counter.requests_today >= limits['requests_per_day']:
+                return False, f"Günlük limit aşıldı ({limits['requests_per_day']} request/gün). Premium'a geçerek sınırsız erişim kazanın!"
+
+            # Aylık CV analizi limiti
+            if is_cv_analysis and limits['cv_analyses_per_month'] != -1 \
+                    and counter.cv_analyses_this_month >= limits['cv_analyses_per_month']:
+                return False, f"Aylık CV analizi limiti aşıldı ({limits['cv_analyses_per_month']} analiz/ay). Premium'a geçerek sınırsız analiz yapın!"
+
+            if consume:
+                self._count(user_id, counter, today, current_month, is_cv_analysis)
+
+        return True, None
+
+    def consume(self, user_id, endpoint='match', now=None):
+        """Limit kontrolü yapmadan kullanımı say"""
+        self._ensure_flusher()
+        counter = self._counter(user_id)
+        now = now or datetime.now()
+        today = now.date().isoformat()
+        current_month = now.strftime('%Y-%m')
+        is_cv_analysis = endpoint == 'parse-cv'
+
+        with self._lock:
+            self._roll_windows(counter, today, current_month, is_cv_analysis)
+            self._count(user_id, counter, today, current_month, is_cv_analysis)
+
+    @staticmethod
+    def _roll_windows(counter, today, current_month, is_cv_analysis):
+        """Gün/ay değiştiyse pencereyi sıfırla (kilit altında çağrılır)"""
+        counter.last_seen = time.monotonic()
+        if counter.last_request_date != today:
+            counter.requests_today = 0
+            counter.last_request_date = today
+        if is_cv_analysis and counter.last_cv_analysis_month != current_month:
+            counter.cv_analyses_this_month = 0
+            counter.last_cv_analysis_month = current_month
+
+    def _count(self, user_id, counter, today, current_month, is_cv_analysis):
+        """Sayaçları ve bekleyen farkı artır (kilit altında çağrılır)"""
+        pending = self._pending.setdefault((user_id, today, current_month), [0, 0])
+        counter.requests_today += 1
+        pending[0] += 1
+        if is_cv_analysis:
+            counter.cv_analyses_this_month += 1
+            pending[1] += 1
+
+    def usage_snapshot(self, user_id):
+        """Bellekteki güncel sayaçlar (kullanıcı bellekte değilse None)"""
+        with self._lock:
+            counter = self._counters.get(user_id)
+            return counter.as_usage() if counter else None
+
+    def set_tier(self, user_id, tier):
+        """Tier değişikliğini bellekteki sayaca yansıt"""
+        with self._lock:
+            counter = self._counters.get(user_id)
+            if counter is not None:
+                counter.tier = tier
+
+    def flush(self):
+        """Bekleyen sayaç farklarını veritabanına yaz ve sayaçları tazele"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                self._evict_idle()
+                return 0
+
+            deltas = [
+                (user_id, day, month, requests, cv_analyses)
+                for (user_id, day, month), (requests, cv_analyses) in pending.items()
+            ]
+            try:
+                self.store.apply_usage_deltas(deltas)
+            except Exception:
+                # Yazılamayan farkları bir sonraki flush için geri koy
+                with self._lock:
+                    for key, (requests, cv_analyses) in pending.items():
+                        entry = self._pending.setdefault(key, [0, 0])
+                        entry[0] += requests
+                        entry[1] += cv_analyses
+                raise
+
+            # Diğer worker'ların kullanımını da içeren değerlerle tazele
+            user_ids = {user_id for user_id, _, _ in pending}
+            users = self.store.get_users(user_ids)
+            with self._lock:
+                for user_id, user in users.items():
+                    counter = self._counters.get(user_id)
+                    if counter is None:
+                        continue
+                    fresh = _UsageCounter(user)
+                    # Flush sırasında gelen ve henüz yazılmamış istekleri koru
+                    unflushed = [0, 0]
+                    for (pending_user, day, month), (requests, cv_analyses) in self._pending.items():
+                        if pending_user == user_id:
+                            if day == fresh.last_request_date:
+                                unflushed[0] += requests
+                            if month == fresh.last_cv_analysis_month:
+                                unflushed[1] += cv_analyses
+                    counter.tier = fresh.tier
+                    if fresh.last_request_date == counter.last_request_date:
+                        counter.requests_today = fresh.requests_today + unflushed[0]
+                    if fresh.last_cv_analysis_month == counter.last_cv_analysis_month:
+                        counter.cv_analyses_this_month = fresh.cv_analyses_this_month + unflushed[1]
+
+            self._evict_idle()
+            return len(deltas)
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - IDLE_EVICT_SECONDS
+        with self._lock:
+            pending_users = {user_id for user_id, _, _ in self._pending}
+            for user_id in [u for u, c in self._counters.items() if c.last_seen < cutoff and u not in pending_users]:
+                del self._counters[user_id]
+
+    def close(self):
+        """Arka plan thread'ini durdur ve son farkları yaz"""
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"⚠️ Rate limit flush error: {e}")
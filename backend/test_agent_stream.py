@@ -0,0 +1,253 @@
+"""
+Agent chat streaming testi (SSE / NDJSON)
+Upstream model yerine yerel mock stream kullanılır; parçaların artımlı
+gönderildiği ve token'ların stream sonunda doğru düşüldüğü kontrol edilir.
+
+Çalıştırma: python test_agent_stream.py  (veya pytest test_agent_stream.py)
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import Flask
+
+import token_system
+from token_ledger import TokenLedger
+from token_system import TokenTracker, TokenMeter, estimate_tokens, mock_model_stream, register_token_routes
+
+AGENT_ID = "general_advisor"
+CHUNK_DELAY = 0.005
+
+app = Flask(__name__)
+register_token_routes(app)
+
+
+def slow_model_stream(agent, message, history, input_tokens, summary=None):
+    """Upstream'i taklit eden, parçalar arasında bekleyen mock stream"""
+    return mock_model_stream(agent, message, history, input_tokens, summary, chunk_delay=CHUNK_DELAY)
+
+
+def setup_tracker(directory, tokens):
+    tracker = TokenTracker(TokenLedger(os.path.join(directory, "tokens.db")))
+    tracker.add_tokens("stream-user", tokens, "test")
+    token_system.token_tracker = tracker
+    token_system.model_stream = slow_model_stream
+    return tracker
+
+
+def parse_sse(raw):
+    events = []
+    for block in raw.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def open_stream(stream_format="sse", message="MIT Computer Science için motivation letter"):
+    client = app.test_client()
+    return client.post(
+        f"/api/agents/{AGENT_ID}/chat",
+        json={"message": message, "stream": stream_format},
+        headers={"X-User-ID": "stream-user"},
+        buffered=False
+    )
+
+
+def test_sse_stream_is_incremental_and_settles():
+    print("SSE stream testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        tracker = setup_tracker(directory, 100_000)
+        response = open_stream()
+        assert response.mimetype == "text/event-stream"
+
+        # İlk parça, tüm yanıt üretilmeden gelmeli
+        started = time.perf_counter()
+        chunks = iter(response.response)
+        first = next(chunks)
+        first_latency = time.perf_counter() - started
+        raw = (first if isinstance(first, str) else first.decode()) + \
+            "".join(c if isinstance(c, str) else c.decode() for c in chunks)
+        total_time = time.perf_counter() - started
+        response.close()
+
+        events = parse_sse(raw)
+        deltas = [data for name, data in events if name == "delta"]
+        name, done = events[-1]
+        assert name == "done", events[-1]
+        assert len(deltas) > 10
+        assert first_latency < total_time / 5
+
+        text = "".join(d["text"] for d in deltas)
+        output_tokens = done["usage"]["output_tokens"]
+        assert [d["output_tokens"] for d in deltas] == sorted(d["output_tokens"] for d in deltas)
+        assert output_tokens == deltas[-1]["output_tokens"]
+        # Parça parça ölçüm, metnin tek seferde ölçülmesinden çok sapmamalı
+        assert abs(output_tokens - estimate_tokens(text)) <= len(deltas)
+
+        balance = tracker.get_user_balance("stream-user")
+        assert balance["total_used"] == done["usage"]["total_tokens"]
+        assert balance["remaining"] == done["balance"]["remaining"]
+        assert len(balance["usage_history"]) == 1
+        print(f"[OK] {len(deltas)} parça, ilk parça {first_latency * 1000:.1f}ms / toplam {total_time * 1000:.1f}ms, "
+              f"{output_tokens} output token")
+
+
+def test_ndjson_stream():
+    print("NDJSON stream testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        setup_tracker(directory, 100_000)
+        response = open_stream("ndjson")
+        assert response.mimetype == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert lines[-1]["event"] == "done"
+        assert all(line["event"] == "delta" for line in lines[:-1])
+        print(f"[OK] {len(lines)} satır")
+
+
+def test_stream_stops_at_balance():
+    print("Bakiye sınırı testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        # Giriş token'ları + birkaç parçalık çıktı kadar bakiye
+        # (kısa system prompt cache'lenmez, normal girdi sayılır)
+        input_tokens = estimate_tokens("kısa soru") + token_system.AGENT_PROMPT_TOKENS[AGENT_ID]
+        tracker = setup_tracker(directory, input_tokens + 1030)
+        # Ön kontrol (input + 1000 tahmini çıktı) geçer, ama mock yanıt daha uzun
+        token_system.model_stream = lambda *args: (word + " " for word in ["kelime"] * 2000)
+
+        events = parse_sse(open_stream(message="kısa soru").get_data(as_text=True))
+        name, error = events[-1]
+        assert name == "error" and error["error"] == "insufficient_tokens"
+
+        balance = tracker.get_user_balance("stream-user")
+        assert balance["remaining"] >= 0
+        assert balance["total_used"] == input_tokens + error["output_tokens"]
+        print(f"[OK] {error['output_tokens']} token sonra kesildi, kalan: {balance['remaining']}")
+
+
+def test_disconnect_settles_sent_output():
+    print("Bağlantı kopması testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        tracker = setup_tracker(directory, 100_000)
+        response = open_stream()
+        chunks = iter(response.response)
+        received = [next(chunks) for _ in range(5)]
+        response.close()  # İstemci ayrıldı
+
+        events = parse_sse("".join(c if isinstance(c, str) else c.decode() for c in received))
+        sent_tokens = events[-1][1]["output_tokens"]
+        balance = tracker.get_user_balance("stream-user")
+        assert balance["usage_history"][-1]["output_tokens"] == sent_tokens
+        print(f"[OK] {sent_tokens} output token faturalandı")
+
+
+def test_concurrent_streams_billed_within_hold():
+    """
+    Aynı kullanıcının eşzamanlı iki stream'i: ikincisi sadece birincinin
+    ayırmadığı bakiyeyi kullanabilir, ikisi de faturalanır.
+    """
+    print("Eşzamanlı stream testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        input_tokens = estimate_tokens("kısa soru") + token_system.AGENT_PROMPT_TOKENS[AGENT_ID]
+        tracker = setup_tracker(directory, 2 * input_tokens + token_system.AGENT_MAX_OUTPUT_TOKENS + 1500)
+        # İki istek de rezervasyonunu yapmadan hiçbir model çıktı vermez
+        both_started = threading.Barrier(2)
+
+        def long_model_stream(*args):
+            both_started.wait()
+            for _ in range(10_000):
+                yield "kelime "
+
+        token_system.model_stream = long_model_stream
+        errors = []
+
+        def read_stream():
+            errors.append(parse_sse(open_stream(message="kısa soru").get_data(as_text=True))[-1])
+
+        threads = [threading.Thread(target=read_stream) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        balance = tracker.get_user_balance("stream-user")
+        assert all(name == "error" and error["error"] == "insufficient_tokens" for name, error in errors)
+        assert all(error["output_tokens"] > 0 for _, error in errors)
+        assert balance["reserved"] == 0 and balance["remaining"] >= 0
+        assert len(balance["usage_history"]) == 2
+        assert balance["total_used"] == 2 * input_tokens + sum(error["output_tokens"] for _, error in errors)
+        print(f"[OK] {[error['output_tokens'] for _, error in errors]} output token, kalan: {balance['remaining']}")
+
+
+class ReportingStream:
+    """Upstream gibi stream sonunda kullanım bildiren mock"""
+
+    def __init__(self, chunks, usage):
+        self.chunks = chunks
+        self.usage = usage
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+
+def test_reported_usage_capped_at_hold():
+    print("Bildirilen kullanım sınırı testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        tracker = setup_tracker(directory, 20_000)
+        # Upstream, ayrılandan çok daha fazla çıktı bildiriyor
+        token_system.model_stream = lambda agent, message, history, input_tokens, summary=None: ReportingStream(
+            ["kısa ", "yanıt"], {"input_tokens": input_tokens, "output_tokens": 50_000}
+        )
+
+        name, done = parse_sse(open_stream(message="kısa soru").get_data(as_text=True))[-1]
+        assert name == "done", done
+        balance = tracker.get_user_balance("stream-user")
+        # Faturalanır ama ayrılan tutarı (en fazla AGENT_MAX_OUTPUT_TOKENS çıktı) aşmaz
+        assert done["usage"]["output_tokens"] == 50_000
+        assert 0 < done["usage"]["total_tokens"] == balance["total_used"]
+        assert balance["total_used"] <= done["usage"]["input_tokens"] + token_system.AGENT_MAX_OUTPUT_TOKENS
+        assert balance["reserved"] == 0 and balance["remaining"] == 20_000 - balance["total_used"]
+        print(f"[OK] {balance['total_used']} token faturalandı")
+
+
+def test_unread_stream_releases_hold():
+    print("Okunmayan stream testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        tracker = setup_tracker(directory, 100_000)
+        hold = tracker.reserve_tokens("stream-user", 5_000)
+        with app.test_request_context():
+            response = token_system.stream_agent_chat(
+                AGENT_ID, token_system.AGENTS[AGENT_ID], "stream-user", "soru", [], 100, hold
+            )
+        response.close()  # Stream hiç başlamadan kapandı (model çağrılmadı)
+        balance = tracker.get_user_balance("stream-user")
+        assert balance["reserved"] == 0 and balance["remaining"] == 100_000
+        print("[OK]")
+
+
+def test_token_meter_matches_whole_text():
+    text = "".join(mock_model_stream(token_system.AGENTS[AGENT_ID], "merhaba " * 50, [], 100))
+    meter = TokenMeter()
+    for start in range(0, len(text), 7):
+        meter.add(text[start:start + 7])
+    assert meter.chars == len(text)
+    assert abs(meter.total - estimate_tokens(text)) <= text.count(" ") + text.count("\n")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Agent Chat Streaming Testi")
+    print("=" * 50)
+    print()
+
+    test_sse_stream_is_incremental_and_settles()
+    test_ndjson_stream()
+    test_stream_stops_at_balance()
+    test_disconnect_settles_sent_output()
+    test_concurrent_streams_billed_within_hold()
+    test_reported_usage_capped_at_hold()
+    test_unread_stream_releases_hold()
+    test_token_meter_matches_whole_text()
+    print("[OK] Tum testler tamamlandi!")
@@ -0,0 +1,52 @@
+"""
+API key kullanım sayımı testi
+require_tier ve rate_limit birlikte kullanılan (ve route içinde de
+get_user_id çağıran) bir endpoint'e yapılan tek istek, key'in
+usage_count'unu bir kez artırmalı.
+
+Çalıştırma: python test_api_key_usage.py  (veya pytest test_api_key_usage.py)
+"""
+
+from flask import Flask, jsonify
+
+import premium
+from conftest import premium_store
+
+USER_ID = "pro-user"
+
+
+def make_app():
+    app = Flask(__name__)
+
+    @app.route('/protected', methods=['POST'])
+    @premium.require_tier('pro')
+    @premium.rate_limit
+    def protected():
+        return jsonify({"success": True, "user_id": premium.get_user_id()})
+
+    return app
+
+
+def test_one_request_counts_once():
+    print("API key kullanım sayımı testi...")
+    with premium_store() as store:
+        premium.upgrade_user(USER_ID, 'pro')
+        api_key = premium.create_api_key(USER_ID)
+
+        client = make_app().test_client()
+        for expected in (1, 2, 3):
+            data = client.post('/protected', headers={"X-API-Key": api_key}).get_json()
+            assert data["user_id"] == USER_ID
+            premium._api_key_index.flush()
+            assert store.get_api_key(api_key)["usage_count"] == expected
+        print("[OK] istek başına bir kullanım")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("API Key Kullanım Sayımı Testi")
+    print("=" * 50)
+    print()
+
+    test_one_request_counts_once()
+    print("[OK] Tum testler tamamlandi!")
@@ -0,0 +1,204 @@
+"""
+ConversationStore testi
+Mesajların bir kez sayıldığı, oturum toplamlarının artımlı tutulduğu ve
+bağlam penceresinin sınırda kırpıldığı (truncate / summarize) kontrol edilir;
+agent chat'in oturumla her turda sadece yeni mesajı saydığı doğrulanır.
+
+Çalıştırma: python test_conversation_store.py  (veya pytest test_conversation_store.py)
+"""
+
+import os
+import tempfile
+
+from flask import Flask
+
+import token_system
+from conversation_store import ConversationStore, ConversationNotFound, SUMMARY_HEADER
+from token_ledger import TokenLedger
+
+USER_ID = "conversation-user"
+AGENT_ID = "motivation_letter"
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def new_store(directory, **kwargs):
+    return ConversationStore(os.path.join(directory, "tokens.db"), count_words, **kwargs)
+
+
+def add_turns(store, conversation_id, turns, tokens=100):
+    for i in range(turns):
+        header = store.append(conversation_id, USER_ID, [
+            ("user", f"Soru {i}. Detaylar burada.", tokens),
+            ("assistant", f"Yanıt {i}. Uzun açıklama.", tokens)
+        ])
+    return header
+
+
+def test_running_totals_and_ownership():
+    print("Oturum toplamı testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        store = new_store(directory, context_tokens=10_000)
+        conversation_id = store.create(USER_ID, AGENT_ID)["id"]
+        header = add_turns(store, conversation_id, 5, tokens=40)
+
+        assert header["message_count"] == 10
+        assert header["total_tokens"] == header["context_tokens"] == 400
+        assert header["trimmed"] == 0
+        assert [m["tokens"] for m in store.messages(conversation_id, USER_ID)] == [40] * 10
+        context = store.context(conversation_id, USER_ID)
+        assert len(context["history"]) == 10 and context["tokens"] == 400
+        assert context["summary"] is None
+
+        try:
+            store.context(conversation_id, "someone-else")
+            raise AssertionError("ConversationNotFound bekleniyordu")
+        except ConversationNotFound:
+            pass
+        store.delete(conversation_id, USER_ID)
+        assert store.list_conversations(USER_ID) == []
+        print("[OK] toplamlar artımlı, oturum sahibine özel")
+
+
+def test_truncate_policy():
+    print("Truncate testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        store = new_store(directory, context_tokens=1000, trim_policy="truncate")
+        conversation_id = store.create(USER_ID, AGENT_ID)["id"]
+        header = add_turns(store, conversation_id, 20)
+
+        context = store.context(conversation_id, USER_ID)
+        assert header["total_tokens"] == 4000
+        assert context["tokens"] <= 1000
+        assert context["tokens"] == 100 * len(context["history"])
+        # Pencere bir kullanıcı mesajıyla başlar ve son turu içerir
+        assert context["history"][0]["role"] == "user"
+        assert context["history"][-1]["content"].startswith("Yanıt 19")
+        print(f"[OK] {len(context['history'])} mesaj / {context['tokens']} token pencerede")
+
+
+def test_summarize_policy():
+    print("Summarize testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        store = new_store(directory, context_tokens=1000, summary_tokens=60)
+        conversation_id = store.create(USER_ID, AGENT_ID)["id"]
+        add_turns(store, conversation_id, 20)
+
+        context = store.context(conversation_id, USER_ID)
+        summary = context["summary"]
+        assert summary.startswith(SUMMARY_HEADER)
+        assert "Soru 0." not in summary and "Yanıt 18." not in summary
+        assert count_words(summary) <= 60
+        # Özet mesaj olarak eklenmez; pencere yine kullanıcı mesajıyla başlar
+        window = context["history"]
+        assert window[0]["role"] == "user" and window[0]["content"].startswith("Soru")
+        assert context["tokens"] == 100 * len(window) + count_words(summary)
+        assert context["tokens"] <= 1000
+        print(f"[OK] özet {count_words(summary)} token + {len(window)} mesaj")
+
+
+class RecordingClient:
+    """Upstream istemcisinin yerine geçer; stream'e giden system/mesajları saklar"""
+
+    def __init__(self):
+        self.calls = []
+
+    def stream(self, model, system, messages, max_tokens):
+        self.calls.append((system, messages))
+        return iter(["tamam"])
+
+
+def test_summary_goes_to_system_blocks():
+    print("Özet system bloğu testi...")
+    import llm_client
+
+    saved = (llm_client.LLM_API_KEY, llm_client._llm_client)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            store = new_store(directory, context_tokens=1000, summary_tokens=60)
+            conversation_id = store.create(USER_ID, AGENT_ID)["id"]
+            add_turns(store, conversation_id, 20)
+            context = store.context(conversation_id, USER_ID)
+
+            llm_client.LLM_API_KEY = "test-key"
+            client = llm_client._llm_client = RecordingClient()
+            agent = token_system.AGENTS[AGENT_ID]
+            list(token_system.upstream_model_stream(agent, "Yeni soru", context["history"], 0, context["summary"]))
+            system, messages = client.calls[-1]
+            # Özet agent prompt'undan sonra ayrı, cache noktası olmayan bir blok
+            assert [block["text"] for block in system] == [agent["system_prompt"], context["summary"]]
+            assert "cache_control" not in system[-1]
+            assert messages == context["history"] + [{"role": "user", "content": "Yeni soru"}]
+
+            list(token_system.upstream_model_stream(agent, "Yeni soru", [], 0))
+            assert [block["text"] for block in client.calls[-1][0]] == [agent["system_prompt"]]
+            print(f"[OK] özet {len(system)}. system bloğu, {len(messages)} mesaj")
+    finally:
+        llm_client.LLM_API_KEY, llm_client._llm_client = saved
+
+
+def test_agent_chat_counts_only_new_message():
+    print("Agent chat oturum testi...")
+    saved = (token_system.token_tracker, token_system._conversation_store, token_system.estimate_tokens,
+             token_system.model_stream)
+    counted = []
+
+    def counting_estimate(text):
+        counted.append(len(text))
+        return len(text) // 4
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "tokens.db")
+            tracker = token_system.token_tracker = token_system.TokenTracker(TokenLedger(db_path))
+            tracker.add_tokens(USER_ID, 1_000_000, "test")
+            token_system._conversation_store = ConversationStore(db_path, counting_estimate, context_tokens=50_000)
+            token_system.estimate_tokens = counting_estimate
+            token_system.model_stream = token_system.mock_model_stream
+            app = Flask(__name__)
+            token_system.register_token_routes(app)
+            client = app.test_client()
+            headers = {"X-User-ID": USER_ID}
+
+            conversation_id = client.post(f"/api/agents/{AGENT_ID}/conversations",
+                                          headers=headers).get_json()["conversation"]["id"]
+            message = "Motivation letter paragrafımı geliştir. " * 20
+            for turn in range(6):
+                counted.clear()
+                data = client.post(f"/api/agents/{AGENT_ID}/chat", headers=headers,
+                                   json={"message": message, "conversation_id": conversation_id}).get_json()
+                # Sadece yeni mesaj sayılır (yanıt count_reply ile); geçmiş sayılmaz
+                assert counted == [len(message)], counted
+                assert data["conversation"]["message_count"] == 2 * (turn + 1)
+
+            detail = client.get(f"/api/conversations/{conversation_id}", headers=headers).get_json()
+            tokens = [m["tokens"] for m in detail["messages"]]
+            assert detail["conversation"]["total_tokens"] == sum(tokens)
+            # Faturalanan girdi = system prompt + oturum geçmişi + yeni mesaj
+            assert data["usage"]["input_tokens"] == sum(tokens[:-1]) + token_system.AGENT_PROMPT_TOKENS[AGENT_ID]
+
+            other = client.post("/api/agents/general_advisor/chat", headers=headers,
+                                json={"message": "selam", "conversation_id": conversation_id})
+            assert other.status_code == 400
+            missing = client.get(f"/api/conversations/{conversation_id}", headers={"X-User-ID": "x"})
+            assert missing.status_code == 404
+            print(f"[OK] {len(tokens)} mesaj, turda sadece yeni mesaj sayıldı")
+    finally:
+        (token_system.token_tracker, token_system._conversation_store, token_system.estimate_tokens,
+         token_system.model_stream) = saved
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("ConversationStore Testi")
+    print("=" * 50)
+    print()
+
+    test_running_totals_and_ownership()
+    test_truncate_policy()
+    test_summarize_policy()
+    test_summary_goes_to_system_blocks()
+    test_agent_chat_counts_only_new_message()
+    print("[OK] Tum testler tamamlandi!")
@@ -0,0 +1,120 @@
+"""
+Toplu CV parse testi (/api/parse-cv/bulk, zip yolu)
+Her belge için bir NDJSON satırı (index zip'teki sırayla eşleşir), en
+sonda tek bir 'done' satırı; sınırı aşan ve desteklenmeyen belgeler
+kendi satırında reddedilir, diğerleri etkilenmez.
+
+Çalıştırma: python test_cv_bulk.py  (veya pytest test_cv_bulk.py)
+"""
+
+import io
+import json
+import zipfile
+
+from docx import Document
+
+import app
+import premium
+from conftest import pro_client
+
+USER_ID = "bulk-user"
+SIZE_LIMIT = 64 * 1024
+CV_COUNT = 6
+
+
+def docx_bytes(text):
+    buffer = io.BytesIO()
+    document = Document()
+    document.add_paragraph(text)
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def build_archive():
+    """(zip bytes, zip sırasıyla beklenen (dosya adı, status_code) listesi)"""
+    expected = []
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for number in range(CV_COUNT):
+            name = f"ajans/aday-{number}.docx"
+            archive.writestr(name, docx_bytes(
+                f"Aday {number}\nBilgisayar Mühendisliği, GPA: 3.{number} / 4.0\n"
+                "Skills: Python, React, Docker\n2 years work experience"
+            ))
+            expected.append((name, 200))
+            if number == 2:
+                # Beyan edilen boyutu sınırı aşan belge (sıkıştırılmış hali küçük)
+                archive.writestr("ajans/buyuk.docx", b"0" * (SIZE_LIMIT + 1))
+                expected.append(("ajans/buyuk.docx", 413))
+        archive.writestr("ajans/notlar.txt", "desteklenmeyen format")
+        expected.append(("ajans/notlar.txt", 400))
+        # Atlanan girdiler: klasör, macOS meta verisi, gizli dosya
+        archive.writestr("ajans/alt/", "")
+        archive.writestr("__MACOSX/ajans/._aday-0.docx", "meta")
+        archive.writestr("ajans/.DS_Store", "meta")
+    return buffer.getvalue(), expected
+
+
+def test_bulk_zip_stream():
+    print("Bulk zip testi...")
+    saved = app.MAX_CV_UPLOAD_BYTES
+    app.MAX_CV_UPLOAD_BYTES = SIZE_LIMIT
+    try:
+        archive, expected = build_archive()
+        with pro_client(app.app, USER_ID) as client:
+            # Multipart isteklerde kullanıcı API key'den çözülür
+            headers = {"X-API-Key": premium.create_api_key(USER_ID)}
+            response = client.post(
+                "/api/parse-cv/bulk",
+                data={"archive": (io.BytesIO(archive), "cvs.zip")},
+                headers=headers,
+                content_type="multipart/form-data"
+            )
+            assert response.status_code == 200 and response.mimetype == "application/x-ndjson"
+            lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    finally:
+        app.MAX_CV_UPLOAD_BYTES = saved
+
+    *documents, done = lines
+    # Belgeler bittikçe (herhangi bir sırada) gelir; 'done' tek ve en sonda
+    assert done == {"done": True, "count": len(expected), "succeeded": CV_COUNT,
+                    "failed": len(expected) - CV_COUNT}
+    assert not any(line.get("done") for line in documents)
+    assert sorted(line["index"] for line in documents) == list(range(len(expected)))
+    by_index = {line["index"]: line for line in documents}
+    for index, (filename, status_code) in enumerate(expected):
+        line = by_index[index]
+        assert (line["filename"], line["status_code"]) == (filename, status_code), line
+        assert line["success"] is (status_code == 200)
+
+    for index, (filename, _) in enumerate(expected):
+        if filename.endswith(".docx") and by_index[index]["success"]:
+            number = int(filename.rsplit("-", 1)[1].split(".")[0])
+            assert by_index[index]["extracted_data"]["gpa"] == float(f"3.{number}")
+    assert "Maksimum boyut" in by_index[3]["error"]
+    print(f"[OK] {len(documents)} satır + done, sıra: {[line['index'] for line in documents]}")
+
+
+def test_bulk_rejects_bad_archive():
+    print("Geçersiz zip testi...")
+    with pro_client(app.app, USER_ID) as client:
+        headers = {"X-API-Key": premium.create_api_key(USER_ID)}
+        response = client.post(
+            "/api/parse-cv/bulk",
+            data={"archive": (io.BytesIO(b"zip degil"), "cvs.zip")},
+            headers=headers,
+            content_type="multipart/form-data"
+        )
+        assert response.status_code == 400 and response.get_json()["error"] == "Geçersiz zip arşivi"
+    print("[OK]")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Toplu CV Parse Testi")
+    print("=" * 50)
+    print()
+
+    test_bulk_zip_stream()
+    test_bulk_rejects_bad_archive()
+    print("[OK] Tum testler tamamlandi!")
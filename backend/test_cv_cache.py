@@ -0,0 +1,89 @@
+"""
+CVParseCache testi
+Bellek katmanı kayıt sayısı ve toplam karakter sınırıyla LRU olarak atar;
+disk katmanı ayrı bir cache örneğine (başka worker / yeniden başlatma)
+kaydı aynen geri verir.
+
+Çalıştırma: python test_cv_cache.py  (veya pytest test_cv_cache.py)
+"""
+
+import os
+import tempfile
+
+from cv_cache import CVParseCache, content_hash
+
+
+def put(cache, key, text):
+    cache.put(key, text, {"skills": [key]}, {"engine": "pypdf2", "pages_parsed": [1]})
+
+
+def test_lru_eviction_by_entry_count():
+    print("Kayıt sayısı sınırı testi...")
+    cache = CVParseCache(max_entries=3)
+    for key in ("a", "b", "c"):
+        put(cache, key, key * 10)
+    assert cache.get("a") is not None  # 'a' en son kullanılan olur
+    put(cache, "d", "d" * 10)
+    assert cache.get("b") is None, "En uzun süredir kullanılmayan atılmalıydı"
+    assert all(cache.get(key) is not None for key in ("a", "c", "d"))
+    assert cache.stats()["entries"] == 3
+    print(f"[OK] {cache.stats()}")
+
+
+def test_lru_eviction_by_chars():
+    print("Karakter sınırı testi...")
+    cache = CVParseCache(max_entries=100, max_chars=100)
+    put(cache, "a", "x" * 40)
+    put(cache, "b", "x" * 40)
+    cache.get("a")
+    put(cache, "c", "x" * 40)
+    assert cache.get("b") is None and cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["chars"] == 80
+
+    # Aynı anahtarın üzerine yazmak boyutu iki kez saymaz
+    put(cache, "c", "x" * 10)
+    assert cache.stats()["chars"] == 50
+    # Sınırdan büyük tek kayıt bellekte tutulmaz, diğerlerini de atmaz
+    put(cache, "huge", "x" * 101)
+    assert cache.get("huge") is None
+    assert cache.stats()["entries"] == 2 and cache.stats()["chars"] == 50
+    print(f"[OK] {cache.stats()}")
+
+
+def test_disk_round_trip():
+    print("Disk katmanı testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        key = content_hash(b"%PDF-1.4 test cv")
+        writer = CVParseCache(disk_dir=directory)
+        extracted = {"gpa": 3.45, "background": ["computer science"], "skills": ["Python", "Çözümleme"]}
+        extraction = {"engine": "pdfplumber", "pages_parsed": [1, 2], "truncated": False}
+        writer.put(key, "Ahmet Yılmaz\nGPA 3.45", extracted, extraction)
+        assert os.path.exists(os.path.join(directory, f"{key}.json"))
+
+        # Başka bir worker: bellekte yok, diskten okunur ve belleğe alınır
+        reader = CVParseCache(disk_dir=directory)
+        entry = reader.get(key)
+        assert entry == {"text": "Ahmet Yılmaz\nGPA 3.45", "extracted_data": extracted, "extraction": extraction}
+        assert reader.get(key) == entry
+        stats = reader.stats()
+        assert (stats["disk_hits"], stats["hits"], stats["misses"]) == (1, 1, 0)
+
+        # Dönen kayıt çağırana aittir; değiştirmek cache'i bozmaz
+        entry["extracted_data"]["skills"].append("Go")
+        assert reader.get(key)["extracted_data"] == extracted
+
+        assert reader.get(content_hash(b"baska dosya")) is None
+        assert reader.stats()["misses"] == 1
+        print(f"[OK] {reader.stats()}")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("CV Parse Cache Testi")
+    print("=" * 50)
+    print()
+
+    test_lru_eviction_by_entry_count()
+    test_lru_eviction_by_chars()
+    test_disk_round_trip()
+    print("[OK] Tum testler tamamlandi!")
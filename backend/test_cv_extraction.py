@@ -0,0 +1,74 @@
+"""
+ExtractionPool zaman aşımı testi
+Hiç bitmeyen bir iş (okuyanı sonsuza dek bekleten FIFO) worker'ı ve kuyruk
+yerini tutmamalı: zaman aşımında süreç öldürülür, pool yenilenir ve sonraki
+işler yeni pool'da çalışır.
+
+Çalıştırma: python test_cv_extraction.py  (veya pytest test_cv_extraction.py)
+"""
+
+import os
+import tempfile
+import time
+
+from docx import Document
+
+from cv_extraction import DOCX_MIME_TYPES, ExtractionPool, ExtractionTimeout
+
+DOCX_TYPE = DOCX_MIME_TYPES[0]
+
+
+def write_docx(directory, text):
+    path = os.path.join(directory, "cv.docx")
+    document = Document()
+    document.add_paragraph(text)
+    document.save(path)
+    return path
+
+
+def wait_until(condition, seconds=5.0):
+    deadline = time.monotonic() + seconds
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_timeout_recycles_hung_worker():
+    print("Takılan worker testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        # Yazan olmadığı için FIFO'yu açan worker sonsuza dek bekler
+        hung = os.path.join(directory, "hung.docx")
+        os.mkfifo(hung)
+        cv_path = write_docx(directory, "Python ve React deneyimi")
+        pool = ExtractionPool(max_workers=1, max_queue=0, timeout=0.5)
+        try:
+            started = time.monotonic()
+            try:
+                pool.extract(DOCX_TYPE, hung)
+                assert False, "Takılan iş zaman aşımına uğramadı"
+            except ExtractionTimeout:
+                pass
+            assert time.monotonic() - started < 2.0
+
+            stats = pool.stats()
+            assert stats['timeouts'] == 1 and stats['recycled'] == 1 and stats['killed_workers'] == 1
+            # Worker ve kuyruk yeri geri alındı (max_queue=0: yer yoksa Busy olurdu)
+            assert wait_until(lambda: pool.stats()['running'] == 0)
+
+            result = pool.extract(DOCX_TYPE, cv_path)
+            assert result['text'].strip() == "Python ve React deneyimi"
+            stats = pool.stats()
+            assert stats['completed'] == 1 and stats['failed'] == 0
+            print(f"[OK] {stats}")
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("ExtractionPool Zaman Aşımı Testi")
+    print("=" * 50)
+    print()
+
+    test_timeout_recycles_hung_worker()
+    print("[OK] Tum testler tamamlandi!")
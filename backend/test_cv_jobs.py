@@ -0,0 +1,86 @@
+"""
+CVJobQueue testi
+on_finish temizliği hata verse de iş bitmeli ve worker çalışmaya devam
+etmeli; eşzamanlı submit'ler max_pending'i aşmamalı.
+
+Çalıştırma: python test_cv_jobs.py  (veya pytest test_cv_jobs.py)
+"""
+
+import threading
+import time
+
+from cv_jobs import JOB_DONE, CVJobQueue, QueueFull
+
+SUBMITTERS = 16
+MAX_PENDING = 5
+
+
+def ok_handler(file_type, source, progress, cache_key):
+    progress('parsing')
+    return {"success": True, "source": source}, 200
+
+
+def failing_cleanup():
+    raise OSError("geçici dosya zaten silinmiş")
+
+
+def test_on_finish_error_does_not_kill_worker():
+    print("on_finish hata testi...")
+    jobs = CVJobQueue(ok_handler, workers=1)
+    first = jobs.submit("application/pdf", "a.pdf", on_finish=failing_cleanup)
+    assert jobs.wait(first['job_id'], 5)['status'] == JOB_DONE
+    # Aynı (tek) worker sonraki işi de işlemeli
+    second = jobs.submit("application/pdf", "b.pdf")
+    result = jobs.wait(second['job_id'], 5)
+    assert result['status'] == JOB_DONE and result['result']['source'] == "b.pdf"
+    print("[OK]")
+
+
+def test_concurrent_submit_respects_max_pending():
+    print("Eşzamanlı submit testi...")
+    release = threading.Event()
+
+    def blocked_handler(file_type, source, progress, cache_key):
+        release.wait(5)
+        return {"success": True}, 200
+
+    jobs = CVJobQueue(blocked_handler, workers=1, max_pending=MAX_PENDING)
+    # Worker ilk işte bekler, sonrakiler kuyrukta kalır
+    running = jobs.submit("application/pdf", "running.pdf")
+    while jobs.get(running['job_id'])['status'] != 'running':
+        time.sleep(0.01)
+
+    accepted = []
+    rejected = []
+    barrier = threading.Barrier(SUBMITTERS)
+
+    def submitter(index):
+        barrier.wait()
+        try:
+            accepted.append(jobs.submit("application/pdf", f"{index}.pdf"))
+        except QueueFull:
+            rejected.append(index)
+
+    threads = [threading.Thread(target=submitter, args=(i,)) for i in range(SUBMITTERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(accepted) == MAX_PENDING and len(rejected) == SUBMITTERS - MAX_PENDING
+    assert jobs.stats()['queued'] == MAX_PENDING
+
+    release.set()
+    for job in accepted:
+        assert jobs.wait(job['job_id'], 5)['status'] == JOB_DONE
+    print(f"[OK] {len(accepted)} kabul, {len(rejected)} red")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("CV Job Kuyruğu Testi")
+    print("=" * 50)
+    print()
+
+    test_on_finish_error_does_not_kill_worker()
+    test_concurrent_submit_respects_max_pending()
+    print("[OK] Tum testler tamamlandi!")
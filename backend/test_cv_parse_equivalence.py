@@ -0,0 +1,222 @@
+"""
+CV alan çıkarımı eşdeğerlik testi
+CVFieldExtractor / KeywordScanner üzerinden çalışan parse_cv_content, alan
+başına re.search döngüleri çalıştıran eski çıkarımla (aşağıda birebir
+kopyası) sabit CV'ler ve sabit seed'li rastgele metinler üzerinde aynı
+alanları üretmeli.
+
+Çalıştırma: python test_cv_parse_equivalence.py  (veya pytest test_cv_parse_equivalence.py)
+"""
+
+import random
+import re
+
+from app import parse_cv_content
+
+RANDOM_TEXTS = 3000
+
+FIXED_CVS = [
+    """Ahmet Yılmaz - Istanbul, Türkiye
+Bilgisayar Mühendisliği, GPA: 3.45 / 4.0
+TOEFL iBT: 105
+Research assistant 2 years at robotics lab
+Work experience: 3 years as software engineer
+5 publications in IEEE journals
+Skills: Python, React, Docker""",
+    """Jane Doe, United States
+Cumulative GPA 3.8 out of 4.0, B.Sc. in Mathematics and Physics
+IELTS Academic 7.5
+1.5 years research on control systems; professional experience 4
+3 papers published""",
+    """Not ortalaması: 3.12
+YDS: 82, e-YÖKDİL 75
+Makine mühendisliği ve elektrik mühendisliği çift anadal, yapay zeka ve veri bilimi
+araştırma 1 yıl, 2 yıl iş deneyimi (work)
+2 makale""",
+    """Germany based ML engineer. 6 yr experience. toefl score was 98 in 2019.
+statistics and applied math, ai, ee""",
+    "gpa 4.5 then gpa 3.9; toefl 130 then toefl 110; ielts 9.5 ielts 8.0",
+    "ra: 0.5\nemployment 2\n12 publication",
+    "2 years\n" * 2000 + "research",
+    "no numbers here, only engineering and software",
+]
+
+TOKENS = [
+    "gpa", "gpa:", "cgpa", "cumulative gpa", "grade point average", "not ortalaması", "not:", "/ 4.0", "out of 4.0",
+    "(4.0", "toefl", "toefl ibt", "ielts", "ielts academic", "yds", "eyds", "yökdil", "e-yökdil",
+    "research", "research assistant", "araştırma", "ra:", "work experience", "experience", "professional experience",
+    "employment", "work", "year", "years", "yıl", "yr", "publication", "publications", "yayın", "paper", "makale",
+    "published", "3.45", "2.9", "4.0", "4.7", "7.5", "6.0", "105", "98", "120", "250", "82", "1", "2", "3", "12",
+    "0.5", "1.5", "computer science", "cs", "engineering", "engineer", "robot", "robotics", "ml", "math",
+    "applied math", "physics", "software", "ai", "ee", "statistics", "control systems", "mechanical", "turkey",
+    "usa", "germany", "uk", "and", "the", "with", "at", "lab", ":", ",", ".", "-", "(", ")"
+]
+
+BACKGROUND_KEYWORDS = {
+    'computer science': ['computer science', 'cs', 'bilgisayar', 'bilgisayar bilimi', 'computer engineering'],
+    'engineering': ['engineering', 'mühendislik', 'engineer'],
+    'robotics': ['robotics', 'robotik', 'robot'],
+    'data science': ['data science', 'veri bilimi', 'data scientist', 'machine learning', 'ml'],
+    'mechanical engineering': ['mechanical engineering', 'makine mühendisliği', 'mechanical'],
+    'electrical engineering': ['electrical engineering', 'elektrik mühendisliği', 'electrical', 'ee'],
+    'mathematics': ['mathematics', 'matematik', 'math', 'applied math'],
+    'physics': ['physics', 'fizik'],
+    'software engineering': ['software engineering', 'yazılım mühendisliği', 'software'],
+    'artificial intelligence': ['artificial intelligence', 'ai', 'yapay zeka'],
+    'control systems': ['control systems', 'kontrol sistemleri', 'control engineering'],
+    'statistics': ['statistics', 'istatistik']
+}
+
+# parse_cv_content'in bulunamayan alanlara verdiği değerler
+FIELD_DEFAULTS = {
+    'gpa': None,
+    'language_test_type': None,
+    'language_test_score': None,
+    'research_experience': 0,
+    'work_experience': 0,
+    'publications': 0
+}
+
+
+def _first(patterns, text_lower, convert, valid=lambda value: True):
+    """Eski döngü: sırayla ilk eşleşen ve geçerli değeri döndür"""
+    for pattern in patterns:
+        match = re.search(pattern, text_lower, re.IGNORECASE)
+        if match:
+            try:
+                value = convert(match.group(1))
+                if valid(value):
+                    return value
+            except ValueError:
+                continue
+    return None
+
+
+def legacy_cv_fields(text):
+    """parse_cv_content'in CVFieldExtractor'dan önceki alan çıkarımı (referans)"""
+    text_lower = text.lower()
+    fields = {}
+
+    gpa = _first([
+        r'gpa[:\s]*([0-9]+\.[0-9]+)',
+        r'grade point average[:\s]*([0-9]+\.[0-9]+)',
+        r'not ortalaması[:\s]*([0-9]+\.[0-9]+)',
+        r'not[:\s]*([0-9]+\.[0-9]+)',
+        r'([0-9]\.[0-9]+)\s*/\s*4\.0',
+        r'([0-9]\.[0-9]+)\s*out of\s*4\.0',
+        r'([0-9]\.[0-9]+)\s*\(4\.0',
+        r'cgpa[:\s]*([0-9]+\.[0-9]+)',
+        r'cumulative gpa[:\s]*([0-9]+\.[0-9]+)'
+    ], text_lower, float, lambda value: 0 <= value <= 4.0)
+    if gpa is not None:
+        fields['gpa'] = gpa
+
+    # Sonraki sınav öncekinin üzerine yazar (eski sıra: TOEFL, IELTS, YDS)
+    for test_type, patterns, convert, maximum in (
+        ('toefl', [r'toefl[:\s]*(\d{2,3})', r'toefl ibt[:\s]*(\d{2,3})', r'toefl.*?(\d{2,3})',
+                   r'(\d{2,3})\s*toefl'], int, 120),
+        ('ielts', [r'ielts[:\s]*(\d\.\d)', r'ielts academic[:\s]*(\d\.\d)', r'ielts.*?(\d\.\d)',
+                   r'(\d\.\d)\s*ielts'], float, 9),
+        ('yds', [r'yds[:\s]*(\d{2,3})', r'eyds[:\s]*(\d{2,3})', r'yökdil[:\s]*(\d{2,3})',
+                 r'e-yökdil[:\s]*(\d{2,3})'], int, 100)
+    ):
+        score = _first(patterns, text_lower, convert, lambda value: 0 <= value <= maximum)
+        if score is not None:
+            fields['language_test_type'] = test_type
+            fields['language_test_score'] = score
+
+    found_backgrounds = []
+    for field, keywords in BACKGROUND_KEYWORDS.items():
+        for keyword in keywords:
+            if re.search(r'\b' + re.escape(keyword) + r'\b', text_lower, re.IGNORECASE):
+                found_backgrounds.append(field)
+                break
+    if found_backgrounds:
+        fields['background'] = found_backgrounds
+
+    research = _first([
+        r'research[:\s]*(\d+\.?\d*)\s*(?:year|yıl|yr)',
+        r'araştırma[:\s]*(\d+\.?\d*)\s*(?:year|yıl|yr)',
+        r'(\d+\.?\d*)\s*(?:year|yıl|yr).*research',
+        r'research assistant[:\s]*(\d+\.?\d*)',
+        r'ra[:\s]*(\d+\.?\d*)'
+    ], text_lower, float)
+    if research is not None:
+        fields['research_experience'] = research
+
+    work = _first([
+        r'work experience[:\s]*(\d+\.?\d*)\s*(?:year|yıl|yr)',
+        r'experience[:\s]*(\d+\.?\d*)\s*(?:year|yıl|yr)',
+        r'(\d+\.?\d*)\s*(?:year|yıl|yr).*experience',
+        r'(\d+)\s*(?:year|yıl|yr).*work',
+        r'professional experience[:\s]*(\d+\.?\d*)',
+        r'employment[:\s]*(\d+\.?\d*)'
+    ], text_lower, float)
+    if work is not None:
+        fields['work_experience'] = work
+
+    publications = _first([
+        r'(\d+)\s*(?:publication|yayın|paper|makale)',
+        r'publication[:\s]+(\d+)',
+        r'(\d+)\s*published'
+    ], text_lower, int)
+    if publications is not None:
+        fields['publications'] = publications
+
+    return fields
+
+
+def random_text(rng):
+    separators = [" ", " ", " ", "", ": ", "\n", ", "]
+    return "".join(rng.choice(TOKENS) + rng.choice(separators) for _ in range(rng.randrange(3, 30)))
+
+
+def texts():
+    rng = random.Random(2024)
+    return FIXED_CVS + [random_text(rng) for _ in range(RANDOM_TEXTS)]
+
+
+def assert_fields_equal(text):
+    parsed = parse_cv_content(text)
+    expected = legacy_cv_fields(text)
+    for key, default in FIELD_DEFAULTS.items():
+        value = expected.get(key, default)
+        assert parsed[key] == value, (key, text)
+        assert type(parsed[key]) is type(value), (key, text)
+    # Eski kod list(set(...)) döndürüyordu; sıra değil küme karşılaştırılır
+    assert set(parsed['background']) == set(expected.get('background', [])), text
+    return parsed
+
+
+def test_fixed_cvs_match_legacy():
+    print("Sabit CV eşdeğerlik testi...")
+    for text in FIXED_CVS:
+        assert_fields_equal(text)
+    first = parse_cv_content(FIXED_CVS[0])
+    assert first['gpa'] == 3.45 and first['language_test_score'] == 105
+    assert first['background'] == ['computer science', 'engineering', 'robotics', 'software engineering']
+    print(f"[OK] {len(FIXED_CVS)} CV")
+
+
+def test_random_texts_match_legacy():
+    print("Rastgele metin eşdeğerlik testi...")
+    found = 0
+    for text in texts():
+        parsed = assert_fields_equal(text)
+        found += sum(parsed.get(key) not in (None, 0, []) for key in ('gpa', 'language_test_score',
+                                                                        'research_experience', 'work_experience',
+                                                                        'publications'))
+    # Rastgele metinlerde alanlar gerçekten bulunuyor (boş karşılaştırma değil)
+    assert found > RANDOM_TEXTS // 2
+    print(f"[OK] {RANDOM_TEXTS} metin, {found} dolu alan")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("CV Alan Çıkarımı Eşdeğerlik Testi")
+    print("=" * 50)
+    print()
+
+    test_fixed_cvs_match_legacy()
+    test_random_texts_match_legacy()
+    print("[OK] Tum testler tamamlandi!")
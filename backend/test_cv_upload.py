@@ -0,0 +1,129 @@
+"""
+CV upload boyut sınırı testi
+Sınır dosya diske yazılırken uygulanır: sınırı aşan upload'ın gövdesi
+sonuna kadar okunmadan 413 döner ve geçici dosya silinir.
+
+Çalıştırma: python test_cv_upload.py  (veya pytest test_cv_upload.py)
+"""
+
+import io
+import os
+import tempfile
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import app
+import premium
+from conftest import pro_client
+from cv_upload import SpooledUpload, UploadRequest
+
+USER_ID = "upload-user"
+LIMIT = 64 * 1024
+BODY_BYTES = 8 * 1024 * 1024
+BOUNDARY = "cvuploadtestboundary"
+
+
+class CountingStream(io.RawIOBase):
+    """Okunan byte sayısını tutan, içeriği parça parça üreten gövde"""
+
+    def __init__(self, head, file_bytes, tail):
+        self.parts = [head, tail]
+        self.file_left = file_bytes
+        self.read_bytes = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.parts[0]:
+            data, self.parts[0] = self.parts[0][:len(buffer)], self.parts[0][len(buffer):]
+        elif self.file_left:
+            data = b"%" * min(len(buffer), self.file_left)
+            self.file_left -= len(data)
+        else:
+            data, self.parts[1] = self.parts[1][:len(buffer)], self.parts[1][len(buffer):]
+        buffer[:len(data)] = data
+        self.read_bytes += len(data)
+        return len(data)
+
+
+def multipart_stream(file_bytes):
+    head = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"cv\"; filename=\"cv.pdf\"\r\n"
+            f"Content-Type: application/pdf\r\n\r\n").encode()
+    tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+    return CountingStream(head, file_bytes, tail), len(head) + file_bytes + len(tail)
+
+
+def upload_files():
+    return {name for name in os.listdir(tempfile.gettempdir()) if name.startswith("cv-upload-")}
+
+
+def test_spooled_upload_enforces_limit_while_writing():
+    print("SpooledUpload sınır testi...")
+    upload = SpooledUpload(1000)
+    upload.write(b"x" * 400)
+    upload.write(b"x" * 400)
+    try:
+        upload.write(b"x" * 400)
+        assert False, "Sınır aşıldı ama hata verilmedi"
+    except RequestEntityTooLarge:
+        pass
+    assert not os.path.exists(upload.name), "Sınırı aşan geçici dosya silinmedi"
+    print("[OK]")
+
+
+def test_oversized_upload_returns_413_before_body_is_read():
+    print("413 testi...")
+    saved = UploadRequest.upload_limits['parse_cv']
+    UploadRequest.upload_limits['parse_cv'] = LIMIT
+    before = upload_files()
+    try:
+        with pro_client(app.app, USER_ID) as client:
+            stream, length = multipart_stream(BODY_BYTES)
+            response = client.post(
+                "/api/parse-cv", content_type=f"multipart/form-data; boundary={BOUNDARY}",
+                headers={"X-API-Key": premium.create_api_key(USER_ID)},
+                # Gövde akış olarak verilir (test istemcisi input_stream'i baştan sona okur)
+                environ_overrides={"wsgi.input": stream, "CONTENT_LENGTH": str(length)}
+            )
+            assert response.status_code == 413, response.get_json()
+            assert response.get_json()["success"] is False
+            # Gövdenin tamamı okunmadan (sınır + okuma tamponları kadar) kesildi
+            assert stream.read_bytes < BODY_BYTES // 4, stream.read_bytes
+            assert upload_files() == before
+            print(f"[OK] {length} byte gövdenin {stream.read_bytes} byte'ı okundu")
+    finally:
+        UploadRequest.upload_limits['parse_cv'] = saved
+
+
+def test_upload_under_limit_is_accepted():
+    print("Sınır altı upload testi...")
+    saved = UploadRequest.upload_limits['parse_cv']
+    UploadRequest.upload_limits['parse_cv'] = LIMIT
+    try:
+        with pro_client(app.app, USER_ID) as client:
+            stream, length = multipart_stream(LIMIT)
+            response = client.post(
+                "/api/parse-cv", content_type=f"multipart/form-data; boundary={BOUNDARY}",
+                headers={"X-API-Key": premium.create_api_key(USER_ID)},
+                # Gövde akış olarak verilir (test istemcisi input_stream'i baştan sona okur)
+                environ_overrides={"wsgi.input": stream, "CONTENT_LENGTH": str(length)}
+            )
+            # Geçersiz PDF içeriği: sınır aşılmadı, dosya analiz aşamasına geçti
+            assert response.status_code != 413
+            assert stream.read_bytes == length
+            print(f"[OK] {response.status_code}")
+    finally:
+        UploadRequest.upload_limits['parse_cv'] = saved
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("CV Upload Boyut Sınırı Testi")
+    print("=" * 50)
+    print()
+
+    test_spooled_upload_enforces_limit_while_writing()
+    test_oversized_upload_returns_413_before_body_is_read()
+    test_upload_under_limit_is_accepted()
+    print("[OK] Tum testler tamamlandi!")
@@ -0,0 +1,276 @@
+"""
+Eşleştirme eşdeğerlik testi
+MatchingEngine (vektörel) ve calculate_applicant_terms üzerinden yazılmış
+calculate_match_score, eski tekil skorlayıcıyla (aşağıda birebir kopyası)
+sabit profiller üzerinde aynı skorları üretmeli.
+
+Çalıştırma: python test_matching_equivalence.py  (veya pytest test_matching_equivalence.py)
+"""
+
+import random
+
+import numpy as np
+
+import app
+from app import (UNIVERSITIES, calculate_bonus_points, calculate_match_score, calculate_minimum_gpa_requirement,
+                 convert_gpa_to_4_0, matching_engine, normalize_language_score)
+from conftest import pro_client
+
+RANDOM_PROFILES = 500
+ENDPOINT_PROFILES = 40
+USER_ID = "matching-user"
+UNIVERSITIES_BY_ID = {u["id"]: u for u in UNIVERSITIES}
+
+FIXED_PROFILES = [
+    {},
+    {"gpa": 3.9, "grading_system": "4.0", "language_test_type": "toefl", "language_test_score": 112,
+     "background": ["computer science", "mathematics"], "research_experience": 2, "publications": 5,
+     "recommendation_letters": 3, "gre_score": 328, "undergraduate_university_ranking": "top100",
+     "has_masters_degree": True, "masters_university_ranking": "top100", "project_experience": "multiple",
+     "competition_achievements": "gold", "work_experience": 3},
+    # Minimum GPA'nın altında: sabit 20.0
+    {"gpa": 2.1, "grading_system": "4.0", "background": ["engineering"]},
+    # 10+ yıl deneyim minimum GPA şartını kaldırır
+    {"gpa": 2.1, "grading_system": "4.0", "work_experience": 12, "background": ["robotics"]},
+    {"gpa": 72, "grading_system": "uk", "language_test_type": "ielts", "language_test_score": 7.5,
+     "background": ["electrical engineering", "control systems"], "gmat_score": 690},
+    {"gpa": 1.7, "grading_system": "german", "language_test_type": "testdaf", "language_test_score": 4,
+     "background": ["mechanical engineering"], "research_experience": 0.5},
+    {"gpa": 15, "grading_system": "french", "language_test_type": "delf", "language_test_score": 65,
+     "background": ["mathematics", "unknown field"], "publications": 1},
+    {"gpa": 88, "grading_system": "100", "language_test_type": "yds", "language_test_score": 85,
+     "background": [], "recommendation_letters": 2, "gre_score": 305}
+]
+
+GRADING = [("4.0", 2.0, 4.0), ("uk", 40, 85), ("german", 1.0, 3.5), ("french", 10, 19), ("100", 55, 98)]
+LANGUAGE_TESTS = [("toefl", 60, 120), ("ielts", 5.0, 9.0), ("pte", 45, 90), ("duolingo", 90, 160),
+                  ("yds", 50, 100), ("testdaf", 3, 5), ("tcf", 300, 699), ("", 0, 0)]
+BACKGROUNDS = ["computer science", "control systems", "electrical engineering", "engineering",
+               "mathematics", "mechanical engineering", "robotics", "physics"]
+
+
+def legacy_match_score(user_data, university):
+    """calculate_match_score'un vektörel motordan önceki hali (referans)"""
+    score = 0.0
+
+    gpa = user_data.get('gpa', 0)
+    grading_system = user_data.get('grading_system', '4.0')
+    gpa_4_0 = convert_gpa_to_4_0(gpa, grading_system)
+
+    min_gpa_req = calculate_minimum_gpa_requirement(user_data)
+    work_exp = user_data.get('work_experience', 0)
+    if work_exp < 10 and gpa_4_0 < min_gpa_req:
+        return 20.0
+
+    if gpa_4_0 >= university['min_gpa']:
+        score += min(30, (gpa_4_0 / 4.0) * 30)
+    else:
+        score += (gpa_4_0 / university['min_gpa']) * 15
+
+    undergrad_ranking = user_data.get('undergraduate_university_ranking', '')
+    if undergrad_ranking == 'top100':
+        score += 2.0
+    elif undergrad_ranking == 'top500':
+        score += 1.5
+    elif undergrad_ranking == 'top1000':
+        score += 1.0
+
+    language_test_type = user_data.get('language_test_type', '')
+    language_test_score = user_data.get('language_test_score')
+    if language_test_type and language_test_score:
+        normalized_score = normalize_language_score(language_test_type, language_test_score)
+        if normalized_score >= 90:
+            score += 20
+        elif normalized_score >= 80:
+            score += 18
+        elif normalized_score >= 70:
+            score += 15
+        elif normalized_score >= 60:
+            score += 10
+        else:
+            score += 5
+
+    user_background = user_data.get('background', [])
+    required_background = university.get('required_background', [])
+    if required_background:
+        common_fields = set(user_background) & set(required_background)
+        if common_fields:
+            score += min(15, (len(common_fields) / len(required_background)) * 15)
+    else:
+        score += 15
+
+    research_exp = user_data.get('research_experience', 0)
+    if research_exp >= 2:
+        score += 10
+    elif research_exp >= 1:
+        score += 7
+    elif research_exp >= 0.5:
+        score += 4
+
+    if work_exp >= 10:
+        score += 8
+    elif work_exp >= 5:
+        score += 6
+    elif work_exp >= 2:
+        score += 4
+    elif work_exp >= 1:
+        score += 2
+
+    publications = user_data.get('publications', 0)
+    if publications >= 5:
+        score += 5
+    elif publications >= 3:
+        score += 3
+    elif publications >= 1:
+        score += 2
+
+    rec_letters = user_data.get('recommendation_letters', 0)
+    if rec_letters >= 3:
+        score += 5
+    elif rec_letters >= 2:
+        score += 3
+    elif rec_letters >= 1:
+        score += 2
+
+    gre_score = user_data.get('gre_score')
+    gmat_score = user_data.get('gmat_score')
+    if gre_score and gre_score >= 320:
+        score += 3
+    elif gre_score and gre_score >= 310:
+        score += 2
+    elif gre_score and gre_score >= 300:
+        score += 1
+    if gmat_score and gmat_score >= 700:
+        score += 3
+    elif gmat_score and gmat_score >= 650:
+        score += 2
+    elif gmat_score and gmat_score >= 600:
+        score += 1
+
+    score += calculate_bonus_points(user_data) * 10
+    return min(score, 110.0)
+
+
+def random_profile(rng):
+    """Sabit seed'li rastgele profil (tüm skor eşiklerinin iki tarafını kapsar)"""
+    system, low, high = rng.choice(GRADING)
+    test, test_low, test_high = rng.choice(LANGUAGE_TESTS)
+    profile = {
+        "gpa": round(rng.uniform(low, high), 2),
+        "grading_system": system,
+        "background": rng.sample(BACKGROUNDS, rng.randrange(0, 4)),
+        "research_experience": rng.choice([0, 0.5, 1, 1.5, 2, 3]),
+        "work_experience": rng.choice([0, 1, 2, 4, 5, 9, 10, 15]),
+        "publications": rng.choice([0, 1, 3, 5, 8]),
+        "recommendation_letters": rng.choice([0, 1, 2, 3]),
+        "undergraduate_university_ranking": rng.choice(["", "top100", "top500", "top1000", "other"]),
+        "has_masters_degree": rng.random() < 0.3,
+        "masters_university_ranking": rng.choice(["", "top500", "other"]),
+        "project_experience": rng.choice(["none", "national", "eu", "international", "multiple"]),
+        "competition_achievements": rng.choice(["none", "bronze", "silver", "gold", "multiple"])
+    }
+    if test:
+        profile["language_test_type"] = test
+        profile["language_test_score"] = round(rng.uniform(test_low, test_high), 1)
+    if rng.random() < 0.5:
+        profile["gre_score"] = rng.randrange(290, 340)
+    if rng.random() < 0.3:
+        profile["gmat_score"] = rng.randrange(550, 780)
+    return profile
+
+
+def profiles():
+    rng = random.Random(2024)
+    return FIXED_PROFILES + [random_profile(rng) for _ in range(RANDOM_PROFILES)]
+
+
+def test_scalar_score_matches_legacy():
+    print("Tekil skor eşdeğerlik testi...")
+    checked = 0
+    for profile in profiles():
+        for university in UNIVERSITIES:
+            expected = round(legacy_match_score(profile, university), 2)
+            assert calculate_match_score(profile, university) == expected, (profile, university['name'])
+            checked += 1
+    print(f"[OK] {checked} profil/üniversite çifti aynı")
+
+
+def test_engine_score_matches_legacy():
+    print("MatchingEngine eşdeğerlik testi...")
+    all_profiles = profiles()
+    for profile in all_profiles:
+        expected = [legacy_match_score(profile, university) for university in UNIVERSITIES]
+        # Yuvarlanmamış skorlar birebir (bit düzeyinde) aynı
+        assert matching_engine.score(profile).tolist() == expected, profile
+        assert matching_engine.match_scores(profile) == [round(value, 2) for value in expected]
+    print(f"[OK] {len(all_profiles)} profil x {len(UNIVERSITIES)} üniversite")
+
+
+def test_batch_scoring_matches_single():
+    print("Toplu skor testi...")
+    all_profiles = profiles()
+    terms_list = [app.calculate_applicant_terms(profile) for profile in all_profiles]
+    batch = matching_engine.score_terms(terms_list)
+    single = np.array([matching_engine.score(profile) for profile in all_profiles])
+    assert np.array_equal(batch, single)
+    print(f"[OK] {batch.shape[0]}x{batch.shape[1]} matris tekil skorlarla aynı")
+
+
+def flatten(buckets):
+    """bucket_matches çıktısını sıralı tek listeye çevir"""
+    return [u for bucket in ("high_match", "medium_match", "low_match", "extra_options") for u in buckets[bucket]]
+
+
+def test_batch_endpoint_matches_single_scores():
+    print("Batch endpoint testi...")
+    headers = {"X-User-ID": USER_ID}
+    batch_profiles = profiles()[:ENDPOINT_PROFILES]
+    with pro_client(app.app, USER_ID) as client:
+        for top_k in (True, False, 0, -1, "3"):
+            response = client.post("/api/match/batch", headers=headers, json={"profiles": [{}], "top_k": top_k})
+            assert response.status_code == 400, top_k
+
+        data = client.post("/api/match/batch", headers=headers,
+                           json={"profiles": batch_profiles, "top_k": 7, "include_expired": True}).get_json()
+        for profile, result in zip(batch_profiles, data["profiles"]):
+            rows = flatten(result["results"])
+            expected = sorted(matching_engine.match_scores(profile), reverse=True)[:7]
+            # Dönen skor sıralamada kullanılan değerle aynı
+            assert [u["match_score"] for u in rows] == expected
+            for university in rows:
+                assert university["match_score"] == calculate_match_score(profile, UNIVERSITIES_BY_ID[university["id"]])
+    print(f"[OK] {len(batch_profiles)} profil, bool top_k reddedildi")
+
+
+
+def test_min_score_filter_uses_returned_score():
+    print("min_score filtresi testi...")
+    headers = {"X-User-ID": USER_ID}
+    with pro_client(app.app, USER_ID) as client:
+        for profile in profiles()[:ENDPOINT_PROFILES]:
+            expected = [calculate_match_score(profile, university) for university in UNIVERSITIES]
+            # Eşik tam olarak dönen skorlardan biri: sınırdaki okul dahil edilmeli
+            for min_score in sorted(set(expected))[::3]:
+                data = client.post("/api/match", headers=headers,
+                                   json=dict(profile, include_expired=True, min_score=min_score)).get_json()
+                rows = flatten(data["results"])
+                assert data["pagination"]["total"] == sum(score >= min_score for score in expected)
+                assert all(u["match_score"] >= min_score for u in rows)
+                assert [u["match_score"] for u in rows] == sorted(
+                    (score for score in expected if score >= min_score), reverse=True
+                )
+    print("[OK] filtre ve dönen skor aynı değer")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Eşleştirme Eşdeğerlik Testi")
+    print("=" * 50)
+    print()
+
+    test_scalar_score_matches_legacy()
+    test_engine_score_matches_legacy()
+    test_batch_scoring_matches_single()
+    test_batch_endpoint_matches_single_scores()
+    test_min_score_filter_uses_returned_score()
+    print("[OK] Tum testler tamamlandi!")
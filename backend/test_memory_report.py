@@ -0,0 +1,72 @@
+"""
+/api/health/memory testi
+Rapor env flag ile kapalıyken herkese 404 (index'te de yok), açıkken
+sadece pro tier (API key) ile erişilebilir; gc nesne sayımı aralık dolana
+kadar tekrar yapılmaz.
+
+Çalıştırma: python test_memory_report.py  (veya pytest test_memory_report.py)
+"""
+
+import app
+import premium
+from conftest import premium_store
+
+PRO_USER = "memory-pro"
+FREE_USER = "memory-free"
+
+
+class CountingGC:
+    """gc modülünü sarar; get_objects çağrılarını sayar"""
+
+    def __init__(self, module):
+        self.module = module
+        self.calls = 0
+
+    def get_objects(self):
+        self.calls += 1
+        return self.module.get_objects()
+
+
+def test_memory_report_access_and_census_throttle():
+    print("Bellek raporu testi...")
+    saved = (app.MEMORY_REPORT_ENABLED, app.MEMORY_REPORT_GC_INTERVAL, app.gc, dict(app._gc_census))
+    try:
+        with premium_store():
+            premium.upgrade_user(PRO_USER, 'pro')
+            pro_key = premium.create_api_key(PRO_USER)
+            client = app.app.test_client()
+            app.gc = counting = CountingGC(saved[2])
+            app._gc_census.update(objects=None, at=0.0)
+
+            app.MEMORY_REPORT_ENABLED = False
+            for headers in ({"X-API-Key": pro_key}, {"X-User-ID": FREE_USER}, {}):
+                assert client.get("/api/health/memory", headers=headers).status_code == 404
+            assert "memory" not in client.get("/").get_json()["endpoints"]["core"]
+
+            app.MEMORY_REPORT_ENABLED = True
+            assert "memory" in client.get("/").get_json()["endpoints"]["core"]
+            assert client.get("/api/health/memory", headers={"X-User-ID": FREE_USER}).status_code == 403
+
+            app.MEMORY_REPORT_GC_INTERVAL = 3600
+            reports = [client.get("/api/health/memory", headers={"X-API-Key": pro_key}).get_json()["memory"]
+                       for _ in range(5)]
+            assert counting.calls == 1
+            assert len({report["gc_objects"] for report in reports}) == 1
+
+            app.MEMORY_REPORT_GC_INTERVAL = 0
+            client.get("/api/health/memory", headers={"X-API-Key": pro_key})
+            assert counting.calls == 2
+            print(f"[OK] 6 rapor, {counting.calls} gc sayımı")
+    finally:
+        app.MEMORY_REPORT_ENABLED, app.MEMORY_REPORT_GC_INTERVAL, app.gc, census = saved
+        app._gc_census.update(census)
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Bellek Raporu Testi")
+    print("=" * 50)
+    print()
+
+    test_memory_report_access_and_census_throttle()
+    print("[OK] Tum testler tamamlandi!")
@@ -0,0 +1,94 @@
+"""
+/api/parse-and-match partial (NDJSON) modu testi
+partial=true iken parse biter bitmez 'parsed' satırı, ardından 'matched'
+satırı gelir; iki satırın birleşimi tek yanıtlı moddaki yanıtla aynıdır.
+Parse başarısızsa sadece 'parsed' satırı (hata) döner.
+
+Çalıştırma: python test_parse_and_match.py  (veya pytest test_parse_and_match.py)
+"""
+
+import io
+import json
+
+from docx import Document
+
+import app
+import premium
+from conftest import pro_client
+
+USER_ID = "parse-match-user"
+CV_TEXT = ("Zeynep Kaya, Istanbul\nEducation: Bogazici University, Computer Engineering, GPA: 3.62 / 4.0\n"
+           "TOEFL iBT: 104\nResearch assistant 2 years, 3 publications\nSkills: Python, PyTorch, Docker")
+OPTIONS = {"limit": 5, "include_expired": True, "motivation_letter": "strong"}
+
+
+def docx_file(text):
+    buffer = io.BytesIO()
+    document = Document()
+    document.add_paragraph(text)
+    document.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def post(client, api_key, text, partial):
+    data = {"cv": (docx_file(text), "cv.docx"), "options": json.dumps(OPTIONS)}
+    if partial:
+        data["partial"] = "true"
+    return client.post("/api/parse-and-match", data=data, headers={"X-API-Key": api_key},
+                       content_type="multipart/form-data", buffered=not partial)
+
+
+def test_partial_stream_matches_single_response():
+    print("Partial mod testi...")
+    with pro_client(app.app, USER_ID) as client:
+        api_key = premium.create_api_key(USER_ID)
+        response = post(client, api_key, CV_TEXT, partial=True)
+        assert response.mimetype == "application/x-ndjson"
+        chunks = iter(response.response)
+        # Parse satırı eşleştirme yapılmadan önce akar
+        parsed = json.loads(next(chunks))
+        assert parsed["stage"] == "parsed" and parsed["status_code"] == 200 and parsed["success"]
+        assert parsed["extracted_data"]["gpa"] == 3.62
+        rest = [json.loads(chunk) for chunk in chunks if chunk.strip()]
+        response.close()
+        assert len(rest) == 1
+        matched = rest[0]
+        assert matched["stage"] == "matched" and matched["status_code"] == 200 and matched["success"]
+        assert "user_data" not in matched and "extracted_data" not in matched
+
+        single = post(client, api_key, CV_TEXT, partial=False).get_json()
+
+    combined = dict(parsed)
+    combined.update(matched)
+    for key in ("stage", "status_code"):
+        combined.pop(key)
+    # İkinci istek parse cache'ten gelir; sadece cache bilgisi farklı olabilir
+    for body in (combined, single):
+        body["cv"].pop("cached")
+    assert combined == single
+    assert matched["pagination"]["returned"] == OPTIONS["limit"]
+    print(f"[OK] {matched['pagination']['returned']}/{matched['pagination']['total']} eşleşme, "
+          "iki satır = tek yanıt")
+
+
+def test_partial_stream_stops_after_failed_parse():
+    print("Başarısız parse testi...")
+    with pro_client(app.app, USER_ID) as client:
+        api_key = premium.create_api_key(USER_ID)
+        response = post(client, api_key, "kısa", partial=True)
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["stage"] == "parsed" and lines[0]["success"] is False and lines[0]["status_code"] == 400
+    print("[OK]")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Parse-and-Match Partial Mod Testi")
+    print("=" * 50)
+    print()
+
+    test_partial_stream_matches_single_response()
+    test_partial_stream_stops_after_failed_parse()
+    print("[OK] Tum testler tamamlandi!")
@@ -0,0 +1,162 @@
+"""
+UsageLimiter testi
+Günlük/aylık pencere geçişleri, TIER_LIMITS (-1 = sınırsız), upgrade_user
+sonrası tier'ın bellekteki sayaca yansıması, flush sonrası tazelemede
+farkların iki kez sayılmaması ve boşta kalan kullanıcıların atılması.
+
+Çalıştırma: python test_rate_limiter.py  (veya pytest test_rate_limiter.py)
+"""
+
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import premium
+from conftest import premium_store
+from premium import TIER_LIMITS
+from rate_limiter import IDLE_EVICT_SECONDS, UsageLimiter
+from user_store import UserStore
+
+MARCH_14 = datetime(2025, 3, 14, 10, 0)
+MARCH_15 = datetime(2025, 3, 15, 0, 5)
+APRIL_1 = datetime(2025, 4, 1, 0, 5)
+
+
+def new_limiter(directory):
+    store = UserStore(os.path.join(directory, "users.db"))
+    # flush_interval=0: arka plan thread'i yok, flush testte elle çağrılır
+    return store, UsageLimiter(store, TIER_LIMITS, 0)
+
+
+def allowed(limiter, user_id, endpoint="match", now=MARCH_14):
+    return limiter.check_and_consume(user_id, endpoint, now=now)[0]
+
+
+def test_daily_and_monthly_rollover():
+    print("Pencere geçişi testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        store, limiter = new_limiter(directory)
+        daily = TIER_LIMITS["free"]["requests_per_day"]
+        assert all(allowed(limiter, "free-user") for _ in range(daily))
+        assert not allowed(limiter, "free-user")
+        # Gün değişti: günlük sayaç sıfırlanır
+        assert allowed(limiter, "free-user", now=MARCH_15)
+        assert limiter.usage_snapshot("free-user")["requests_today"] == 1
+
+        monthly = TIER_LIMITS["free"]["cv_analyses_per_month"]
+        assert all(allowed(limiter, "cv-user", "parse-cv") for _ in range(monthly))
+        assert not allowed(limiter, "cv-user", "parse-cv", now=MARCH_15)
+        # CV limiti dolu olsa da diğer endpoint'ler günlük limitle çalışır
+        assert allowed(limiter, "cv-user", now=MARCH_15)
+        assert allowed(limiter, "cv-user", "parse-cv", now=APRIL_1)
+        usage = limiter.usage_snapshot("cv-user")
+        assert usage["cv_analyses_this_month"] == 1 and usage["last_cv_analysis_month"] == "2025-04"
+        print("[OK]")
+
+
+def test_tier_limits_and_unlimited():
+    print("TIER_LIMITS testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        store, limiter = new_limiter(directory)
+        store.set_tier("premium-user", "premium")
+        store.set_tier("pro-user", "pro")
+        store.set_tier("legacy-user", "no-such-tier")
+
+        premium_daily = TIER_LIMITS["premium"]["requests_per_day"]
+        # premium: CV analizi sınırsız (-1), günlük request sınırlı
+        assert all(allowed(limiter, "premium-user", "parse-cv") for _ in range(premium_daily))
+        assert not allowed(limiter, "premium-user", "parse-cv")
+        # pro: ikisi de sınırsız
+        assert all(allowed(limiter, "pro-user", "parse-cv") for _ in range(3 * premium_daily))
+        # Bilinmeyen tier free limitlerini alır
+        free_daily = TIER_LIMITS["free"]["requests_per_day"]
+        assert all(allowed(limiter, "legacy-user") for _ in range(free_daily))
+        assert not allowed(limiter, "legacy-user")
+        print("[OK]")
+
+
+def test_set_tier_after_upgrade_user():
+    print("upgrade_user testi...")
+    with premium_store() as store:
+        limiter = premium._usage_limiter
+        while allowed(limiter, "upgrader"):
+            pass
+        premium.upgrade_user("upgrader", "pro", "cus_1", "sub_1")
+        # Flush beklemeden bellekteki sayaç yeni tier'ı kullanır
+        assert allowed(limiter, "upgrader")
+        limiter.flush()
+        assert allowed(limiter, "upgrader")
+        assert store.get_tier("upgrader") == "pro"
+        assert store.get_user("upgrader")["subscription_id"] == "sub_1"
+        print("[OK]")
+
+
+def test_flushed_deltas_not_counted_twice():
+    print("Flush/tazeleme testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        store, limiter = new_limiter(directory)
+        other = UsageLimiter(store, TIER_LIMITS, 0)  # Başka bir worker
+        store.set_tier("shared", "premium")
+
+        for _ in range(3):
+            limiter.consume("shared", "parse-cv", now=MARCH_14)
+        assert limiter.flush() == 1
+        assert limiter.usage_snapshot("shared")["requests_today"] == 3
+        limiter.consume("shared", now=MARCH_14)
+        limiter.flush()
+        assert store.get_user("shared")["usage"]["requests_today"] == 4
+        assert limiter.usage_snapshot("shared")["requests_today"] == 4
+
+        for _ in range(2):
+            other.consume("shared", now=MARCH_14)
+        other.flush()
+        # Tazeleme diğer worker'ın kullanımını ekler, kendi farklarını tekrar eklemez
+        limiter.consume("shared", now=MARCH_14)
+        limiter.flush()
+        usage = store.get_user("shared")["usage"]
+        assert usage["requests_today"] == 7 and usage["cv_analyses_this_month"] == 3
+        assert limiter.usage_snapshot("shared") == usage
+        # Bekleyen fark yokken flush bir şey yazmaz
+        assert limiter.flush() == 0
+        assert store.get_user("shared")["usage"]["requests_today"] == 7
+        print("[OK]")
+
+
+def test_idle_users_evicted():
+    print("Boşta kullanıcı testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        store, limiter = new_limiter(directory)
+        for user_id in ("idle", "active"):
+            for _ in range(2):
+                limiter.consume(user_id, now=MARCH_14)
+        limiter.flush()
+
+        # Son görülme IDLE_EVICT_SECONDS'tan eski
+        limiter._counters["idle"].last_seen = time.monotonic() - IDLE_EVICT_SECONDS - 1
+        limiter.consume("pending-idle", now=MARCH_14)
+        limiter._counters["pending-idle"].last_seen = time.monotonic() - IDLE_EVICT_SECONDS - 1
+        limiter._evict_idle()
+        assert limiter.usage_snapshot("idle") is None
+        assert limiter.usage_snapshot("active")["requests_today"] == 2
+        # Yazılmamış farkı olan kullanıcı atılmaz
+        assert limiter.usage_snapshot("pending-idle")["requests_today"] == 1
+
+        # Atılan kullanıcı tekrar geldiğinde sayaçları veritabanından okunur
+        limiter.consume("idle", now=MARCH_14)
+        assert limiter.usage_snapshot("idle")["requests_today"] == 3
+        print("[OK]")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("UsageLimiter Testi")
+    print("=" * 50)
+    print()
+
+    test_daily_and_monthly_rollover()
+    test_tier_limits_and_unlimited()
+    test_set_tier_after_upgrade_user()
+    test_flushed_deltas_not_counted_twice()
+    test_idle_users_evicted()
+    print("[OK] Tum testler tamamlandi!")
@@ -0,0 +1,134 @@
+"""
+Beceri eşleştirici eşdeğerlik testi
+Trie-regex SkillMatcher üzerinden çalışan normalize_skill ve
+extract_skills_from_cv, synonym başına regex çalıştıran eski döngüyle
+(aşağıda birebir kopyası) sabit CV metinleri üzerinde aynı sonucu vermeli.
+
+Çalıştırma: python test_skill_matcher_equivalence.py  (veya pytest test_skill_matcher_equivalence.py)
+"""
+
+import random
+import re
+
+import app
+from app import SKILL_SYNONYMS, extract_skills_from_cv, normalize_skill
+
+RANDOM_TEXTS = 300
+
+FIXED_TEXTS = [
+    "",
+    "Python, JS ve React.js ile web uygulamaları geliştirdim. Node ve Express kullandım.",
+    "Skills: React Native, react, TypeScript, C++, C#, .NET, Go, R, SQL, PostgreSQL, MongoDB",
+    "Deneyim: AWS üzerinde Docker ve Kubernetes ile CI/CD; Git, GitHub Actions.",
+    "Makine öğrenmesi, deep learning, NLP ve computer vision projeleri (PyTorch, TensorFlow, scikit-learn).",
+    "Takım liderliği, iletişim ve problem solving; Scrum / Kanban ile çevik metodoloji.",
+    "Javascript'e ek olarak javascripts, reactive, nodejs-like ve c-- gibi sınır dışı kelimeler.",
+    "REACT NATIVE ve Next.js; Vue, Angular, Flask, Django, FastAPI, Spring Boot."
+]
+
+FILLER = ["ve", "ile", "projesi", "deneyim", "geliştirdim", "kullandım", "and", "with", "the", "built", "(", ")",
+          ",", ".", "-", "/", ";", "2023"]
+
+
+def legacy_normalize_skill(skill_text):
+    """normalize_skill'in SkillMatcher'dan önceki hali (referans)"""
+    if not skill_text:
+        return None
+    skill_lower = skill_text.lower().strip()
+    for standard_name, synonyms in SKILL_SYNONYMS.items():
+        for synonym in synonyms:
+            if skill_lower == synonym.lower():
+                return standard_name
+            pattern = r'\b' + re.escape(synonym.lower()) + r'\b'
+            if re.search(pattern, skill_lower):
+                return standard_name
+    return skill_lower
+
+
+def legacy_extract_skills(text):
+    """extract_skills_from_cv'nin beceri tarama döngüsünün eski hali (raw, normalized)"""
+    text_lower = text.lower()
+    found_skills = set()
+    raw_skills = set()
+    for standard_name, synonyms in SKILL_SYNONYMS.items():
+        for synonym in synonyms:
+            pattern = r'\b' + re.escape(synonym.lower()) + r'\b'
+            if re.search(pattern, text_lower):
+                raw_skills.add(synonym)
+                found_skills.add(standard_name)
+                break
+    return raw_skills, found_skills
+
+
+def all_synonyms():
+    return [synonym for synonyms in SKILL_SYNONYMS.values() for synonym in synonyms]
+
+
+def random_text(rng, synonyms):
+    """Synonym'ler, dolgu kelimeleri ve noktalamadan sabit seed'li metin"""
+    words = []
+    for _ in range(rng.randrange(5, 40)):
+        word = rng.choice(synonyms) if rng.random() < 0.4 else rng.choice(FILLER)
+        if rng.random() < 0.1:
+            word = word.upper()
+        # Kelime sınırını bozan ekler (javascripts, reactive, ...)
+        if rng.random() < 0.1:
+            word += rng.choice(["s", "ive", "'de", "-based", "2"])
+        words.append(word)
+    separators = [" ", ", ", " / ", "\n", " ("]
+    return "".join(word + rng.choice(separators) for word in words)
+
+
+def texts():
+    rng = random.Random(2024)
+    synonyms = all_synonyms()
+    return FIXED_TEXTS + [random_text(rng, synonyms) for _ in range(RANDOM_TEXTS)]
+
+
+def test_normalize_skill_matches_legacy():
+    print("normalize_skill eşdeğerlik testi...")
+    inputs = all_synonyms()
+    inputs += [s.upper() for s in inputs] + [f"  {s} " for s in inputs] + [f"{s} developer" for s in inputs]
+    inputs += ["", None, "unknown skill", "javascripts", "c--", "react native developer", "Senior Node/React"]
+    inputs += [line for text in texts() for line in text.split("\n")]
+    for skill in inputs:
+        assert normalize_skill(skill) == legacy_normalize_skill(skill), skill
+    print(f"[OK] {len(inputs)} girdi aynı normalize edildi")
+
+
+def test_extract_skills_matches_legacy():
+    print("extract_skills_from_cv eşdeğerlik testi...")
+    all_texts = texts()
+    for text in all_texts:
+        result = extract_skills_from_cv(text)
+        raw, found = legacy_extract_skills(text)
+        assert set(result['raw_skills']) == raw, text
+        assert set(result['normalized_skills']) == found, text
+        categorized = [skill for skills in result['skill_categories'].values() for skill in skills]
+        assert sorted(categorized) == sorted(found)
+    print(f"[OK] {len(all_texts)} metin")
+
+
+def test_rebuild_after_table_change():
+    print("Tablo değişikliği testi...")
+    saved = app.SKILL_SYNONYMS
+    try:
+        app.SKILL_SYNONYMS = dict(saved, elixir=["elixir", "phoenix framework"])
+        assert normalize_skill("Phoenix Framework") == "elixir"
+        assert "elixir" in extract_skills_from_cv("Elixir ve Python")['normalized_skills']
+    finally:
+        app.SKILL_SYNONYMS = saved
+    assert normalize_skill("Phoenix Framework") == "phoenix framework"
+    print("[OK] eşleştirici yeniden derlendi")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Beceri Eşleştirici Eşdeğerlik Testi")
+    print("=" * 50)
+    print()
+
+    test_normalize_skill_matches_legacy()
+    test_extract_skills_matches_legacy()
+    test_rebuild_after_table_change()
+    print("[OK] Tum testler tamamlandi!")
@@ -0,0 +1,159 @@
+"""
+Token sayacı testi ve mikro benchmark
+Türkçe/İngilizce örnek metinlerde karakter/token oranları, cache davranışı,
+/api/tokens/estimate toplu sayımı ve sayım hızı (MB/s) kontrol edilir.
+
+Çalıştırma: python test_token_counter.py  (veya pytest test_token_counter.py)
+"""
+
+import random
+import time
+
+from flask import Flask
+
+import token_system
+from token_counter import ApproxTokenCounter, CharRatioTokenCounter, get_token_counter
+
+EN_SAMPLE = """When you apply to a graduate program, the admissions committee reads hundreds of statements of purpose.
+Yours should explain why you want to study this subject, what you have already done to prepare, and how the
+program fits your long-term goals. Be specific: mention the courses, labs, or professors that interest you,
+and describe one or two projects in detail instead of listing everything. Keep the tone professional but
+personal, avoid clichés, and ask someone you trust to proofread the final draft before the deadline."""
+
+TR_SAMPLE = """Yüksek lisans başvurusu yaparken kabul komitesi yüzlerce niyet mektubu okur. Mektubunuz bu alanda neden
+okumak istediğinizi, şimdiye kadar nasıl hazırlandığınızı ve programın uzun vadeli hedeflerinize nasıl
+uyduğunu açıklamalıdır. Somut olun: ilginizi çeken dersleri, laboratuvarları veya profesörleri belirtin ve her
+şeyi sıralamak yerine bir iki projeyi ayrıntılı anlatın. Üslubunuz profesyonel ama kişisel olsun, klişelerden
+kaçının ve son taslağı başvuru tarihinden önce güvendiğiniz birine okutun."""
+
+BENCH_WORDS = 200_000
+
+
+def chars_per_token(counter, text):
+    return len(text) / counter.count(text)
+
+
+def test_calibration_turkish_and_english():
+    print("Kalibrasyon testi...")
+    counter = ApproxTokenCounter()
+    assert counter.detect_language(EN_SAMPLE) == "en"
+    assert counter.detect_language(TR_SAMPLE) == "tr"
+
+    en_ratio = chars_per_token(counter, EN_SAMPLE)
+    tr_ratio = chars_per_token(counter, TR_SAMPLE)
+    assert 3.7 <= en_ratio <= 4.3, en_ratio
+    assert 3.1 <= tr_ratio <= 3.7, tr_ratio
+    # Eski len // 4, Türkçe metni olduğundan az sayar
+    assert CharRatioTokenCounter().count(TR_SAMPLE) < counter.count(TR_SAMPLE)
+    assert counter.count("") == 0
+    print(f"[OK] EN {en_ratio:.2f}, TR {tr_ratio:.2f} karakter/token")
+
+
+def test_counts_are_additive_across_words():
+    """Boşlukta bölünen metnin parçaları toplamı bütünle aynı (TokenMeter bunu kullanır)"""
+    counter = ApproxTokenCounter()
+    words = EN_SAMPLE.split(" ")
+    half = len(words) // 2
+    first, second = " ".join(words[:half]) + " ", " ".join(words[half:])
+    assert counter.count(first) + counter.count(second) == counter.count(EN_SAMPLE)
+
+
+def test_streamed_reply_matches_whole_text():
+    """Akan Türkçe yanıt, parça boyutundan bağımsız olarak bütünüyle aynı sayılır"""
+    print("Stream sayım testi...")
+    whole = token_system.count_reply(TR_SAMPLE, token_system.detect_language(TR_SAMPLE))
+    assert whole == token_system.estimate_tokens(TR_SAMPLE)
+    counter = get_token_counter()
+    cached_before = counter.cache_info()["texts"]["currsize"]
+
+    words = TR_SAMPLE.split(" ")
+    for size in (1, 3, 7):
+        chunks = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        chunks[-1] = chunks[-1][:-1]
+        meter = token_system.TokenMeter("tr")
+        for chunk in chunks:
+            meter.add(chunk)
+        assert meter.total == whole, (size, meter.total, whole)
+    # Parçalar metin cache'ine yazılmaz
+    assert counter.cache_info()["texts"]["currsize"] == cached_before
+    print(f"[OK] {whole} token (1/3/7 kelimelik parçalar)")
+
+
+def test_cache_hits_for_repeated_text():
+    print("Cache testi...")
+    counter = ApproxTokenCounter(cache_size=8, cache_max_chars=10_000)
+    prompt = token_system.AGENTS["motivation_letter"]["system_prompt"]
+    expected = counter.count(prompt)
+    for _ in range(100):
+        assert counter.count(prompt) == expected
+    info = counter.cache_info()["texts"]
+    assert info["hits"] == 100 and info["misses"] == 1
+
+    # Sınırdan uzun metin bütün olarak cache'lenmez
+    counter.count("kelime " * 5000)
+    assert counter.cache_info()["texts"]["currsize"] == 1
+    print(f"[OK] {info['hits']} hit / {info['misses']} miss")
+
+
+def test_batch_estimate_endpoint():
+    print("Toplu tahmin testi...")
+    app = Flask(__name__)
+    token_system.register_token_routes(app)
+    client = app.test_client()
+
+    texts = [EN_SAMPLE, TR_SAMPLE, ""]
+    data = client.post("/api/tokens/estimate", json={"agent_id": "general_advisor", "texts": texts}).get_json()
+    counts = [item["tokens"] for item in data["texts"]]
+    assert counts == [token_system.estimate_tokens(t) for t in texts]
+    assert data["estimate"]["input_tokens"] == sum(counts)
+
+    bad = client.post("/api/tokens/estimate", json={"texts": "tek metin"})
+    assert bad.status_code == 400
+    too_many = client.post("/api/tokens/estimate", json={"texts": ["a"] * (token_system.TOKEN_ESTIMATE_MAX_TEXTS + 1)})
+    assert too_many.status_code == 400
+    print(f"[OK] {counts}")
+
+
+def bench_text(sample, seed):
+    """Örnek metnin kelimelerinden (ara sıra benzersiz sayılarla) büyük metin üret"""
+    rng = random.Random(seed)
+    words = sample.split()
+    return " ".join(
+        rng.choice(words) + (str(rng.randrange(100_000)) if rng.random() < 0.05 else "")
+        for _ in range(BENCH_WORDS)
+    )
+
+
+def test_benchmark_throughput():
+    print("Mikro benchmark...")
+    for name, sample in (("EN", EN_SAMPLE), ("TR", TR_SAMPLE)):
+        text = bench_text(sample, seed=len(name))
+        size_mb = len(text.encode("utf-8")) / 1_000_000
+        counter = ApproxTokenCounter(cache_max_chars=0)
+
+        started = time.perf_counter()
+        tokens = counter.count(text)
+        cold = size_mb / (time.perf_counter() - started)
+        started = time.perf_counter()
+        counter.count(text)
+        warm = size_mb / (time.perf_counter() - started)
+
+        assert tokens > 0
+        assert cold > 1.0, cold
+        print(f"[OK] {name}: {size_mb:.1f} MB, {tokens} token, "
+              f"{cold:.1f} MB/s (soğuk cache), {warm:.1f} MB/s (sıcak cache)")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Token Sayacı Testi")
+    print("=" * 50)
+    print()
+
+    test_calibration_turkish_and_english()
+    test_counts_are_additive_across_words()
+    test_streamed_reply_matches_whole_text()
+    test_cache_hits_for_repeated_text()
+    test_batch_estimate_endpoint()
+    test_benchmark_throughput()
+    print("[OK] Tum testler tamamlandi!")
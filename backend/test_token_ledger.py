@@ -0,0 +1,311 @@
+"""
+TokenLedger eşzamanlılık stres testi
+Aynı hesaptan çok sayıda thread ve süreç aynı anda harcama yapar;
+bakiye hiçbir zaman eksiye düşmemeli ve defter tutarlı kalmalı.
+Agent chat uçtan uca: model çağrıldıysa yanıt faturalanmış olmalı.
+
+Çalıştırma: python test_token_ledger.py  (veya pytest test_token_ledger.py)
+"""
+
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+import token_system
+from token_ledger import TokenLedger, InsufficientTokens
+from token_system import TokenTracker, register_token_routes
+
+USER_ID = "stress-user"
+STARTING_BALANCE = 10_000
+DEBIT_SIZE = 7
+THREADS = 16
+PROCESSES = 4
+DEBITS_PER_WORKER = 200
+CHAT_REQUESTS_PER_WORKER = 5
+
+
+def usage_record(tokens):
+    return {
+        "agent": "general_advisor",
+        "model": "claude-3-5-haiku-20241022",
+        "input_tokens": tokens - 2,
+        "output_tokens": 2,
+        "total_tokens": tokens,
+        "cost_usd": 0.0,
+        "timestamp": datetime.now().isoformat(),
+        "cached_input_tokens": 0,
+        "cache_write_tokens": 0
+    }
+
+
+def spend(db_path, attempts):
+    """attempts kez harcamayı dene; (başarılı, reddedilen, görülen en düşük bakiye) döndür"""
+    ledger = TokenLedger(db_path)
+    succeeded = rejected = 0
+    lowest = STARTING_BALANCE
+    for _ in range(attempts):
+        try:
+            remaining = ledger.debit(USER_ID, usage_record(DEBIT_SIZE))
+            succeeded += 1
+            lowest = min(lowest, remaining)
+        except InsufficientTokens as e:
+            rejected += 1
+            lowest = min(lowest, e.remaining)
+    return succeeded, rejected, lowest
+
+
+def check_ledger(db_path, succeeded, lowest):
+    ledger = TokenLedger(db_path)
+    account = ledger.account(USER_ID)
+    usage_rows = ledger._connection().execute(
+        'SELECT COUNT(*), COALESCE(SUM(total_tokens), 0) FROM token_usage WHERE user_id = ?', (USER_ID,)
+    ).fetchone()
+
+    assert lowest >= 0, f"Bakiye eksiye düştü: {lowest}"
+    assert account["remaining"] >= 0
+    assert account["remaining"] < DEBIT_SIZE, "Yeterli bakiye varken harcama reddedildi"
+    assert succeeded == STARTING_BALANCE // DEBIT_SIZE
+    assert account["total_used"] == succeeded * DEBIT_SIZE
+    assert tuple(usage_rows) == (succeeded, succeeded * DEBIT_SIZE)
+    return account
+
+
+def new_ledger(directory):
+    db_path = os.path.join(directory, "tokens.db")
+    TokenLedger(db_path).credit(USER_ID, STARTING_BALANCE, "test", "stress")
+    return db_path
+
+
+def test_concurrent_thread_debits():
+    """Aynı süreçteki thread'ler (gunicorn thread worker'ları gibi)"""
+    print("Thread stres testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = new_ledger(directory)
+        results = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(THREADS)
+
+        def worker():
+            barrier.wait()
+            result = spend(db_path, DEBITS_PER_WORKER)
+            with lock:
+                results.append(result)
+
+        threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        succeeded = sum(r[0] for r in results)
+        lowest = min(r[2] for r in results)
+        account = check_ledger(db_path, succeeded, lowest)
+        print(f"[OK] {succeeded} harcama, {sum(r[1] for r in results)} red, kalan: {account['remaining']}")
+
+
+def test_concurrent_process_debits():
+    """Ayrı süreçler (gunicorn worker'ları gibi) aynı veritabanı dosyasında"""
+    print("Süreç stres testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = new_ledger(directory)
+        attempts = (STARTING_BALANCE // DEBIT_SIZE) // PROCESSES + DEBITS_PER_WORKER
+        with multiprocessing.get_context("spawn").Pool(PROCESSES) as pool:
+            results = pool.starmap(spend, [(db_path, attempts)] * PROCESSES)
+
+        succeeded = sum(r[0] for r in results)
+        lowest = min(r[2] for r in results)
+        account = check_ledger(db_path, succeeded, lowest)
+        print(f"[OK] {succeeded} harcama, {sum(r[1] for r in results)} red, kalan: {account['remaining']}")
+
+
+def test_credit_during_debits():
+    """Harcamalar sürerken eklenen token'lar kaybolmamalı"""
+    print("Eşzamanlı yükleme testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = new_ledger(directory)
+        ledger = TokenLedger(db_path)
+        spender = threading.Thread(target=spend, args=(db_path, DEBITS_PER_WORKER * 4))
+        spender.start()
+        for _ in range(50):
+            ledger.credit(USER_ID, DEBIT_SIZE, "test", "top-up")
+        spender.join()
+
+        account = ledger.account(USER_ID)
+        assert account["total_purchased"] == STARTING_BALANCE + 50 * DEBIT_SIZE
+        assert account["remaining"] == account["total_purchased"] - account["total_used"]
+        assert account["remaining"] >= 0
+        print(f"[OK] kalan: {account['remaining']}")
+
+
+def brute_force_totals(ledger, since):
+    """usage_totals'ın tanımı: kesme anını içeren saatin başından itibaren tüm kullanım satırları"""
+    since_hour = since.isoformat()[:13]
+    totals = {}
+    for row in ledger._connection().execute('SELECT * FROM token_usage WHERE user_id = ?', (USER_ID,)):
+        if row["timestamp"][:13] < since_hour:
+            continue
+        group = totals.setdefault((row["agent"], row["model"]), [0, 0, 0, 0])
+        group[0] += row["input_tokens"]
+        group[1] += row["output_tokens"]
+        group[2] += row["total_tokens"]
+        group[3] += 1
+    return totals
+
+
+def test_usage_totals_at_bucket_boundaries():
+    """Saatlik ve günlük bucket'ların birleştiği kesme anları ham geçmişle aynı toplamı vermeli"""
+    print("usage_totals sınır testi...")
+    rng = random.Random(2025)
+    # Ay ve yıl sonunu da kapsayan aralık; gece yarısı çevresinde yoğun kayıt
+    start = datetime(2024, 12, 30, 20, 0)
+    stamps = [start + timedelta(minutes=rng.randrange(0, 4 * 24 * 60)) for _ in range(400)]
+    for day in range(5):
+        midnight = datetime(2024, 12, 30) + timedelta(days=day)
+        stamps += [midnight - timedelta(microseconds=1), midnight, midnight + timedelta(minutes=59, seconds=59),
+                   midnight + timedelta(hours=1), midnight - timedelta(hours=1)]
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = TokenLedger(new_ledger(directory))
+        ledger.credit(USER_ID, len(stamps) * 40, "test", "boundaries")
+        for stamp in stamps:
+            usage = usage_record(rng.randrange(3, 40))
+            usage.update(timestamp=stamp.isoformat(), agent=rng.choice(["general_advisor", "motivation_letter"]),
+                         model=rng.choice(["claude-3-5-haiku-20241022", "claude-3-5-sonnet-20241022"]))
+            ledger.debit(USER_ID, usage)
+
+        cutoffs = [start + timedelta(hours=hours) for hours in range(-2, 4 * 24 + 6)]
+        cutoffs += [cutoff + timedelta(minutes=rng.randrange(1, 60), seconds=rng.randrange(60)) for cutoff in cutoffs]
+        cutoffs += [datetime(2025, 1, 1) - timedelta(microseconds=1), datetime(2025, 1, 1)]
+        for since in cutoffs:
+            expected = brute_force_totals(ledger, since)
+            actual = {
+                (row["agent"], row["model"]): [row["input_tokens"], row["output_tokens"], row["total_tokens"],
+                                               row["request_count"]]
+                for row in ledger.usage_totals(USER_ID, since)
+            }
+            assert actual == expected, since
+        print(f"[OK] {len(stamps)} kayıt, {len(cutoffs)} kesme anı")
+
+
+def test_reserve_settle_release():
+    """Ayrılan tutar bakiyeden düşer; settle fazlasını iade eder ve ayrılanı aşmaz"""
+    print("Rezervasyon testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = TokenLedger(new_ledger(directory))
+        hold = ledger.reserve(USER_ID, 4_000)
+        assert ledger.account(USER_ID)["remaining"] == STARTING_BALANCE - 4_000
+        # Ayrılan bakiye başka bir rezervasyona veya harcamaya verilemez
+        try:
+            ledger.reserve(USER_ID, STARTING_BALANCE - 3_999)
+            assert False, "Ayrılmış bakiye tekrar ayrıldı"
+        except InsufficientTokens as e:
+            assert e.remaining == STARTING_BALANCE - 4_000
+
+        charged, remaining = ledger.settle(hold, USER_ID, usage_record(1_000))
+        assert (charged, remaining) == (1_000, STARTING_BALANCE - 1_000)
+
+        # Ayrılandan fazla kullanım ayrılan kadar faturalanır
+        hold = ledger.reserve(USER_ID, 500)
+        charged, remaining = ledger.settle(hold, USER_ID, usage_record(2_000))
+        assert (charged, remaining) == (500, STARTING_BALANCE - 1_500)
+
+        hold = ledger.reserve(USER_ID, 2_000)
+        assert ledger.release(hold, USER_ID) == STARTING_BALANCE - 1_500
+        # İkinci release bir şey değiştirmez
+        assert ledger.release(hold, USER_ID) == STARTING_BALANCE - 1_500
+
+        account = ledger.account(USER_ID)
+        assert account["reserved"] == 0 and account["total_used"] == 1_500
+        print(f"[OK] kalan: {account['remaining']}")
+
+
+def test_stale_holds_released_on_open():
+    """Süreç çağrı ortasında öldüyse rezervasyon ledger açılırken bırakılır"""
+    print("Sahipsiz rezervasyon testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = new_ledger(directory)
+        TokenLedger(db_path).reserve(USER_ID, 3_000)
+        assert TokenLedger(db_path).account(USER_ID)["reserved"] == 3_000
+        time.sleep(0.01)
+        account = TokenLedger(db_path, hold_max_age=0).account(USER_ID)
+        assert account["reserved"] == 0 and account["remaining"] == STARTING_BALANCE
+        print("[OK]")
+
+
+def test_concurrent_agent_chat():
+    """
+    Aynı kullanıcıdan eşzamanlı /api/agents/<id>/chat istekleri: model her
+    çağrıldığında yanıt faturalanmalı (model ödendikten sonra 402 yok),
+    bakiye eksiye düşmemeli ve defter yanıtlardaki kullanımla tutmalı.
+    """
+    print("Eşzamanlı agent chat testi...")
+    app = Flask(__name__)
+    register_token_routes(app)
+    upstream_calls = []
+    lock = threading.Lock()
+
+    def counting_model_stream(agent, message, history, input_tokens, summary=None):
+        with lock:
+            upstream_calls.append(message)
+        # Bakiye kontrolü ile faturalama arasındaki pencereyi genişlet
+        time.sleep(0.01)
+        return iter(["kelime "] * 300)
+
+    with tempfile.TemporaryDirectory() as directory:
+        tracker = TokenTracker(TokenLedger(os.path.join(directory, "tokens.db")))
+        tracker.add_tokens(USER_ID, 30_000, "test")
+        token_system.token_tracker = tracker
+        token_system.model_stream = counting_model_stream
+
+        statuses = []
+        billed = []
+        barrier = threading.Barrier(THREADS)
+
+        def worker():
+            client = app.test_client()
+            barrier.wait()
+            for _ in range(CHAT_REQUESTS_PER_WORKER):
+                response = client.post("/api/agents/general_advisor/chat", json={"message": "kısa soru"},
+                                       headers={"X-User-ID": USER_ID})
+                with lock:
+                    statuses.append(response.status_code)
+                    if response.status_code == 200:
+                        billed.append(response.get_json()["usage"]["total_tokens"])
+
+        threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        account = tracker.ledger.account(USER_ID)
+        usage_sum = tracker.ledger._connection().execute(
+            'SELECT COALESCE(SUM(total_tokens), 0) FROM token_usage WHERE user_id = ?', (USER_ID,)
+        ).fetchone()[0]
+        assert set(statuses) <= {200, 402}, statuses
+        assert 402 in statuses, "Bakiye hiç tükenmedi; test yarışı sınamıyor"
+        assert len(upstream_calls) == statuses.count(200), "Model çağrıldı ama yanıt faturalanmadı"
+        assert account["remaining"] >= 0 and account["reserved"] == 0
+        assert account["total_used"] == sum(billed) == usage_sum
+        print(f"[OK] {statuses.count(200)} yanıt, {statuses.count(402)} red, kalan: {account['remaining']}")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("TokenLedger - Eşzamanlılık Testi")
+    print("=" * 50)
+    print()
+
+    test_concurrent_thread_debits()
+    test_concurrent_process_debits()
+    test_credit_during_debits()
+    test_usage_totals_at_bucket_boundaries()
+    test_reserve_settle_release()
+    test_stale_holds_released_on_open()
+    test_concurrent_agent_chat()
+    print("[OK] Tum testler tamamlandi!")
@@ -0,0 +1,201 @@
+"""
+UserStore testi
+users.json / api_keys.json içeri alma, eski veritabanlarına key_hash
+kolonunun eklenmesi ve apply_usage_deltas (UPSERT) sayaçlarının eşzamanlı
+thread ve süreçlerden kayıpsız artması.
+
+Çalıştırma: python test_user_store.py  (veya pytest test_user_store.py)
+"""
+
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+
+from user_store import UserStore, hash_api_key
+
+DAY = "2025-03-14"
+MONTH = "2025-03"
+THREADS = 8
+PROCESSES = 4
+DELTAS_PER_WORKER = 100
+
+USERS_JSON = {
+    "alice": {
+        "tier": "pro",
+        "created_at": "2024-11-02T10:00:00",
+        "upgraded_at": "2025-01-05T09:30:00",
+        "stripe_customer_id": "cus_123",
+        "usage": {
+            "requests_today": 7,
+            "last_request_date": DAY,
+            "cv_analyses_this_month": 2,
+            "last_cv_analysis_month": MONTH
+        }
+    },
+    # Eski kayıt: tier ve usage yok
+    "bob": {"created_at": "2024-12-01T08:00:00"}
+}
+
+API_KEYS_JSON = {
+    "sk_live_alice": {"user_id": "alice", "key_name": "CI", "created_at": "2025-01-06T00:00:00",
+                      "last_used": None, "usage_count": 12},
+    "sk_live_bob": {"user_id": "bob", "key_name": None, "created_at": "2025-02-01T00:00:00"}
+}
+
+OLD_SCHEMA = """
+CREATE TABLE users (
+    user_id TEXT PRIMARY KEY, tier TEXT NOT NULL DEFAULT 'free', created_at TEXT, upgraded_at TEXT,
+    stripe_customer_id TEXT, subscription_id TEXT, requests_today INTEGER NOT NULL DEFAULT 0,
+    last_request_date TEXT, cv_analyses_this_month INTEGER NOT NULL DEFAULT 0, last_cv_analysis_month TEXT
+);
+CREATE TABLE api_keys (
+    api_key TEXT PRIMARY KEY, user_id TEXT NOT NULL, key_name TEXT, created_at TEXT, last_used TEXT,
+    usage_count INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def write_fixtures(directory):
+    users_path = os.path.join(directory, "users.json")
+    keys_path = os.path.join(directory, "api_keys.json")
+    with open(users_path, "w", encoding="utf-8") as f:
+        json.dump(USERS_JSON, f)
+    with open(keys_path, "w", encoding="utf-8") as f:
+        json.dump(API_KEYS_JSON, f)
+    return users_path, keys_path
+
+
+def add_usage(db_path, user_ids, rounds):
+    """Her turda her kullanıcıya 1 istek ve 1 CV analizi ekle"""
+    store = UserStore(db_path)
+    for _ in range(rounds):
+        store.apply_usage_deltas([(user_id, DAY, MONTH, 1, 1) for user_id in user_ids])
+
+
+def test_import_json_rows():
+    print("JSON içeri alma testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        users_path, keys_path = write_fixtures(directory)
+        store = UserStore(os.path.join(directory, "users.db"), users_path, keys_path)
+
+        alice = store.get_user("alice")
+        assert alice["tier"] == "pro" and alice["stripe_customer_id"] == "cus_123"
+        assert alice["upgraded_at"] == "2025-01-05T09:30:00"
+        assert alice["usage"] == USERS_JSON["alice"]["usage"]
+        bob = store.get_user("bob")
+        assert bob["tier"] == "free" and bob["created_at"] == "2024-12-01T08:00:00"
+        assert bob["usage"] == {"requests_today": 0, "last_request_date": None,
+                                "cv_analyses_this_month": 0, "last_cv_analysis_month": None}
+
+        assert store.get_api_key("sk_live_alice") == dict(API_KEYS_JSON["sk_live_alice"])
+        assert store.get_api_key("sk_live_bob")["usage_count"] == 0
+        assert store.get_api_key_user_by_hash(hash_api_key("sk_live_bob")) == "bob"
+
+        # Tekrar içeri almak mevcut satırların üzerine yazmaz
+        store.set_tier("bob", "basic")
+        assert store.import_json(users_path, keys_path) == (0, 0)
+        assert store.get_tier("bob") == "basic"
+        print(f"[OK] {len(store.all_users())} kullanıcı, {len(store.all_api_keys())} key")
+
+
+def test_key_hash_migration():
+    print("key_hash migration testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "users.db")
+        conn = sqlite3.connect(db_path)
+        conn.executescript(OLD_SCHEMA)
+        conn.executemany("INSERT INTO api_keys (api_key, user_id, usage_count) VALUES (?, ?, ?)",
+                         [("sk_old_1", "alice", 3), ("sk_old_2", "bob", 0)])
+        conn.commit()
+        conn.close()
+
+        store = UserStore(db_path)
+        assert store.api_key_index() == {hash_api_key("sk_old_1"): "alice", hash_api_key("sk_old_2"): "bob"}
+        store.record_api_key_usage([(hash_api_key("sk_old_1"), 2, "2025-03-14T12:00:00")])
+        assert store.get_api_key("sk_old_1")["usage_count"] == 5
+
+        indexes = {row["name"]: row["unique"] for row in store._connection().execute("PRAGMA index_list(api_keys)")}
+        assert indexes.get("idx_api_keys_key_hash") == 1
+        # Migration tekrar açılışta bir şey bozmaz
+        assert UserStore(db_path).api_key_index() == store.api_key_index()
+        print("[OK]")
+
+
+def check_counts(db_path, user_ids, expected):
+    users = UserStore(db_path).get_users(user_ids)
+    for user_id in user_ids:
+        usage = users[user_id]["usage"]
+        assert usage["requests_today"] == expected, (user_id, usage)
+        assert usage["cv_analyses_this_month"] == expected, (user_id, usage)
+        assert usage["last_request_date"] == DAY and usage["last_cv_analysis_month"] == MONTH
+
+
+def test_concurrent_thread_deltas():
+    print("Eşzamanlı thread UPSERT testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "users.db")
+        UserStore(db_path).set_tier("alice", "pro")
+        # Yeni (satırı olmayan) ve mevcut kullanıcılar birlikte
+        user_ids = ["new-1", "new-2", "alice"]
+        barrier = threading.Barrier(THREADS)
+
+        def worker():
+            barrier.wait()
+            add_usage(db_path, user_ids, DELTAS_PER_WORKER)
+
+        threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        check_counts(db_path, user_ids, THREADS * DELTAS_PER_WORKER)
+        print(f"[OK] {THREADS * DELTAS_PER_WORKER} artış / kullanıcı")
+
+
+def test_concurrent_process_deltas():
+    print("Eşzamanlı süreç UPSERT testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "users.db")
+        UserStore(db_path)
+        user_ids = ["p-1", "p-2"]
+        with multiprocessing.get_context("spawn").Pool(PROCESSES) as pool:
+            pool.starmap(add_usage, [(db_path, user_ids, DELTAS_PER_WORKER)] * PROCESSES)
+
+        check_counts(db_path, user_ids, PROCESSES * DELTAS_PER_WORKER)
+        print(f"[OK] {PROCESSES * DELTAS_PER_WORKER} artış / kullanıcı")
+
+
+def test_deltas_respect_windows():
+    print("Gün/ay penceresi testi...")
+    with tempfile.TemporaryDirectory() as directory:
+        store = UserStore(os.path.join(directory, "users.db"))
+        store.apply_usage_deltas([("carol", DAY, MONTH, 5, 2)])
+        # Yeni gün sayacı sıfırdan başlatır, geç gelen eski gün farkı yeni sayacı bozmaz
+        store.apply_usage_deltas([("carol", "2025-03-15", MONTH, 3, 0)])
+        store.apply_usage_deltas([("carol", DAY, MONTH, 4, 1)])
+        usage = store.get_user("carol")["usage"]
+        assert usage["requests_today"] == 3 and usage["last_request_date"] == "2025-03-15"
+        assert usage["cv_analyses_this_month"] == 3 and usage["last_cv_analysis_month"] == MONTH
+
+        store.apply_usage_deltas([("carol", "2025-04-01", "2025-04", 1, 1)])
+        usage = store.get_user("carol")["usage"]
+        assert usage["requests_today"] == 1 and usage["cv_analyses_this_month"] == 1
+        print("[OK]")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("UserStore Testi")
+    print("=" * 50)
+    print()
+
+    test_import_json_rows()
+    test_key_hash_migration()
+    test_concurrent_thread_deltas()
+    test_concurrent_process_deltas()
+    test_deltas_respect_windows()
+    print("[OK] Tum testler tamamlandi!")
@@ -0,0 +1,157 @@
+"""
+Token sayacı (estimate_tokens'ın arkasındaki)
+Gerçek tokenizer olmadan BPE benzeri yaklaşık sayım:
+- Metin GPT/Claude ön-tokenizer'ına benzer parçalara bölünür (kelime,
+  1-3 hane sayı, noktalama grubu; satır sonu ayrı token)
+- Kısa kelimeler tek token; uzun kelimeler ilk token'dan sonra sabit
+  karakter aralıklarıyla bölünür
+- Türkçe ve İngilizce için ayrı parametreler; dil, metindeki Türkçe'ye özgü
+  harflerin oranından seçilir
+- Kelime sayıları ve kısa metinlerin (system prompt vb.) toplamları LRU
+  cache'te tutulur
+
+Sayaç değiştirilebilir: set_token_counter(obj) ile count(text, language=None,
+cache=True) metodu olan herhangi bir nesne (ör. gerçek bir tokenizer
+sarmalayıcısı) kullanılabilir.
+"""
+
+import math
+import os
+import re
+from functools import lru_cache, partial
+
+# GPT-2 tarzı ön-tokenizer (boşlukla ayrılmış her kelime grubu içinde):
+# harf dizisi, 1-3 hane sayı, noktalama grubu. Kelimeden önceki tek boşluk
+# kelimenin token'ına dahildir; satır sonları ayrıca sayılır.
+_PIECE = re.compile(r"[^\W\d_]+|\d{1,3}|[^\w\s]+")
+
+# Türkçe'ye özgü harfler (İngilizce metinde neredeyse hiç geçmez)
+TURKISH_CHARS = "çğıöşüÇĞİÖŞÜ"
+# Harflerin bu oranından fazlası Türkçe'ye özgüyse metin Türkçe sayılır
+TURKISH_CHAR_RATIO = 0.01
+
+# Kelime parametreleri: ilk token'ın kapsadığı karakter ve sonraki her
+# token'ın ortalama karakteri. Örnek metinlerde (test_token_counter.py)
+# boşluk ve noktalama dahil İngilizce ~4, Türkçe ~3.4 karakter/token verir
+# (token_system'deki eski yorumun varsaydığı oranlar).
+WORD_PARAMS = {
+    "en": (6, 4.0),
+    "tr": (5, 2.9)
+}
+# Latin dışı alfabeler (Kiril, CJK, ...) için karakter/token
+OTHER_SCRIPT_CHARS_PER_TOKEN = 1.5
+LATIN_MAX = "ɏ"
+
+TOKEN_COUNT_CACHE_SIZE = int(os.environ.get('TOKEN_COUNT_CACHE_SIZE', '1024'))
+# Bundan uzun metinler bütün olarak cache'lenmez (bellekte büyük metin tutulmasın)
+TOKEN_COUNT_CACHE_MAX_CHARS = int(os.environ.get('TOKEN_COUNT_CACHE_MAX_CHARS', '32768'))
+WORD_CACHE_SIZE = 65536
+
+
+def _piece_tokens(lang, piece):
+    """Tek bir ön-token parçasının tahmini token sayısı"""
+    first = piece[0]
+    if first.isalpha():
+        if max(piece) > LATIN_MAX:
+            return math.ceil(len(piece) / OTHER_SCRIPT_CHARS_PER_TOKEN)
+        head, rest = WORD_PARAMS[lang]
+        return 1 + math.ceil(max(0, len(piece) - head) / rest)
+    if first.isdigit():
+        return 1
+    # Noktalama grubu: ASCII işaretler ~2'li birleşir, diğer semboller (emoji vb.) ~2 token
+    if piece.isascii():
+        return 1 + (len(piece) - 1) // 2
+    return 2 * len(piece)
+
+
+def _word_tokens(lang, word):
+    """Boşlukla ayrılmış bir kelime grubunun (ör. "CV'mde," veya "2024.") token sayısı"""
+    return sum(_piece_tokens(lang, piece) for piece in _PIECE.findall(word))
+
+
+class ApproxTokenCounter:
+    """TR/EN kalibre BPE benzeri yaklaşık token sayacı"""
+
+    name = "approx-bpe"
+
+    def __init__(self, cache_size=TOKEN_COUNT_CACHE_SIZE, cache_max_chars=TOKEN_COUNT_CACHE_MAX_CHARS):
+        self.cache_max_chars = cache_max_chars
+        # Dil başına kelime cache'i (map ile C seviyesinde çağrılır; regex
+        # sadece ilk kez görülen kelimelerde çalışır)
+        self._words = {
+            lang: lru_cache(maxsize=WORD_CACHE_SIZE)(partial(_word_tokens, lang)) for lang in WORD_PARAMS
+        }
+        self._cached_count = lru_cache(maxsize=cache_size)(self._count)
+
+    def detect_language(self, text):
+        turkish = sum(text.count(c) for c in TURKISH_CHARS)
+        return "tr" if turkish > len(text) * TURKISH_CHAR_RATIO else "en"
+
+    def _count(self, text, language=None):
+        words = self._words[language or self.detect_language(text)]
+        return sum(map(words, text.split())) + text.count("\n")
+
+    def count(self, text, language=None, cache=True):
+        """
+        language verilirse dil tespiti atlanır (akan bir yanıtın parçaları
+        yanıtın tek diliyle sayılır; boşlukta bölünen parçaların toplamı
+        bütünün sayısına eşittir). cache=False metni bütün olarak cache'lemez
+        (tekrar etmeyecek parçalar system prompt'ları cache'ten atmasın).
+        """
+        if not text:
+            return 0
+        if cache and len(text) <= self.cache_max_chars:
+            return self._cached_count(text, language)
+        return self._count(text, language)
+
+    def cache_info(self):
+        info = {"texts": self._cached_count.cache_info()._asdict()}
+        for lang, words in self._words.items():
+            info[f"words_{lang}"] = words.cache_info()._asdict()
+        return info
+
+
+class CharRatioTokenCounter:
+    """Eski sayaç: ~4 karakter = 1 token"""
+
+    name = "chars"
+
+    def __init__(self, chars_per_token=4):
+        self.chars_per_token = chars_per_token
+
+    def count(self, text, language=None, cache=True):
+        return len(text) // self.chars_per_token
+
+    def cache_info(self):
+        return {}
+
+
+TOKEN_COUNTERS = {
+    ApproxTokenCounter.name: ApproxTokenCounter,
+    CharRatioTokenCounter.name: CharRatioTokenCounter
+}
+
+TOKEN_COUNTER = os.environ.get('TOKEN_COUNTER', ApproxTokenCounter.name)
+
+_token_counter = TOKEN_COUNTERS[TOKEN_COUNTER]()
+
+
+def get_token_counter():
+    return _token_counter
+
+
+def set_token_counter(counter):
+    """Sayacı değiştir (count(text, language=None, cache=True) metodu olan herhangi bir nesne)"""
+    global _token_counter
+    _token_counter = counter
+
+
+def count_tokens(text, language=None, cache=True):
+    """Metnin tahmini token sayısı (aktif sayaçla)"""
+    return _token_counter.count(text, language, cache)
+
+
+def detect_language(text):
+    """Aktif sayacın metne uygulayacağı dil (sayaç dil ayırt etmiyorsa None)"""
+    detect = getattr(_token_counter, 'detect_language', None)
+    return detect(text) if detect else None
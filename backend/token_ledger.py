@@ -0,0 +1,396 @@
+"""
+Kalıcı token defteri (SQLite)
+TokenTracker'ın bellekteki dict'inin yerini alır:
+- Bakiye ve geçmiş yeniden başlatmalarda kaybolmaz
+- gunicorn worker'ları aynı veritabanını paylaşır
+- Harcama (debit) tek koşullu UPDATE ile yapılır; bakiye eksiye düşemez
+- Model çağrısından önce bakiye ayrılır (reserve); çağrı bitince gerçek
+  kullanım ayrılan tutarı aşmadan düşülür (settle), artanı iade edilir
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from user_store import _Transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_accounts (
+    user_id TEXT PRIMARY KEY,
+    total_purchased INTEGER NOT NULL DEFAULT 0,
+    total_used INTEGER NOT NULL DEFAULT 0,
+    last_purchase TEXT,
+    -- Açık rezervasyonların toplamı (kalan bakiyeden düşülür)
+    reserved INTEGER NOT NULL DEFAULT 0
+);
+
+-- Sonuçlanmamış rezervasyonlar (model çağrısı sürerken)
+CREATE TABLE IF NOT EXISTS token_holds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS token_purchases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    package TEXT,
+    payment_id TEXT,
+    date TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS token_usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    agent TEXT,
+    model TEXT,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    total_tokens INTEGER NOT NULL,
+    cost_usd REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    cached_input_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_write_tokens INTEGER NOT NULL DEFAULT 0
+);
+
+-- Saatlik ('YYYY-MM-DDTHH') ve günlük ('YYYY-MM-DD') kullanım toplamları
+CREATE TABLE IF NOT EXISTS token_usage_rollups (
+    user_id TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    model TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    request_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, bucket, agent, model)
+);
+
+CREATE INDEX IF NOT EXISTS idx_token_purchases_user_id ON token_purchases (user_id);
+CREATE INDEX IF NOT EXISTS idx_token_usage_user_time ON token_usage (user_id, timestamp);
+"""
+
+# ISO zaman damgasının ilk N karakteri bucket anahtarıdır
+HOUR_BUCKET_CHARS = 13  # 2025-01-31T14
+DAY_BUCKET_CHARS = 10   # 2025-01-31
+
+ROLLUP_UPSERT = """
+INSERT INTO token_usage_rollups (user_id, bucket, agent, model, input_tokens, output_tokens,
+                                 total_tokens, cost_usd, request_count)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT(user_id, bucket, agent, model) DO UPDATE SET
+    input_tokens = input_tokens + excluded.input_tokens,
+    output_tokens = output_tokens + excluded.output_tokens,
+    total_tokens = total_tokens + excluded.total_tokens,
+    cost_usd = cost_usd + excluded.cost_usd,
+    request_count = request_count + 1
+"""
+
+# Bundan eski rezervasyonlar sahipsiz sayılır (süreç çağrı ortasında öldü);
+# ledger açılırken serbest bırakılır. Upstream istek süresinden çok uzun olmalı.
+HOLD_MAX_AGE_SECONDS = 3600
+
+USAGE_COLUMNS = ('agent', 'model', 'input_tokens', 'output_tokens', 'total_tokens', 'cost_usd', 'timestamp',
+                 'cached_input_tokens', 'cache_write_tokens')
+
+
+class InsufficientTokens(Exception):
+    """Bakiye harcamayı karşılamıyor"""
+
+    def __init__(self, required, remaining):
+        super().__init__(f"{required} tokens required, {remaining} remaining")
+        self.required = required
+        self.remaining = remaining
+
+
+class TokenLedger:
+    """SQLite tabanlı token defteri (thread başına bağlantı)"""
+
+    def __init__(self, db_path, hold_max_age=HOLD_MAX_AGE_SECONDS):
+        self.db_path = db_path
+        self._local = threading.local()
+        # SQLite bağlantıları fork sonrası paylaşılmamalı
+        os.register_at_fork(after_in_child=self._reset_connections)
+        self._connection().executescript(SCHEMA)
+        self._migrate_schema()
+        self._backfill_rollups()
+        self.release_stale_holds(hold_max_age)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = _Transaction(conn)
+            conn = self._local.conn
+        return conn
+
+    def _reset_connections(self):
+        self._local = threading.local()
+
+    def _migrate_schema(self):
+        """Eski veritabanlarına sonradan eklenen kolonları ekle"""
+        with self._connection() as conn:
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(token_usage)')}
+            for column in ('cached_input_tokens', 'cache_write_tokens'):
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE token_usage ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(token_accounts)')}
+            if 'reserved' not in columns:
+                conn.execute('ALTER TABLE token_accounts ADD COLUMN reserved INTEGER NOT NULL DEFAULT 0')
+
+    def _backfill_rollups(self):
+        """Rollup tablosundan önce yazılmış kullanım satırlarını topla (tek seferlik)"""
+        with self._connection() as conn:
+            if conn.execute('SELECT 1 FROM token_usage_rollups LIMIT 1').fetchone():
+                return
+            for chars in (HOUR_BUCKET_CHARS, DAY_BUCKET_CHARS):
+                conn.execute(
+                    """
+                    INSERT INTO token_usage_rollups (user_id, bucket, agent, model, input_tokens,
+                                                     output_tokens, total_tokens, cost_usd, request_count)
+                    SELECT user_id, substr(timestamp, 1, ?), COALESCE(agent, ''), COALESCE(model, ''),
+                           SUM(input_tokens), SUM(output_tokens), SUM(total_tokens), SUM(cost_usd), COUNT(*)
+                    FROM token_usage
+                    GROUP BY user_id, substr(timestamp, 1, ?), agent, model
+                    """,
+                    (chars, chars)
+                )
+
+    def account(self, user_id):
+        """Hesap satırı: total_purchased, total_used, reserved, remaining, last_purchase"""
+        row = self._connection().execute(
+            'SELECT total_purchased, total_used, reserved, last_purchase FROM token_accounts WHERE user_id = ?',
+            (user_id,)
+        ).fetchone()
+        if row is None:
+            return {'total_purchased': 0, 'total_used': 0, 'reserved': 0, 'remaining': 0, 'last_purchase': None}
+        return {
+            'total_purchased': row['total_purchased'],
+            'total_used': row['total_used'],
+            'reserved': row['reserved'],
+            'remaining': row['total_purchased'] - row['total_used'] - row['reserved'],
+            'last_purchase': row['last_purchase']
+        }
+
+    def credit(self, user_id, tokens, package_id=None, payment_id=None, now=None):
+        """
+        Hesaba token ekle ve satın alımı kaydet.
+
+        Returns:
+            int: Yeni kalan bakiye
+        """
+        date = (now or datetime.now()).isoformat()
+        with self._connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO token_accounts (user_id, total_purchased, last_purchase)
+                VALUES (?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    total_purchased = total_purchased + excluded.total_purchased,
+                    last_purchase = excluded.last_purchase
+                """,
+                (user_id, tokens, date)
+            )
+            conn.execute(
+                'INSERT INTO token_purchases (user_id, tokens, package, payment_id, date) VALUES (?, ?, ?, ?, ?)',
+                (user_id, tokens, package_id, payment_id, date)
+            )
+            return self._remaining(conn, user_id)
+
+    def debit(self, user_id, usage):
+        """
+        Bakiye yeterliyse usage['total_tokens'] kadar düş ve kullanımı kaydet.
+        total_tokens faturalanan token'dır (cache'ten okunan girdi indirimli sayılır).
+
+        Kontrol ve düşme tek koşullu UPDATE'tir; eşzamanlı harcamalar
+        (farklı thread veya worker'lardan) bakiyeyi eksiye düşüremez.
+
+        Args:
+            usage: USAGE_COLUMNS alanlarını içeren dict
+
+        Returns:
+            int: Kalan bakiye
+
+        Raises:
+            InsufficientTokens: Bakiye yetersiz (hiçbir şey yazılmaz)
+        """
+        with self._connection() as conn:
+            return self._charge(conn, user_id, usage, usage['total_tokens'], 0)
+
+    def reserve(self, user_id, tokens):
+        """
+        Model çağrısından önce bakiyeden tokens kadar ayır (koşullu, debit gibi).
+        Ayrılan tutar kalan bakiyeden düşer; settle veya release ile kapanır.
+
+        Returns:
+            int: Rezervasyon id'si
+
+        Raises:
+            InsufficientTokens: Bakiye yetersiz (hiçbir şey yazılmaz)
+        """
+        if tokens < 0:
+            raise ValueError("tokens must not be negative")
+        with self._connection() as conn:
+            updated = conn.execute(
+                """
+                UPDATE token_accounts SET reserved = reserved + ?
+                WHERE user_id = ? AND total_purchased - total_used - reserved >= ?
+                """,
+                (tokens, user_id, tokens)
+            ).rowcount
+            if not updated and tokens > 0:
+                raise InsufficientTokens(tokens, self._remaining(conn, user_id))
+            return conn.execute(
+                'INSERT INTO token_holds (user_id, tokens, created_at) VALUES (?, ?, ?)',
+                (user_id, tokens, time.time())
+            ).lastrowid
+
+    def settle(self, hold_id, user_id, usage):
+        """
+        Rezervasyonu kapat ve kullanımı düş: faturalanan tutar rezervasyonu
+        aşamaz (usage['total_tokens'] ayrılandan büyükse ayrılan kadarı düşülür),
+        artan kısım bakiyeye döner. Rezervasyon bulunamazsa (ör. sahipsiz diye
+        serbest bırakıldıysa) debit gibi koşullu düşülür.
+
+        Returns:
+            tuple: (düşülen token, kalan bakiye)
+
+        Raises:
+            InsufficientTokens: Sadece rezervasyon yoksa ve bakiye yetersizse
+        """
+        with self._connection() as conn:
+            row = conn.execute(
+                'SELECT tokens FROM token_holds WHERE id = ? AND user_id = ?', (hold_id, user_id)
+            ).fetchone()
+            held = row['tokens'] if row else 0
+            charged = min(usage['total_tokens'], held) if row else usage['total_tokens']
+            conn.execute('DELETE FROM token_holds WHERE id = ?', (hold_id,))
+            remaining = self._charge(conn, user_id, dict(usage, total_tokens=charged), charged, held)
+            return charged, remaining
+
+    def release(self, hold_id, user_id):
+        """
+        Rezervasyonu hiçbir şey düşmeden kapat (model çağrısı başarısız).
+
+        Returns:
+            int: Kalan bakiye
+        """
+        with self._connection() as conn:
+            row = conn.execute(
+                'SELECT tokens FROM token_holds WHERE id = ? AND user_id = ?', (hold_id, user_id)
+            ).fetchone()
+            if row:
+                conn.execute('DELETE FROM token_holds WHERE id = ?', (hold_id,))
+                conn.execute('UPDATE token_accounts SET reserved = reserved - ? WHERE user_id = ?',
+                             (row['tokens'], user_id))
+            return self._remaining(conn, user_id)
+
+    def release_stale_holds(self, max_age):
+        """max_age saniyeden eski (sahipsiz) rezervasyonları serbest bırak"""
+        cutoff = time.time() - max_age
+        with self._connection() as conn:
+            stale = conn.execute(
+                'SELECT user_id, SUM(tokens) AS tokens FROM token_holds WHERE created_at < ? GROUP BY user_id',
+                (cutoff,)
+            ).fetchall()
+            for row in stale:
+                conn.execute('UPDATE token_accounts SET reserved = reserved - ? WHERE user_id = ?',
+                             (row['tokens'], row['user_id']))
+            conn.execute('DELETE FROM token_holds WHERE created_at < ?', (cutoff,))
+            return len(stale)
+
+    def _charge(self, conn, user_id, usage, tokens, held):
+        """
+        Transaction içinde: held kadar rezervasyonu kapat, tokens kadar düş ve
+        kullanımı kaydet. held >= tokens ise koşul her zaman sağlanır.
+        """
+        if tokens < 0:
+            raise ValueError("total_tokens must not be negative")
+        updated = conn.execute(
+            """
+            UPDATE token_accounts SET total_used = total_used + ?, reserved = reserved - ?
+            WHERE user_id = ? AND total_purchased - total_used - (reserved - ?) >= ?
+            """,
+            (tokens, held, user_id, held, tokens)
+        ).rowcount
+        if not updated and tokens > 0:
+            raise InsufficientTokens(tokens, self._remaining(conn, user_id))
+        conn.execute(
+            f"INSERT INTO token_usage (user_id, {', '.join(USAGE_COLUMNS)}) "
+            f"VALUES (?, {', '.join('?' for _ in USAGE_COLUMNS)})",
+            (user_id,) + tuple(usage[column] for column in USAGE_COLUMNS)
+        )
+        # Saatlik ve günlük toplamlar aynı transaction'da güncellenir
+        for chars in (HOUR_BUCKET_CHARS, DAY_BUCKET_CHARS):
+            conn.execute(ROLLUP_UPSERT, (
+                user_id, usage['timestamp'][:chars], usage['agent'] or '', usage['model'] or '',
+                usage['input_tokens'], usage['output_tokens'], tokens, usage['cost_usd']
+            ))
+        return self._remaining(conn, user_id)
+
+    def _remaining(self, conn, user_id):
+        row = conn.execute(
+            'SELECT total_purchased - total_used - reserved AS remaining FROM token_accounts WHERE user_id = ?',
+            (user_id,)
+        ).fetchone()
+        return row['remaining'] if row else 0
+
+    def recent_usage(self, user_id, limit=10):
+        """Son kullanımlar (eskiden yeniye)"""
+        rows = self._connection().execute(
+            f"SELECT {', '.join(USAGE_COLUMNS)} FROM token_usage WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, limit)
+        ).fetchall()
+        return [_usage_from_row(row) for row in reversed(rows)]
+
+    def usage_totals(self, user_id, since):
+        """
+        since sonrasındaki kullanımın agent/model bazlı toplamları.
+
+        Kesme anının günü saatlik, sonraki günler günlük bucket'lardan okunur
+        (en fazla ~24 + gün sayısı kadar satır; geçmiş taranmaz). Kesme anını
+        içeren saat tamamen dahil edilir.
+
+        Returns:
+            list: {'agent', 'model', 'input_tokens', 'output_tokens',
+                   'total_tokens', 'cost_usd', 'request_count'} dict'leri
+        """
+        since_hour = since.isoformat()[:HOUR_BUCKET_CHARS]
+        since_day = since_hour[:DAY_BUCKET_CHARS]
+        next_day = (since + timedelta(days=1)).isoformat()[:DAY_BUCKET_CHARS]
+        rows = self._connection().execute(
+            """
+            SELECT agent, model, SUM(input_tokens) AS input_tokens, SUM(output_tokens) AS output_tokens,
+                   SUM(total_tokens) AS total_tokens, SUM(cost_usd) AS cost_usd,
+                   SUM(request_count) AS request_count
+            FROM token_usage_rollups
+            WHERE user_id = :user_id AND (
+                (length(bucket) = :hour_chars AND bucket >= :since_hour AND bucket < :next_day)
+                OR (length(bucket) = :day_chars AND bucket > :since_day)
+            )
+            GROUP BY agent, model
+            """,
+            {
+                'user_id': user_id,
+                'hour_chars': HOUR_BUCKET_CHARS,
+                'day_chars': DAY_BUCKET_CHARS,
+                'since_hour': since_hour,
+                'since_day': since_day,
+                'next_day': next_day
+            }
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def _usage_from_row(row):
+    """SQLite satırını TokenTracker geçmiş formatına çevir"""
+    return {column: row[column] for column in USAGE_COLUMNS}
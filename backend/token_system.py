@@ -8,9 +8,22 @@ Token-Based AI Agent System
 
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import request, jsonify
+from flask import Response, request, jsonify, stream_with_context
 import os
 import json
+import math
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from token_ledger import TokenLedger, InsufficientTokens
+from conversation_store import ConversationStore, ConversationNotFound
+from token_counter import count_tokens, detect_language
+from llm_client import (LLM_API_KEY, PROMPT_CACHE_TTL_SECONDS, UpstreamError, get_llm_client,
+                        history_messages, min_cacheable_tokens, system_blocks)
+
+# Token bakiyeleri ve kullanım geçmişi (SQLite, WAL modu)
+TOKENS_DB_FILE = os.environ.get('TOKENS_DB_FILE', 'tokens.db')
 
 # =============================================================================
 # ANTHROPIC PRICING (Aralık 2024 - Güncel)
@@ -58,6 +71,10 @@ ANTHROPIC_PRICING = {
 
 MARGIN_PERCENTAGE = 0.33  # %33 kar marjı
 
+# Prompt caching: cache'ten okunan girdi 0.1x, cache'e yazılan girdi 1.25x input fiyatı
+CACHE_READ_MULTIPLIER = 0.10
+CACHE_WRITE_MULTIPLIER = 1.25
+
 def calculate_our_pricing():
     """Anthropic fiyatının üzerine %33 margin ekle"""
     our_pricing = {}
@@ -65,6 +82,12 @@ def calculate_our_pricing():
         our_pricing[model_id] = {
             "input_per_1m": round(anthropic_price["input_per_1m"] * (1 + MARGIN_PERCENTAGE), 2),
             "output_per_1m": round(anthropic_price["output_per_1m"] * (1 + MARGIN_PERCENTAGE), 2),
+            "cached_input_per_1m": round(
+                anthropic_price["input_per_1m"] * CACHE_READ_MULTIPLIER * (1 + MARGIN_PERCENTAGE), 4
+            ),
+            "cache_write_per_1m": round(
+                anthropic_price["input_per_1m"] * CACHE_WRITE_MULTIPLIER * (1 + MARGIN_PERCENTAGE), 4
+            ),
             "name": anthropic_price["name"],
             "description": anthropic_price["description"],
             "tier": anthropic_price["tier"],
@@ -355,124 +378,426 @@ Kısa ve net cevaplar ver. Gerekirse detaylı agent'lara yönlendir.""",
 # USAGE TRACKING
 # =============================================================================
 
+class UsageRecord:
+    """Tek bir token kullanımı (bellekteki son kullanımlar için sıkı kayıt)"""
+    
+    __slots__ = ('agent', 'model', 'input_tokens', 'output_tokens', 'total_tokens', 'cost_usd', 'timestamp',
+                 'cached_input_tokens', 'cache_write_tokens')
+    
+    def __init__(self, agent, model, input_tokens, output_tokens, total_tokens, cost_usd, timestamp,
+                 cached_input_tokens=0, cache_write_tokens=0):
+        self.agent = agent
+        self.model = model
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.total_tokens = total_tokens
+        self.cost_usd = cost_usd
+        self.timestamp = timestamp
+        self.cached_input_tokens = cached_input_tokens
+        self.cache_write_tokens = cache_write_tokens
+    
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
 class TokenTracker:
-    """Token kullanımını takip eden sınıf"""
+    """
+    Token kullanımını takip eden sınıf (kalıcı TokenLedger üzerinde).
+    
+    Kullanıcı başına sadece son history_size kullanım bellekte halka tampon
+    olarak tutulur; daha eskileri sadece defterdedir. En fazla max_users
+    kullanıcının tamponu tutulur (en uzun süredir kullanılmayan atılır).
+    Tampon, hesabın total_used değeri bu süreçte bilinenle aynıysa geçerlidir;
+    başka bir worker harcama yaptıysa defterden yeniden okunur.
+    """
+    
+    def __init__(self, ledger=None, history_size=10, max_users=10000):
+        self._ledger = ledger
+        self.history_size = history_size
+        self.max_users = max_users
+        # user_id -> [bilinen total_used, deque(UsageRecord)]
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+    
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
     
-    def __init__(self):
-        # TODO: Redis veya DB'ye taşı
-        self._usage = {}
+    @property
+    def ledger(self):
+        # Veritabanı ilk kullanımda açılır (import sırasında dosya oluşturulmaz)
+        if self._ledger is None:
+            self._ledger = TokenLedger(TOKENS_DB_FILE)
+        return self._ledger
+    
+    def _recent_history(self, user_id, total_used):
+        """Son kullanımlar; tampon güncel değilse defterden doldurulur"""
+        with self._lock:
+            entry = self._recent.get(user_id)
+            if entry is not None and entry[0] == total_used:
+                self._recent.move_to_end(user_id)
+                return [record.to_dict() for record in entry[1]]
+        
+        history = self.ledger.recent_usage(user_id, self.history_size)
+        records = deque((UsageRecord(**h) for h in history), maxlen=self.history_size)
+        with self._lock:
+            self._recent[user_id] = [total_used, records]
+            self._recent.move_to_end(user_id)
+            while len(self._recent) > self.max_users:
+                self._recent.popitem(last=False)
+        return history
+    
+    def _remember_usage(self, user_id, usage):
+        """Bu süreçte yapılan harcamayı tampona ekle (tampon yoksa bir şey yapma)"""
+        with self._lock:
+            entry = self._recent.get(user_id)
+            if entry is not None:
+                entry[0] += usage["total_tokens"]
+                entry[1].append(UsageRecord(**usage))
     
     def get_user_balance(self, user_id):
         """Kullanıcının kalan token bakiyesini al"""
-        user_data = self._usage.get(user_id, {})
+        account = self.ledger.account(user_id)
         return {
-            "total_purchased": user_data.get("total_purchased", 0),
-            "total_used": user_data.get("total_used", 0),
-            "remaining": user_data.get("total_purchased", 0) - user_data.get("total_used", 0),
-            "last_purchase": user_data.get("last_purchase"),
-            "usage_history": user_data.get("history", [])[-10:]  # Son 10 kullanım
+            "total_purchased": account["total_purchased"],
+            "total_used": account["total_used"],
+            "reserved": account["reserved"],
+            "remaining": account["remaining"],
+            "last_purchase": account["last_purchase"],
+            "usage_history": self._recent_history(user_id, account["total_used"])  # Son history_size kullanım
         }
     
     def add_tokens(self, user_id, tokens, package_id, payment_id=None):
         """Kullanıcıya token ekle"""
-        if user_id not in self._usage:
-            self._usage[user_id] = {
-                "total_purchased": 0,
-                "total_used": 0,
-                "history": [],
-                "purchases": []
-            }
-        
-        self._usage[user_id]["total_purchased"] += tokens
-        self._usage[user_id]["last_purchase"] = datetime.now().isoformat()
-        self._usage[user_id]["purchases"].append({
-            "tokens": tokens,
-            "package": package_id,
-            "payment_id": payment_id,
-            "date": datetime.now().isoformat()
-        })
-        
+        self.ledger.credit(user_id, tokens, package_id, payment_id)
         return self.get_user_balance(user_id)
     
-    def use_tokens(self, user_id, input_tokens, output_tokens, agent_id, model_id):
-        """Token kullan ve kaydet"""
-        total_tokens = input_tokens + output_tokens
-        balance = self.get_user_balance(user_id)
-        
-        if balance["remaining"] < total_tokens:
+    def reserve_tokens(self, user_id, tokens):
+        """
+        Model çağrısından önce bakiyeden tokens kadar ayır.
+        Dönen hold_id ile use_tokens (settle) veya release_tokens çağrılmalı.
+        """
+        try:
+            hold_id = self.ledger.reserve(user_id, tokens)
+        except InsufficientTokens as e:
             return {
                 "success": False,
                 "error": "insufficient_tokens",
-                "required": total_tokens,
-                "remaining": balance["remaining"]
+                "required": tokens,
+                "remaining": e.remaining
             }
+        return {"success": True, "hold_id": hold_id, "reserved": tokens}
+    
+    def release_tokens(self, user_id, hold_id):
+        """Rezervasyonu hiçbir şey düşmeden kapat (model çağrısı başarısız)"""
+        return self.ledger.release(hold_id, user_id)
+    
+    def use_tokens(self, user_id, input_tokens, output_tokens, agent_id, model_id,
+                   cached_input_tokens=0, cache_write_tokens=0, hold_id=None):
+        """
+        Token kullan ve kaydet (bakiye kontrolü ve düşme atomik).
+        
+        input_tokens cache dışı girdidir; cache'ten okunan (cached_input_tokens)
+        ve cache'e yazılan (cache_write_tokens) girdi indirimli/zamlı
+        faturalanır ve bakiyeden de o oranda düşülür.
+        
+        hold_id verilirse reserve_tokens ile ayrılan tutardan düşülür: düşülen
+        tutar ayrılanı aşmaz, artan kısım bakiyeye döner, çağrı reddedilmez.
+        """
+        total_tokens = billable_tokens(input_tokens, output_tokens, cached_input_tokens, cache_write_tokens)
         
         # Maliyet hesapla
         model_pricing = OUR_PRICING.get(model_id, OUR_PRICING["claude-3-5-sonnet-20241022"])
         cost_input = (input_tokens / 1_000_000) * model_pricing["input_per_1m"]
+        cost_cached = (cached_input_tokens / 1_000_000) * model_pricing["cached_input_per_1m"]
+        cost_cache_write = (cache_write_tokens / 1_000_000) * model_pricing["cache_write_per_1m"]
         cost_output = (output_tokens / 1_000_000) * model_pricing["output_per_1m"]
-        total_cost = cost_input + cost_output
+        total_cost = cost_input + cost_cached + cost_cache_write + cost_output
         
         # Kullanımı kaydet
-        self._usage[user_id]["total_used"] += total_tokens
-        self._usage[user_id]["history"].append({
+        usage = {
             "agent": agent_id,
             "model": model_id,
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
             "total_tokens": total_tokens,
             "cost_usd": round(total_cost, 6),
-            "timestamp": datetime.now().isoformat()
-        })
+            "timestamp": datetime.now().isoformat(),
+            "cached_input_tokens": cached_input_tokens,
+            "cache_write_tokens": cache_write_tokens
+        }
+        try:
+            if hold_id is None:
+                remaining = self.ledger.debit(user_id, usage)
+            else:
+                usage["total_tokens"], remaining = self.ledger.settle(hold_id, user_id, usage)
+        except InsufficientTokens as e:
+            return {
+                "success": False,
+                "error": "insufficient_tokens",
+                "required": total_tokens,
+                "remaining": e.remaining
+            }
+        self._remember_usage(user_id, usage)
         
         return {
             "success": True,
-            "tokens_used": total_tokens,
+            "tokens_used": usage["total_tokens"],
             "cost_usd": round(total_cost, 6),
-            "remaining": balance["remaining"] - total_tokens
+            "remaining": remaining
+        }
+    
+    def memory_stats(self):
+        """Bellekteki son kullanım tamponlarının boyutu (yaklaşık byte)"""
+        with self._lock:
+            records = sum(len(entry[1]) for entry in self._recent.values())
+            deque_bytes = sum(sys.getsizeof(entry[1]) for entry in self._recent.values())
+            users = len(self._recent)
+        record_bytes = sys.getsizeof(UsageRecord('', '', 0, 0, 0, 0.0, ''))
+        return {
+            "users_cached": users,
+            "max_users": self.max_users,
+            "history_size": self.history_size,
+            "records": records,
+            "approx_bytes": deque_bytes + records * record_bytes
         }
     
     def get_usage_stats(self, user_id, period_days=30):
-        """Kullanım istatistikleri"""
-        user_data = self._usage.get(user_id, {})
-        history = user_data.get("history", [])
-        
-        # Son X gün filtreleme
+        """Kullanım istatistikleri (saatlik/günlük rollup'lardan)"""
         cutoff = datetime.now() - timedelta(days=period_days)
-        recent = [h for h in history if datetime.fromisoformat(h["timestamp"]) > cutoff]
+        totals = self.ledger.usage_totals(user_id, cutoff)
         
-        # Agent bazlı kullanım
+        # Agent ve model bazlı kullanım
         by_agent = {}
-        for h in recent:
-            agent = h["agent"]
-            if agent not in by_agent:
-                by_agent[agent] = {"tokens": 0, "cost": 0, "count": 0}
-            by_agent[agent]["tokens"] += h["total_tokens"]
-            by_agent[agent]["cost"] += h["cost_usd"]
-            by_agent[agent]["count"] += 1
+        by_model = {}
+        for row in totals:
+            for key, groups in ((row["agent"], by_agent), (row["model"], by_model)):
+                group = groups.setdefault(key, {"tokens": 0, "cost": 0, "count": 0})
+                group["tokens"] += row["total_tokens"]
+                group["cost"] += row["cost_usd"]
+                group["count"] += row["request_count"]
         
+        total_tokens = sum(row["total_tokens"] for row in totals)
+        request_count = sum(row["request_count"] for row in totals)
         return {
             "period_days": period_days,
-            "total_tokens": sum(h["total_tokens"] for h in recent),
-            "total_cost": round(sum(h["cost_usd"] for h in recent), 4),
-            "request_count": len(recent),
+            "total_tokens": total_tokens,
+            "total_cost": round(sum(row["cost_usd"] for row in totals), 4),
+            "request_count": request_count,
             "by_agent": by_agent,
-            "avg_tokens_per_request": round(sum(h["total_tokens"] for h in recent) / len(recent)) if recent else 0
+            "by_model": by_model,
+            "avg_tokens_per_request": round(total_tokens / request_count) if request_count else 0
         }
 
 
+# Bellekte tutulan son kullanım sayısı (kullanıcı başına) ve kullanıcı sayısı
+TOKEN_HISTORY_SIZE = int(os.environ.get('TOKEN_HISTORY_SIZE', '10'))
+TOKEN_HISTORY_MAX_USERS = int(os.environ.get('TOKEN_HISTORY_MAX_USERS', '10000'))
+
+# /api/tokens/estimate isteğinde sayılabilecek en fazla metin
+TOKEN_ESTIMATE_MAX_TEXTS = int(os.environ.get('TOKEN_ESTIMATE_MAX_TEXTS', '1000'))
+
 # Global tracker instance
-token_tracker = TokenTracker()
+token_tracker = TokenTracker(history_size=TOKEN_HISTORY_SIZE, max_users=TOKEN_HISTORY_MAX_USERS)
+
+# Sunucu tarafı sohbet oturumları: modele gönderilen geçmişin token sınırı
+# ve sınır aşılınca uygulanan politika ('truncate' veya 'summarize')
+CONVERSATIONS_DB_FILE = os.environ.get('CONVERSATIONS_DB_FILE', TOKENS_DB_FILE)
+CONVERSATION_CONTEXT_TOKENS = int(os.environ.get('CONVERSATION_CONTEXT_TOKENS', '8000'))
+CONVERSATION_TRIM_POLICY = os.environ.get('CONVERSATION_TRIM_POLICY', 'summarize')
+CONVERSATION_SUMMARY_TOKENS = int(os.environ.get('CONVERSATION_SUMMARY_TOKENS', '500'))
+
+_conversation_store = None
+_conversation_store_lock = threading.Lock()
+
+def get_conversation_store():
+    """Paylaşılan oturum deposu (veritabanı ilk kullanımda açılır)"""
+    global _conversation_store
+    with _conversation_store_lock:
+        if _conversation_store is None:
+            _conversation_store = ConversationStore(
+                CONVERSATIONS_DB_FILE,
+                estimate_tokens,
+                context_tokens=CONVERSATION_CONTEXT_TOKENS,
+                trim_policy=CONVERSATION_TRIM_POLICY,
+                summary_tokens=CONVERSATION_SUMMARY_TOKENS
+            )
+    return _conversation_store
+
+def record_turn(conversation_id, user_id, message, message_tokens, reply, reply_tokens):
+    """
+    Faturalanan turu oturuma ekle. Token sayıları zaten hesaplanmış
+    olanlardır (mesaj tahmini, yanıtın output token'ı); yeniden sayılmaz.
+    """
+    try:
+        return get_conversation_store().append(conversation_id, user_id, [
+            ("user", message, message_tokens),
+            ("assistant", reply, reply_tokens)
+        ])
+    except ConversationNotFound:
+        # Oturum yanıt üretilirken silindi
+        return None
 
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
 
 def estimate_tokens(text):
-    """Metin için yaklaşık token sayısı tahmin et"""
-    # Basit tahmin: ~4 karakter = 1 token (İngilizce için)
-    # Türkçe için ~3.5 karakter = 1 token
-    return len(text) // 4
+    """Metin için yaklaşık token sayısı tahmin et (TR/EN kalibre sayaç, bkz. token_counter)"""
+    return count_tokens(text)
+
+def count_reply(text, language):
+    """
+    Model yanıtını (tamamını veya akan bir parçasını) yanıtın diliyle say.
+    Yanıtlar tekrar etmez; metin cache'ine yazılmaz.
+    """
+    return count_tokens(text, language, cache=False)
+
+def billable_tokens(input_tokens, output_tokens, cached_input_tokens=0, cache_write_tokens=0):
+    """Bakiyeden düşülecek token: cache'ten okunan/yazılan girdi fiyat oranında sayılır"""
+    return (input_tokens + output_tokens
+            + math.ceil(cached_input_tokens * CACHE_READ_MULTIPLIER)
+            + math.ceil(cache_write_tokens * CACHE_WRITE_MULTIPLIER))
+
+# Agent system prompt'larının token sayısı başlangıçta bir kez hesaplanır
+AGENT_PROMPT_TOKENS = {agent_id: estimate_tokens(agent["system_prompt"]) for agent_id, agent in AGENTS.items()}
+
+# Cache'lenebilir system prompt'ların bu süreçte en son kullanıldığı an (agent başına)
+_prompt_cache_seen = {}
+_prompt_cache_lock = threading.Lock()
+
+def prompt_is_cacheable(agent, prompt_tokens=None):
+    """System prompt modelin en kısa cache'lenebilir önekine ulaşıyor mu"""
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(agent["system_prompt"])
+    return prompt_tokens >= min_cacheable_tokens(agent["model"])
+
+def system_prompt_usage(agent_id):
+    """
+    System prompt'un bu istekteki tahmini faturası:
+    (input_tokens, cached_input_tokens, cache_write_tokens).
+    
+    Önek modelin en kısa cache'lenebilir boyutunun altındaysa provider onu
+    cache'lemez; normal girdi sayılır. Üstündeyse ve bu süreçte ephemeral
+    cache ömrü içinde kullanıldıysa cache okuması, değilse cache yazmasıdır.
+    Upstream gerçek kullanımı bildirirse tahmin yerine o faturalanır.
+    """
+    tokens = AGENT_PROMPT_TOKENS[agent_id]
+    if not prompt_is_cacheable(AGENTS[agent_id], tokens):
+        return tokens, 0, 0
+    with _prompt_cache_lock:
+        seen = _prompt_cache_seen.get(agent_id)
+    if seen is not None and time.monotonic() - seen < PROMPT_CACHE_TTL_SECONDS:
+        return 0, tokens, 0
+    return 0, 0, tokens
+
+def note_prompt_used(agent_id):
+    """Başarılı istekten sonra: cache'lenebilir önek artık cache'te"""
+    if prompt_is_cacheable(AGENTS[agent_id], AGENT_PROMPT_TOKENS[agent_id]):
+        with _prompt_cache_lock:
+            _prompt_cache_seen[agent_id] = time.monotonic()
+
+def reply_usage(reply_stream, input_tokens, cached_input_tokens, cache_write_tokens, output_tokens):
+    """
+    Faturalanacak kullanım: upstream bildirdiyse o (cache okuma/yazma dahil),
+    yoksa tahminler (system prompt için bkz. system_prompt_usage).
+    """
+    reported = getattr(reply_stream, 'usage', None) or {}
+    if 'input_tokens' not in reported:
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached_input_tokens": cached_input_tokens,
+            "cache_write_tokens": cache_write_tokens
+        }
+    return {
+        "input_tokens": reported['input_tokens'],
+        "output_tokens": reported.get('output_tokens') or output_tokens,
+        "cached_input_tokens": reported.get('cache_read_input_tokens') or 0,
+        "cache_write_tokens": reported.get('cache_creation_input_tokens') or 0
+    }
+
+class TokenMeter:
+    """
+    Akan çıktının token sayısını parça parça ölç.
+    
+    Parçalar kelime ortasında bölünebilir; son boşluktan sonraki kısım bir
+    sonraki parçaya devredilir ve her parça sadece bir kez ölçülür. Dil
+    yanıt başına bir kez seçilir (language); parçalar bu dille sayıldığı
+    için toplam, yanıtın count_reply ile tek seferde sayılmasına eşittir.
+    """
+    
+    def __init__(self, language=None):
+        self.language = language
+        self.tokens = 0
+        self.chars = 0
+        self._carry = ""
+    
+    def add(self, chunk):
+        """Parçayı ekle; o ana kadarki (kesinleşmiş + devreden) token tahminini döndür"""
+        self.chars += len(chunk)
+        text = self._carry + chunk
+        cut = max(text.rfind(" "), text.rfind("\n")) + 1
+        if cut:
+            self.tokens += count_reply(text[:cut], self.language)
+        self._carry = text[cut:]
+        return self.total
+    
+    @property
+    def total(self):
+        return self.tokens + count_reply(self._carry, self.language)
+
+def build_mock_response(agent, message, input_tokens, estimated_output):
+    """Gerçek model çağrısı yerine kullanılan demo yanıtı"""
+    total_estimated = input_tokens + estimated_output
+    return f"""[{agent['name']} - Demo Response]
+
+Mesajınız: "{message[:100]}..."
+
+Bu bir demo yanıtıdır. Gerçek implementasyon için:
+1. Anthropic API key gerekli
+2. Token kullanımı gerçek zamanlı takip edilecek
+3. Her model için farklı fiyatlandırma uygulanacak
+
+Tahmini token kullanımı:
+- Input: ~{input_tokens} tokens
+- Output: ~{estimated_output} tokens
+- Toplam: ~{total_estimated} tokens
+- Maliyet: ~${(total_estimated / 1000000) * OUR_PRICING[agent['model']]['output_per_1m']:.4f}
+"""
+
+def mock_model_stream(agent, message, history, input_tokens, summary=None, estimated_output=1000, chunk_delay=0.0):
+    """
+    Upstream model stream'inin yerel karşılığı: demo yanıtını kelime
+    kelime üretir (chunk_delay saniye arayla).
+    """
+    text = build_mock_response(agent, message, input_tokens, estimated_output)
+    start = 0
+    while start < len(text):
+        end = text.find(" ", start + 1)
+        end = len(text) if end == -1 else end
+        if chunk_delay:
+            time.sleep(chunk_delay)
+        yield text[start:end]
+        start = end
+
+# Agent yanıtı için upstream'e istenen maksimum output token
+AGENT_MAX_OUTPUT_TOKENS = int(os.environ.get('AGENT_MAX_OUTPUT_TOKENS', '4096'))
+
+def upstream_model_stream(agent, message, history, input_tokens, summary=None):
+    """
+    Agent yanıtını paylaşılan upstream istemcisinden akıt (UpstreamStream).
+    Oturum özeti (summary) cache'lenen system prompt'undan sonra ayrı bir
+    system bloğu olarak gider; önek cache'i özet değişince bozulmaz.
+    """
+    messages = history_messages(history)
+    messages.append({"role": "user", "content": message})
+    system = system_blocks(agent["system_prompt"], cache=prompt_is_cacheable(agent)) + system_blocks(summary)
+    return get_llm_client().stream(agent["model"], system, messages, AGENT_MAX_OUTPUT_TOKENS)
+
+# Agent yanıtlarını üreten stream fonksiyonu: API key varsa upstream, yoksa demo
+# (testlerde yerel mock stream ile değiştirilir)
+model_stream = upstream_model_stream if LLM_API_KEY else mock_model_stream
 
 def check_token_balance(user_id, estimated_tokens):
     """Kullanıcının yeterli token'ı var mı kontrol et"""
@@ -505,6 +830,136 @@ def require_tokens(estimated_tokens):
 # FLASK API ROUTES
 # =============================================================================
 
+def stream_agent_chat(agent_id, agent, user_id, message, conversation_history, input_tokens, hold, cached_tokens=0,
+                      cache_write_tokens=0, conversation=None, ndjson=False, language=None):
+    """
+    Agent yanıtını parça parça akıt (SSE veya NDJSON).
+    
+    hold, agent_chat'in reserve_tokens ile ayırdığı rezervasyondur. Her
+    parçada o ana kadarki output token'ları ölçülür; çıktı ayrılan tutarı
+    aşacaksa stream kesilir. Stream bittiğinde (veya istemci bağlantıyı kapattığında) gönderilen kadarı
+    rezervasyondan tek seferde düşülür, artanı iade edilir; faturalanan tutar
+    ayrılanı aşmaz. Hiç çıktı gönderilmediyse rezervasyon bırakılır.
+    conversation ({"id", "message_tokens", "summary"}) verildiyse özet modele
+    gider, mesaj ve gönderilen yanıt oturuma eklenir. language yanıtın sayılacağı dildir (agent_chat
+    mesajdan bir kez seçer).
+    
+    Olaylar: delta {"text", "output_tokens"}, done {"usage", "balance",
+    "conversation"}, error {"error", ...}
+    """
+    budget = hold["reserved"] - billable_tokens(input_tokens, 0, cached_tokens, cache_write_tokens)
+    # generate() ile yanıt kapanışı arasında paylaşılır
+    state = {"settled": False}
+    
+    def event(name, payload):
+        if ndjson:
+            return json.dumps(dict(payload, event=name), ensure_ascii=False) + "\n"
+        return f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    
+    def generate():
+        meter = TokenMeter(language)
+        # İstemciye gönderilmiş çıktının token sayısı (sadece bu faturalanır)
+        sent_tokens = 0
+        sent_chunks = []
+        
+        reply_stream = None
+        billed = {
+            "input_tokens": input_tokens,
+            "cached_input_tokens": cached_tokens,
+            "cache_write_tokens": cache_write_tokens
+        }
+        
+        def settle():
+            state["settled"] = True
+            result = token_tracker.use_tokens(
+                user_id, billed["input_tokens"], sent_tokens, agent_id, agent["model"],
+                billed["cached_input_tokens"], billed["cache_write_tokens"], hold_id=hold["hold_id"]
+            )
+            if conversation and result["success"] and sent_tokens:
+                result["conversation"] = record_turn(
+                    conversation["id"], user_id, message, conversation["message_tokens"],
+                    "".join(sent_chunks), sent_tokens
+                )
+            return result
+        
+        try:
+            summary = conversation["summary"] if conversation else None
+            reply_stream = model_stream(agent, message, conversation_history, input_tokens, summary)
+            for chunk in reply_stream:
+                if meter.add(chunk) > budget:
+                    usage_result = settle()
+                    yield event("error", {
+                        "success": False,
+                        "error": "insufficient_tokens",
+                        "message": "Token bakiyesi bitti, yanıt kesildi.",
+                        "output_tokens": sent_tokens,
+                        "remaining": usage_result.get("remaining", 0),
+                        "purchase_url": "/pricing/tokens"
+                    })
+                    return
+                sent_tokens = meter.total
+                sent_chunks.append(chunk)
+                yield event("delta", {"text": chunk, "output_tokens": sent_tokens})
+            
+            # Upstream kullanımı bildirdiyse tahmin yerine o faturalanır
+            billed = reply_usage(reply_stream, input_tokens, cached_tokens, cache_write_tokens, sent_tokens)
+            note_prompt_used(agent_id)
+            sent_tokens = billed["output_tokens"]
+            usage_result = settle()
+            if not usage_result["success"]:
+                yield event("error", {
+                    "success": False,
+                    "error": "insufficient_tokens",
+                    "required": usage_result["required"],
+                    "remaining": usage_result["remaining"],
+                    "purchase_url": "/pricing/tokens"
+                })
+                return
+            yield event("done", {
+                "success": True,
+                "agent": agent_id,
+                "model": agent["model"],
+                "usage": dict(
+                    billed,
+                    total_tokens=usage_result["tokens_used"],
+                    cost_usd=usage_result["cost_usd"]
+                ),
+                "balance": {"remaining": usage_result["remaining"]},
+                "conversation": usage_result.get("conversation")
+            })
+        except UpstreamError as e:
+            print(f"❌ Upstream stream error ({agent_id}): {e}")
+            # Hiç çıktı gönderilmediyse faturalanmaz
+            if not sent_tokens:
+                release()
+            yield event("error", {
+                "success": False,
+                "error": "upstream_unavailable",
+                "message": "AI servisi şu anda yanıt veremiyor. Lütfen tekrar deneyin.",
+                "retry": e.retryable
+            })
+        finally:
+            # Yarıda kesilen upstream stream'i model yerini hemen bıraksın
+            if reply_stream is not None and hasattr(reply_stream, 'close'):
+                reply_stream.close()
+            # İstemci stream ortasında ayrıldıysa gönderilen kadarı yine düşülür
+            if not state["settled"]:
+                settle()
+    
+    def release():
+        if not state["settled"]:
+            state["settled"] = True
+            token_tracker.release_tokens(user_id, hold["hold_id"])
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson' if ndjson else 'text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Stream hiç başlamadan kapanırsa (generator çalışmadı) rezervasyon bırakılır
+    response.call_on_close(release)
+    return response
+
 def register_token_routes(app):
     """Token sistemi route'larını Flask app'e kaydet"""
     
@@ -549,18 +1004,34 @@ def register_token_routes(app):
     
     @app.route('/api/tokens/estimate', methods=['POST'])
     def estimate_cost():
-        """Bir görev için tahmini token/maliyet hesapla"""
+        """
+        Bir görev için tahmini token/maliyet hesapla.
+        input_text yerine texts (metin listesi) verilirse her biri ayrı sayılır
+        ve girdi toplamları üzerinden tahmin yapılır.
+        """
         data = request.json
         agent_id = data.get('agent_id', 'general_advisor')
         task_type = data.get('task_type', 'quick_answer')
         input_text = data.get('input_text', '')
+        texts = data.get('texts')
         
         agent = AGENTS.get(agent_id)
         if not agent:
             return jsonify({"success": False, "error": "Agent not found"}), 404
         
         # Tahmini token hesapla
-        input_tokens = estimate_tokens(input_text) if input_text else 500
+        if texts is not None:
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                return jsonify({"success": False, "error": "texts must be a list of strings"}), 400
+            if len(texts) > TOKEN_ESTIMATE_MAX_TEXTS:
+                return jsonify({
+                    "success": False,
+                    "error": f"At most {TOKEN_ESTIMATE_MAX_TEXTS} texts per request"
+                }), 400
+            counts = [estimate_tokens(t) for t in texts]
+            input_tokens = sum(counts)
+        else:
+            input_tokens = estimate_tokens(input_text) if input_text else 500
         output_tokens = agent.get('avg_tokens_per_task', {}).get(task_type, 1000)
         total_tokens = input_tokens + output_tokens
         
@@ -569,7 +1040,7 @@ def register_token_routes(app):
         cost = (input_tokens / 1_000_000) * model_pricing["input_per_1m"] + \
                (output_tokens / 1_000_000) * model_pricing["output_per_1m"]
         
-        return jsonify({
+        response = {
             "success": True,
             "estimate": {
                 "agent": agent_id,
@@ -581,7 +1052,12 @@ def register_token_routes(app):
                 "cost_usd": round(cost, 6),
                 "cost_display": f"${cost:.4f}"
             }
-        })
+        }
+        if texts is not None:
+            response["texts"] = [
+                {"index": i, "chars": len(t), "tokens": c} for i, (t, c) in enumerate(zip(texts, counts))
+            ]
+        return jsonify(response)
     
     @app.route('/api/agents', methods=['GET'])
     def get_agents():
@@ -620,22 +1096,46 @@ def register_token_routes(app):
         data = request.json
         message = data.get('message', '')
         conversation_history = data.get('history', [])
+        conversation_id = data.get('conversation_id')
+        user_id = request.headers.get('X-User-ID', 'anonymous')
         
         if not message:
             return jsonify({"success": False, "error": "Message required"}), 400
         
-        # Token tahmini
-        input_tokens = estimate_tokens(message) + estimate_tokens(agent["system_prompt"])
-        for h in conversation_history:
-            input_tokens += estimate_tokens(h.get('content', ''))
+        # Token tahmini: system prompt başlangıçta sayıldı (bkz. system_prompt_usage),
+        # burada sadece yeni içerik sayılır
+        message_tokens = estimate_tokens(message)
+        # Yanıt, stream olsun olmasın mesajın diliyle sayılır
+        language = detect_language(message)
+        conversation = None
+        if conversation_id:
+            # Sunucu tarafı oturum: geçmiş ve token sayısı saklanandan gelir
+            try:
+                context = get_conversation_store().context(conversation_id, user_id)
+            except ConversationNotFound:
+                return jsonify({"success": False, "error": "Conversation not found"}), 404
+            if context["agent"] != agent_id:
+                return jsonify({"success": False, "error": "Conversation belongs to another agent"}), 400
+            conversation_history = context["history"]
+            input_tokens = message_tokens + context["tokens"]
+            conversation = {"id": conversation_id, "message_tokens": message_tokens, "summary": context["summary"]}
+        else:
+            try:
+                conversation_history = history_messages(conversation_history)
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+            input_tokens = message_tokens
+            for h in conversation_history:
+                input_tokens += estimate_tokens(h['content'])
+        prompt_tokens, cached_tokens, cache_write_tokens = system_prompt_usage(agent_id)
+        input_tokens += prompt_tokens
         
         estimated_output = 1000  # Ortalama çıktı
-        total_estimated = input_tokens + estimated_output
+        total_estimated = billable_tokens(input_tokens, estimated_output, cached_tokens, cache_write_tokens)
         
         # Token bakiye kontrolü
-        user_id = request.headers.get('X-User-ID', 'anonymous')
-        if not check_token_balance(user_id, total_estimated):
-            balance = token_tracker.get_user_balance(user_id)
+        balance = token_tracker.get_user_balance(user_id)
+        if balance["remaining"] < total_estimated:
             return jsonify({
                 "success": False,
                 "error": "insufficient_tokens",
@@ -646,52 +1146,134 @@ def register_token_routes(app):
                 "packages": TOKEN_PACKAGES
             }), 402
         
-        # TODO: Gerçek Claude API çağrısı yapılacak
-        # Şimdilik mock response
-        mock_response = f"""[{agent['name']} - Demo Response]
-
-Mesajınız: "{message[:100]}..."
-
-Bu bir demo yanıtıdır. Gerçek implementasyon için:
-1. Anthropic API key gerekli
-2. Token kullanımı gerçek zamanlı takip edilecek
-3. Her model için farklı fiyatlandırma uygulanacak
-
-Tahmini token kullanımı:
-- Input: ~{input_tokens} tokens
-- Output: ~{estimated_output} tokens
-- Toplam: ~{total_estimated} tokens
-- Maliyet: ~${(total_estimated / 1000000) * OUR_PRICING[agent['model']]['output_per_1m']:.4f}
-"""
+        stream_format = data.get('stream') or request.args.get('stream')
+        if stream_format and stream_format not in (True, 'true', 'sse', 'ndjson'):
+            return jsonify({"success": False, "error": "stream must be 'sse' or 'ndjson'"}), 400
         
-        # Mock için token kullanımı kaydet (gerçekte API response'dan alınacak)
-        actual_output_tokens = len(mock_response) // 4
+        # Model çağrısından önce en kötü durum (AGENT_MAX_OUTPUT_TOKENS çıktı) ayrılır;
+        # bakiye yetmiyorsa kalanın tamamı. Eşzamanlı istekler aynı bakiyeyi
+        # harcayamaz, model ödendikten sonra 402 dönülmez.
+        hold = token_tracker.reserve_tokens(user_id, min(
+            balance["remaining"],
+            billable_tokens(input_tokens, AGENT_MAX_OUTPUT_TOKENS, cached_tokens, cache_write_tokens)
+        ))
+        if not hold["success"]:
+            # Bakiye kontrolden sonra eşzamanlı bir istekle harcandı
+            return jsonify({
+                "success": False,
+                "error": "insufficient_tokens",
+                "message": "Yeterli token yok. Lütfen token satın alın.",
+                "estimated_tokens": total_estimated,
+                "remaining": hold["remaining"],
+                "purchase_url": "/pricing/tokens",
+                "packages": TOKEN_PACKAGES
+            }), 402
+        
+        if stream_format:
+            return stream_agent_chat(
+                agent_id, agent, user_id, message, conversation_history, input_tokens, hold, cached_tokens,
+                cache_write_tokens, conversation, ndjson=stream_format == 'ndjson', language=language
+            )
+        
+        try:
+            summary = conversation["summary"] if conversation else None
+            reply_stream = model_stream(agent, message, conversation_history, input_tokens, summary)
+            reply = "".join(reply_stream)
+        except UpstreamError as e:
+            token_tracker.release_tokens(user_id, hold["hold_id"])
+            print(f"❌ Upstream error ({agent_id}): {e}")
+            return jsonify({
+                "success": False,
+                "error": "upstream_unavailable",
+                "message": "AI servisi şu anda yanıt veremiyor. Lütfen tekrar deneyin.",
+                "retry": e.retryable
+            }), 503
+        except Exception:
+            token_tracker.release_tokens(user_id, hold["hold_id"])
+            raise
+        
+        # Upstream kullanımı bildirdiyse o, yoksa tahmin faturalanır
+        # (ayrılan tutardan düşülür, fazlası iade edilir)
+        billed = reply_usage(reply_stream, input_tokens, cached_tokens, cache_write_tokens,
+                             count_reply(reply, language))
+        note_prompt_used(agent_id)
         usage_result = token_tracker.use_tokens(
             user_id,
-            input_tokens,
-            actual_output_tokens,
+            billed["input_tokens"],
+            billed["output_tokens"],
             agent_id,
-            agent["model"]
+            agent["model"],
+            billed["cached_input_tokens"],
+            billed["cache_write_tokens"],
+            hold_id=hold["hold_id"]
         )
+        if not usage_result["success"]:
+            # Sadece rezervasyon sahipsiz sayılıp bırakıldıysa (HOLD_MAX_AGE_SECONDS)
+            return jsonify({
+                "success": False,
+                "error": "insufficient_tokens",
+                "message": "Yeterli token yok. Lütfen token satın alın.",
+                "required": usage_result["required"],
+                "remaining": usage_result["remaining"],
+                "purchase_url": "/pricing/tokens"
+            }), 402
+        
+        if conversation:
+            conversation = record_turn(
+                conversation_id, user_id, message, message_tokens, reply, billed["output_tokens"]
+            )
         
         return jsonify({
             "success": True,
             "response": {
-                "message": mock_response,
+                "message": reply,
                 "agent": agent_id,
                 "model": agent["model"]
             },
-            "usage": {
-                "input_tokens": input_tokens,
-                "output_tokens": actual_output_tokens,
-                "total_tokens": input_tokens + actual_output_tokens,
-                "cost_usd": usage_result.get("cost_usd", 0)
-            },
+            "conversation": conversation,
+            "usage": dict(
+                billed,
+                total_tokens=usage_result["tokens_used"],
+                cost_usd=usage_result.get("cost_usd", 0)
+            ),
             "balance": {
                 "remaining": usage_result.get("remaining", 0)
             }
         })
     
+    @app.route('/api/agents/<agent_id>/conversations', methods=['POST'])
+    def create_conversation(agent_id):
+        """Agent ile sunucu tarafı sohbet oturumu aç"""
+        if agent_id not in AGENTS:
+            return jsonify({"success": False, "error": "Agent not found"}), 404
+        user_id = request.headers.get('X-User-ID', 'anonymous')
+        conversation = get_conversation_store().create(user_id, agent_id)
+        return jsonify({"success": True, "conversation": conversation}), 201
+    
+    @app.route('/api/conversations', methods=['GET'])
+    def list_conversations():
+        """Kullanıcının sohbet oturumları"""
+        user_id = request.headers.get('X-User-ID', 'anonymous')
+        conversations = get_conversation_store().list_conversations(user_id)
+        return jsonify({"success": True, "conversations": conversations, "total": len(conversations)})
+    
+    @app.route('/api/conversations/<conversation_id>', methods=['GET', 'DELETE'])
+    def conversation_detail(conversation_id):
+        """Oturum mesajları (token sayılarıyla) veya oturumu sil"""
+        user_id = request.headers.get('X-User-ID', 'anonymous')
+        store = get_conversation_store()
+        try:
+            if request.method == 'DELETE':
+                store.delete(conversation_id, user_id)
+                return jsonify({"success": True, "message": "Conversation deleted"})
+            return jsonify({
+                "success": True,
+                "conversation": store.get(conversation_id, user_id),
+                "messages": store.messages(conversation_id, user_id)
+            })
+        except ConversationNotFound:
+            return jsonify({"success": False, "error": "Conversation not found"}), 404
+    
     @app.route('/api/tokens/add-demo', methods=['POST'])
     def add_demo_tokens():
         """Demo için token ekle (development only)"""
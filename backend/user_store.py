@@ -0,0 +1,356 @@
+"""
+Kullanıcı ve API key deposu (SQLite)
+users.json / api_keys.json dosyalarının yerini alır:
+- WAL modunda SQLite (standart kütüphane, ek bağımlılık yok)
+- Kullanıcı başına indeksli satır okuma
+- Kullanım sayaçları için atomik artırım (gunicorn worker'ları arasında güvenli)
+- Mevcut JSON dosyalarından tek seferlik migration
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    tier TEXT NOT NULL DEFAULT 'free',
+    created_at TEXT,
+    upgraded_at TEXT,
+    stripe_customer_id TEXT,
+    subscription_id TEXT,
+    requests_today INTEGER NOT NULL DEFAULT 0,
+    last_request_date TEXT,
+    cv_analyses_this_month INTEGER NOT NULL DEFAULT 0,
+    last_cv_analysis_month TEXT
+);
+
+CREATE TABLE IF NOT EXISTS api_keys (
+    api_key TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    key_name TEXT,
+    created_at TEXT,
+    last_used TEXT,
+    usage_count INTEGER NOT NULL DEFAULT 0,
+    key_hash TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_api_keys_user_id ON api_keys (user_id);
+"""
+
+USER_COLUMNS = ('tier', 'created_at', 'upgraded_at', 'stripe_customer_id', 'subscription_id')
+USAGE_COLUMNS = ('requests_today', 'last_request_date', 'cv_analyses_this_month', 'last_cv_analysis_month')
+API_KEY_COLUMNS = ('user_id', 'key_name', 'created_at', 'last_used', 'usage_count')
+
+
+def hash_api_key(api_key):
+    """API key'in SHA-256 özeti (bellekteki indeks ve kullanım güncellemeleri için)"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+def _user_from_row(row):
+    """SQLite satırını users.json'daki kullanıcı formatına çevir"""
+    user = {column: row[column] for column in USER_COLUMNS if row[column] is not None or column == 'tier'}
+    user['usage'] = {column: row[column] for column in USAGE_COLUMNS}
+    return user
+
+
+class UserStore:
+    """SQLite tabanlı kullanıcı deposu (thread başına bağlantı)"""
+
+    def __init__(self, db_path, users_json=None, api_keys_json=None):
+        self.db_path = db_path
+        self._local = threading.local()
+        # SQLite bağlantıları fork sonrası paylaşılmamalı
+        os.register_at_fork(after_in_child=self._reset_connections)
+
+        is_new = not os.path.exists(db_path)
+        self._connection().executescript(SCHEMA)
+        self._migrate_schema()
+
+        # İlk açılışta mevcut JSON verisini içeri al
+        if is_new:
+            self.import_json(users_json, api_keys_json)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = _Transaction(conn)
+            conn = self._local.conn
+        return conn
+
+    def _reset_connections(self):
+        self._local = threading.local()
+
+    def _migrate_schema(self):
+        """Eski veritabanlarına sonradan eklenen kolonları ekle"""
+        with self._connection() as conn:
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(api_keys)')}
+            if 'key_hash' not in columns:
+                conn.execute('ALTER TABLE api_keys ADD COLUMN key_hash TEXT')
+            for row in conn.execute('SELECT api_key FROM api_keys WHERE key_hash IS NULL').fetchall():
+                conn.execute('UPDATE api_keys SET key_hash = ? WHERE api_key = ?',
+                             (hash_api_key(row['api_key']), row['api_key']))
+            conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_api_keys_key_hash ON api_keys (key_hash)')
+
+    # ----- Kullanıcılar -----
+
+    def get_user(self, user_id):
+        """Tek kullanıcıyı oku (primary key ile)"""
+        row = self._connection().execute(
+            'SELECT * FROM users WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return _user_from_row(row) if row else None
+
+    def get_tier(self, user_id):
+        row = self._connection().execute(
+            'SELECT tier FROM users WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return row['tier'] if row else None
+
+    def apply_usage_deltas(self, deltas, now=None):
+        """
+        Bellekte biriken sayaç farklarını tek transaction'da yaz.
+
+        Args:
+            deltas: [(user_id, gün, ay, request farkı, cv farkı), ...]
+                    Gün/ay, farkın biriktiği pencere; daha yeni bir pencereye
+                    geçmiş kullanıcıların sayaçları eski farklarla bozulmaz.
+        """
+        created_at = (now or datetime.now()).isoformat()
+        with self._connection() as conn:
+            for user_id, day, month, requests, cv_analyses in deltas:
+                conn.execute(
+                    """
+                    INSERT INTO users (user_id, tier, created_at, requests_today, last_request_date,
+                                       cv_analyses_this_month, last_cv_analysis_month)
+                    VALUES (:user_id, 'free', :created_at, :requests, :day, :cv_analyses,
+                            CASE WHEN :cv_analyses > 0 THEN :month ELSE NULL END)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        requests_today = CASE
+                            WHEN last_request_date = :day THEN requests_today + :requests
+                            WHEN last_request_date > :day THEN requests_today
+                            ELSE :requests END,
+                        last_request_date = MAX(COALESCE(last_request_date, ''), :day),
+                        cv_analyses_this_month = CASE
+                            WHEN :cv_analyses = 0 THEN cv_analyses_this_month
+                            WHEN last_cv_analysis_month = :month THEN cv_analyses_this_month + :cv_analyses
+                            WHEN last_cv_analysis_month > :month THEN cv_analyses_this_month
+                            ELSE :cv_analyses END,
+                        last_cv_analysis_month = CASE
+                            WHEN :cv_analyses = 0 THEN last_cv_analysis_month
+                            ELSE MAX(COALESCE(last_cv_analysis_month, ''), :month) END
+                    """,
+                    {
+                        'user_id': user_id,
+                        'created_at': created_at,
+                        'day': day,
+                        'month': month,
+                        'requests': requests,
+                        'cv_analyses': cv_analyses
+                    }
+                )
+
+    def get_users(self, user_ids):
+        """Birden fazla kullanıcıyı tek sorguda oku"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        placeholders = ', '.join('?' for _ in user_ids)
+        rows = self._connection().execute(
+            f'SELECT * FROM users WHERE user_id IN ({placeholders})', user_ids
+        ).fetchall()
+        return {row['user_id']: _user_from_row(row) for row in rows}
+
+    def upsert_user(self, user_id, user):
+        """users.json formatındaki bir kullanıcıyı yaz (varsa üzerine)"""
+        usage = user.get('usage', {})
+        values = {column: user.get(column) for column in USER_COLUMNS}
+        values['tier'] = values['tier'] or 'free'
+        values.update({column: usage.get(column) for column in USAGE_COLUMNS})
+        values['requests_today'] = values['requests_today'] or 0
+        values['cv_analyses_this_month'] = values['cv_analyses_this_month'] or 0
+        values['user_id'] = user_id
+
+        columns = ('user_id',) + USER_COLUMNS + USAGE_COLUMNS
+        self._connection().execute(
+            f"INSERT OR REPLACE INTO users ({', '.join(columns)}) "
+            f"VALUES ({', '.join(':' + c for c in columns)})",
+            values
+        )
+
+    def set_tier(self, user_id, tier, stripe_customer_id=None, subscription_id=None, now=None):
+        """Tier güncelle; kullanıcı yoksa oluştur"""
+        now = (now or datetime.now()).isoformat()
+        self._connection().execute(
+            """
+            INSERT INTO users (user_id, tier, created_at, upgraded_at, stripe_customer_id, subscription_id)
+            VALUES (:user_id, :tier, :now, :now, :stripe_customer_id, :subscription_id)
+            ON CONFLICT(user_id) DO UPDATE SET
+                tier = :tier,
+                upgraded_at = :now,
+                stripe_customer_id = COALESCE(:stripe_customer_id, stripe_customer_id),
+                subscription_id = COALESCE(:subscription_id, subscription_id)
+            """,
+            {
+                'user_id': user_id,
+                'tier': tier,
+                'now': now,
+                'stripe_customer_id': stripe_customer_id or None,
+                'subscription_id': subscription_id or None
+            }
+        )
+
+    def all_users(self):
+        rows = self._connection().execute('SELECT * FROM users').fetchall()
+        return {row['user_id']: _user_from_row(row) for row in rows}
+
+    def replace_users(self, users):
+        """Tüm kullanıcı tablosunu verilen dict ile değiştir (save_users uyumluluğu)"""
+        with self._connection() as conn:
+            conn.execute('DELETE FROM users')
+            for user_id, user in users.items():
+                self.upsert_user(user_id, user)
+
+    # ----- API key'ler -----
+
+    def get_api_key(self, api_key):
+        row = self._connection().execute(
+            'SELECT * FROM api_keys WHERE api_key = ?', (api_key,)
+        ).fetchone()
+        return {column: row[column] for column in API_KEY_COLUMNS} if row else None
+
+    def get_api_key_user_by_hash(self, key_hash):
+        """Key özetinden kullanıcı ID'sini bul (indeksli)"""
+        row = self._connection().execute(
+            'SELECT user_id FROM api_keys WHERE key_hash = ?', (key_hash,)
+        ).fetchone()
+        return row['user_id'] if row else None
+
+    def api_key_index(self):
+        """Tüm key'ler için {key özeti: user_id}"""
+        rows = self._connection().execute('SELECT key_hash, user_id FROM api_keys').fetchall()
+        return {row['key_hash']: row['user_id'] for row in rows}
+
+    def record_api_key_usage(self, usage):
+        """
+        Biriken API key kullanımlarını tek transaction'da yaz.
+
+        Args:
+            usage: [(key özeti, kullanım sayısı, son kullanım zamanı), ...]
+        """
+        with self._connection() as conn:
+            for key_hash, count, last_used in usage:
+                conn.execute(
+                    """
+                    UPDATE api_keys
+                    SET usage_count = usage_count + ?,
+                        last_used = MAX(COALESCE(last_used, ''), ?)
+                    WHERE key_hash = ?
+                    """,
+                    (count, last_used, key_hash)
+                )
+
+    def add_api_key(self, api_key, record):
+        values = {column: record.get(column) for column in API_KEY_COLUMNS}
+        values['usage_count'] = values['usage_count'] or 0
+        values['api_key'] = api_key
+        values['key_hash'] = hash_api_key(api_key)
+        columns = ('api_key',) + API_KEY_COLUMNS + ('key_hash',)
+        self._connection().execute(
+            f"INSERT OR REPLACE INTO api_keys ({', '.join(columns)}) "
+            f"VALUES ({', '.join(':' + c for c in columns)})",
+            values
+        )
+
+    def all_api_keys(self):
+        rows = self._connection().execute('SELECT * FROM api_keys').fetchall()
+        return {row['api_key']: {column: row[column] for column in API_KEY_COLUMNS} for row in rows}
+
+    def replace_api_keys(self, api_keys):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM api_keys')
+            for api_key, record in api_keys.items():
+                self.add_api_key(api_key, record)
+
+    # ----- Migration -----
+
+    def import_json(self, users_json=None, api_keys_json=None):
+        """
+        users.json / api_keys.json içeriğini içeri al.
+        Mevcut satırların üzerine yazılmaz; tekrar çalıştırmak güvenlidir.
+
+        Returns:
+            tuple: (içeri alınan kullanıcı sayısı, içeri alınan key sayısı)
+        """
+        imported_users = imported_keys = 0
+        with self._connection() as conn:
+            if users_json and os.path.exists(users_json):
+                with open(users_json, 'r', encoding='utf-8') as f:
+                    users = json.load(f)
+                for user_id, user in users.items():
+                    if conn.execute('SELECT 1 FROM users WHERE user_id = ?', (user_id,)).fetchone():
+                        continue
+                    self.upsert_user(user_id, user)
+                    imported_users += 1
+
+            if api_keys_json and os.path.exists(api_keys_json):
+                with open(api_keys_json, 'r', encoding='utf-8') as f:
+                    api_keys = json.load(f)
+                for api_key, record in api_keys.items():
+                    if conn.execute('SELECT 1 FROM api_keys WHERE api_key = ?', (api_key,)).fetchone():
+                        continue
+                    self.add_api_key(api_key, record)
+                    imported_keys += 1
+
+        return imported_users, imported_keys
+
+
+class _Transaction:
+    """
+    Autocommit bağlantı sarmalayıcısı.
+    `with conn:` bloğu BEGIN IMMEDIATE ... COMMIT/ROLLBACK olarak çalışır;
+    iç içe bloklar dış transaction'a katılır.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.depth = 0
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+    def executescript(self, script):
+        return self.conn.executescript(script)
+
+    def __enter__(self):
+        if self.depth == 0:
+            self.conn.execute('BEGIN IMMEDIATE')
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.depth -= 1
+        if self.depth == 0:
+            self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+if __name__ == '__main__':
+    # Manuel migration: python user_store.py [users.json] [api_keys.json]
+    import sys
+    from premium import USERS_DB_FILE, USERS_FILE, API_KEYS_FILE
+
+    users_json = sys.argv[1] if len(sys.argv) > 1 else USERS_FILE
+    api_keys_json = sys.argv[2] if len(sys.argv) > 2 else API_KEYS_FILE
+    store = UserStore(USERS_DB_FILE)
+    users, keys = store.import_json(users_json, api_keys_json)
+    print(f"✅ {users} kullanıcı ve {keys} API key {USERS_DB_FILE} veritabanına aktarıldı")